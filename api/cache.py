@@ -0,0 +1,300 @@
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+from itertools import product
+from urllib.parse import urlencode
+from cachelib import BaseCache, FileSystemCache, NullCache, RedisCache
+from flask import Response, request
+from api.data_loader import data_loader
+from api.fingerprint import code_version
+from api.metrics import profiling
+
+
+class LRUCache(BaseCache):
+    # Backend em memória do processo, limitado por quantidade de itens
+
+    def __init__(self, threshold = 1024, default_timeout = 300):
+        super().__init__(default_timeout)
+        self.threshold = threshold
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            valor = self._itens.get(key)
+            if valor is not None:
+                self._itens.move_to_end(key)
+            return valor
+
+    def set(self, key, value, timeout = None):
+        with self._lock:
+            self._itens[key] = value
+            self._itens.move_to_end(key)
+
+            while len(self._itens) > self.threshold:
+                self._itens.popitem(last = False)
+
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._itens.pop(key, None) is not None
+
+    def has(self, key):
+        with self._lock:
+            return key in self._itens
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+        return True
+
+
+def send_precompressed(recurso, mimetype = 'application/json'):
+    # Negocia a codificação, responde 304 se o cliente já tem a versão atual
+    etag = recurso['etag']
+    variantes = recurso['variantes']
+
+    if request.if_none_match.contains_weak(etag) or any(
+        request.if_none_match.contains_weak(f"{etag}-{encoding}") for encoding in variantes
+    ):
+        resposta = Response(status = 304)
+    else:
+        encoding = 'identity'
+        for candidato in ('br', 'gzip'):
+            if candidato in variantes and request.accept_encodings[candidato]:
+                encoding = candidato
+                break
+
+        resposta = Response(variantes[encoding], mimetype = mimetype)
+        if encoding != 'identity':
+            resposta.headers['Content-Encoding'] = encoding
+            etag = f"{etag}-{encoding}"
+
+    resposta.set_etag(etag)
+    resposta.headers['Vary'] = 'Accept-Encoding'
+
+    # Com o ETag da própria variante na URL (?v=) o conteúdo nunca muda; sem ele o cliente revalida.
+    # Qualquer mudança na simplificação, na grade ou no serializador muda o ETag e portanto a URL
+    if request.args.get('v') == recurso['etag']:
+        resposta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        resposta.headers['Cache-Control'] = 'no-cache'
+
+    return resposta
+
+
+class ResponseCache:
+
+    def __init__(self, max_items = 1024):
+        self.max_items = max_items
+        self.backend = LRUCache(max_items)
+        self.backend_type = 'SimpleCache'
+        self._precomputed = {}
+        self._stats = {'precomputed': 0, 'hits': 0, 'misses': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, precomputed = None):
+        self.max_items = app.config.get('RESPONSE_CACHE_MAX_ITEMS', self.max_items)
+        self.backend_type, self.backend = self._create_backend(app.config)
+        print(f"Cache de respostas: {self.backend_type}")
+
+        # Respostas vindas do snapshot de inicialização já são da versão atual
+        if precomputed is not None:
+            self._precomputed = precomputed
+            print(f"{len(precomputed)} respostas pré-computadas restauradas (versão {data_loader.version})")
+        else:
+            self.precompute(app)
+
+    def _create_backend(self, config):
+        cache_type = config.get('CACHE_TYPE', 'SimpleCache')
+        timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+
+        if cache_type == 'NullCache':
+            return cache_type, NullCache()
+
+        if cache_type == 'FileSystemCache':
+            return cache_type, FileSystemCache(
+                config['CACHE_DIR'],
+                threshold = self.max_items,
+                default_timeout = timeout
+            )
+
+        if cache_type == 'RedisCache':
+            try:
+                import redis
+
+                cliente = redis.from_url(config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+                cliente.ping()
+
+                return cache_type, RedisCache(
+                    host = cliente,
+                    default_timeout = timeout,
+                    key_prefix = config.get('CACHE_KEY_PREFIX', 'kynetec:')
+                )
+
+            except Exception as e:
+                print(f"Redis indisponível ({e}), usando cache em memória")
+
+        return 'SimpleCache', LRUCache(self.max_items, timeout)
+
+    def _key(self, path, args):
+        # Versão dos dados e do código: disco e Redis sobrevivem a reinícios e deploys, e uma resposta
+        # gerada pelo código anterior não pode ser servida com os mesmos dados
+        return f"{data_loader.version}:{code_version()}:{path}?{urlencode(sorted(args.items()))}"
+
+    def _count(self, nome):
+        with self._lock:
+            self._stats[nome] += 1
+
+    def get(self, path, args):
+        chave = self._key(path, args)
+
+        resposta = self._precomputed.get(chave)
+        if resposta is not None:
+            self._count('precomputed')
+            return resposta
+
+        try:
+            resposta = self.backend.get(chave)
+        except Exception as e:
+            print(f"Erro ao ler cache de respostas: {e}")
+            self._count('errors')
+            resposta = None
+
+        self._count('hits' if resposta is not None else 'misses')
+        return resposta
+
+    def set(self, path, args, resposta):
+        try:
+            self.backend.set(self._key(path, args), resposta)
+        except Exception as e:
+            print(f"Erro ao gravar cache de respostas: {e}")
+            self._count('errors')
+
+    def precomputed(self):
+        return dict(self._precomputed)
+
+    def replace(self, precomputed):
+        # Nova versão dos dados: as chaves antigas deixam de ser consultadas porque levam a versão
+        self._precomputed = precomputed
+
+        # O cache em memória é só deste processo e pode ser esvaziado; Redis e disco são
+        # compartilhados com workers que ainda servem a versão anterior, e expiram sozinhos
+        if self.backend_type == 'SimpleCache':
+            self.backend.clear()
+
+    def clear(self):
+        self._precomputed = {}
+        try:
+            self.backend.clear()
+        except Exception as e:
+            print(f"Erro ao limpar cache de respostas: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+
+        consultas = stats['precomputed'] + stats['hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['precomputed'] + stats['hits']) / consultas, 4) if consultas else 0.0
+        stats['backend'] = self.backend_type
+        stats['precomputed_items'] = len(self._precomputed)
+        stats['version'] = data_loader.version
+        stats['pid'] = os.getpid()
+
+        return stats
+
+    def cached(self, padroes = None, dominio = None, vary = None):
+        padroes = padroes or {}
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper():
+                # Apenas parâmetros declarados entram na chave, com os padrões da rota; um padrão
+                # que é função resolve o valor pela requisição (ex.: formato negociado pelo Accept).
+                # A view recebe exatamente esses valores, então nunca responde algo fora da chave
+                args = {
+                    nome: request.args.get(nome, padrao() if callable(padrao) else padrao)
+                    for nome, padrao in padroes.items()
+                }
+
+                # Com ?_profile o perfil é do cálculo da resposta, não da leitura do cache
+                if profiling():
+                    return view(**args)
+
+                resultado = self.fetch(view, request.path, args)
+
+                if vary and not isinstance(resultado, tuple):
+                    resultado.headers['Vary'] = vary
+
+                return resultado
+
+            wrapper.cache_padroes = padroes
+            wrapper.cache_dominio = dominio
+            return wrapper
+
+        return decorator
+
+    def fetch(self, view, path, args):
+        # Resposta da rota path para args, do cache ou calculada pela view (sem o decorador); também
+        # chamado fora de uma requisição da rota, como pelos painéis de /api/painel
+        resposta = self.get(path, args)
+        if resposta is not None:
+            cached_response = Response(resposta[0], status = resposta[1], mimetype = resposta[2])
+            cached_response.headers['X-Cache'] = 'HIT'
+            return cached_response
+
+        resultado = view(**args)
+
+        corpo = self._serialize(resultado)
+        if corpo is not None:
+            self.set(path, args, corpo)
+            resultado.headers['X-Cache'] = 'MISS'
+
+        return resultado
+
+    def _serialize(self, resultado):
+        if isinstance(resultado, tuple):
+            return None
+
+        # no-store: resposta que a própria view marcou como não reutilizável (ex.: painel com erro interno)
+        if resultado.status_code != 200 or resultado.direct_passthrough or resultado.cache_control.no_store:
+            return None
+
+        return (resultado.get_data(), resultado.status_code, resultado.mimetype)
+
+    def precompute(self, app):
+        self._precomputed = self.build_precomputed(app)
+        print(f"{len(self._precomputed)} respostas pré-computadas (versão {data_loader.version})")
+
+    def build_precomputed(self, app):
+        # Materializa as respostas de todas as combinações válidas dos endpoints com domínio fechado
+        precomputed = {}
+
+        for rule in app.url_map.iter_rules():
+            view = app.view_functions.get(rule.endpoint)
+            dominio = getattr(view, 'cache_dominio', None)
+            if dominio is None:
+                continue
+
+            padroes = view.cache_padroes
+            nomes = list(dominio.keys())
+
+            # Domínios que dependem dos dados são funções, avaliadas na versão sendo pré-computada
+            valores_dominio = [valores() if callable(valores) else valores for valores in dominio.values()]
+
+            for valores in product(*valores_dominio):
+                args = dict(padroes)
+                args.update(zip(nomes, valores))
+
+                with app.app_context():
+                    corpo = self._serialize(view.__wrapped__(**args))
+
+                if corpo is not None:
+                    precomputed[self._key(rule.rule, args)] = corpo
+
+        return precomputed
+
+
+response_cache = ResponseCache()
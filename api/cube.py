@@ -0,0 +1,187 @@
+from api.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# Cubo denso com a área plantada das duas fontes: eixos cultura x fonte x ano x uf, em hectares.
+# Os datasets agregados (area_nacional, area_estadual, df_nacional...) são recortes fixos desses
+# mesmos fatos; aqui qualquer recorte sai por indexação e as métricas são calculadas só nas células
+# pedidas, então o custo acompanha o tamanho da resposta e não o da base.
+
+FONTES = ('IBGE', 'CONAB')
+NIVEIS = ('uf', 'nacional')
+
+# Métrica -> unidade do valor devolvido
+METRICAS = {
+    'area': 'ha',
+    'variacao': '%',
+    'gap': '%',
+    'participacao': '%',
+    'municipios': 'municípios'
+}
+
+# Nível nacional é o mesmo cubo com o eixo uf somado numa única posição
+NACIONAL = 'BR'
+
+
+def _somar(valores, posicoes, tamanho):
+    # Soma por célula; célula sem nenhuma linha na fonte fica NaN (sem dado), não zero
+    somas = np.bincount(posicoes, weights = valores, minlength = tamanho)
+    presentes = np.bincount(posicoes, minlength = tamanho) > 0
+    return np.where(presentes, somas, np.nan)
+
+
+def _razao(numerador, denominador):
+    # Divisão por zero vira NaN: a resposta em JSON não tem infinito
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        resultado = numerador / denominador
+    resultado[~np.isfinite(resultado)] = np.nan
+    return resultado
+
+
+class AreaCube:
+
+    def __init__(self, culturas, anos, ufs, area, municipios):
+        # area e municipios: float64 (cultura, fonte, ano, uf); anos contínuos, para que o ano anterior
+        # de qualquer posição seja a posição - 1
+        self.culturas = list(culturas)
+        self.anos = list(anos)
+        self.ufs = list(ufs)
+
+        self.codigos = {
+            'cultura': {cultura: i for i, cultura in enumerate(self.culturas)},
+            'fonte': {fonte: i for i, fonte in enumerate(FONTES)},
+            'ano': {ano: i for i, ano in enumerate(self.anos)},
+            'uf': {uf: i for i, uf in enumerate(self.ufs)}
+        }
+
+        # Um cubo por nível, com os mesmos eixos; o nacional tem uma única uf
+        self.niveis = {
+            'uf': {'area': area, 'municipios': municipios},
+            'nacional': {
+                'area': self._total(area),
+                'municipios': self._total(municipios)
+            }
+        }
+
+    @staticmethod
+    def _total(cubo):
+        presentes = (~np.isnan(cubo)).any(axis = 3, keepdims = True)
+        return np.where(presentes, np.nansum(cubo, axis = 3, keepdims = True), np.nan)
+
+    @classmethod
+    def from_bases(cls, base_ibge, base_conab, uf_municipio, cultura = 'soja'):
+        # base_ibge por município (uf vinda de uf_municipio: cod_municipio -> uf) e base_conab por estado
+        ufs_ibge = base_ibge['cod_municipio'].map(uf_municipio)
+        if ufs_ibge.isna().any():
+            print(f"Cubo de área: {int(ufs_ibge.isna().sum())} linhas do IBGE sem uf conhecida foram ignoradas")
+
+        ibge = base_ibge.assign(uf = ufs_ibge.astype(object)).dropna(subset = ['uf'])
+        conab = base_conab.assign(uf = base_conab['uf'].astype(str))
+
+        todos_anos = np.concatenate([ibge['ano'].to_numpy(), conab['ano'].to_numpy()]).astype('int64')
+        anos = list(range(int(todos_anos.min()), int(todos_anos.max()) + 1)) if len(todos_anos) else []
+        ufs = sorted(set(ibge['uf']) | set(conab['uf']))
+
+        forma = (1, len(FONTES), len(anos), len(ufs))
+        tamanho = len(anos) * len(ufs)
+        area = np.full(forma, np.nan)
+        municipios = np.full(forma, np.nan)
+
+        posicao_uf = {uf: i for i, uf in enumerate(ufs)}
+
+        for fonte, df in (('IBGE', ibge), ('CONAB', conab)):
+            if df.empty:
+                continue
+
+            # Posição achatada (ano, uf) de cada linha
+            posicoes = (
+                (df['ano'].to_numpy(dtype = 'int64') - anos[0]) * len(ufs)
+                + df['uf'].map(posicao_uf).to_numpy(dtype = 'int64')
+            )
+            valores = df['area_plantada'].to_numpy(dtype = 'float64')
+            f = FONTES.index(fonte)
+
+            area[0, f] = _somar(valores, posicoes, tamanho).reshape(len(anos), len(ufs))
+
+            # Quantidade de municípios com área plantada só existe na base municipal
+            if fonte == 'IBGE':
+                municipios[0, f] = _somar((valores > 0).astype('float64'), posicoes, tamanho).reshape(len(anos), len(ufs))
+
+        return cls([cultura], anos, ufs, area, municipios)
+
+    def _posicoes(self, eixo, valores):
+        if valores is None:
+            return np.arange(len(self.codigos[eixo]))
+
+        desconhecidos = [v for v in valores if v not in self.codigos[eixo]]
+        if desconhecidos:
+            disponiveis = ', '.join(map(str, self.codigos[eixo]))
+            raise ValueError(f"Valor inválido para {eixo}: {', '.join(map(str, desconhecidos))}. Disponíveis: {disponiveis}")
+
+        return np.array([self.codigos[eixo][v] for v in valores], dtype = 'int64')
+
+    def query(self, nivel = 'nacional', metrica = 'area', anos = None, fontes = None, ufs = None, cultura = 'soja'):
+        # Recorte em formato longo: uma linha por (fonte, ano, uf) pedida, colunas como arrays
+        if nivel not in NIVEIS:
+            raise ValueError(f"Nível inválido: {nivel}. Use: {', '.join(NIVEIS)}")
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica inválida: {metrica}. Use: {', '.join(METRICAS)}")
+        if nivel == 'nacional' and ufs:
+            raise ValueError("Filtro de uf só vale para nivel=uf")
+        if metrica == 'participacao' and nivel == 'nacional':
+            raise ValueError("A participação é a fatia de cada uf no total nacional: use nivel=uf")
+
+        c = self._posicoes('cultura', [cultura])[0]
+        a = self._posicoes('ano', anos)
+        f = self._posicoes('fonte', FONTES if metrica == 'gap' else fontes)
+
+        if nivel == 'uf':
+            u = self._posicoes('uf', ufs)
+            rotulos_uf = [self.ufs[i] for i in u]
+        else:
+            u = np.zeros(1, dtype = 'int64')
+            rotulos_uf = [NACIONAL]
+
+        cubo = self.niveis[nivel]
+
+        if metrica == 'municipios':
+            valores = cubo['municipios'][c][np.ix_(f, a, u)]
+
+        elif metrica == 'area':
+            valores = cubo['area'][c][np.ix_(f, a, u)]
+
+        elif metrica == 'variacao':
+            # Ano anterior pela posição no eixo; o primeiro ano do cubo não tem com o que comparar
+            anterior = cubo['area'][c][np.ix_(f, np.maximum(a - 1, 0), u)]
+            anterior[:, a == 0, :] = np.nan
+            valores = (_razao(cubo['area'][c][np.ix_(f, a, u)], anterior) - 1) * 100
+
+        elif metrica == 'participacao':
+            total = self.niveis['nacional']['area'][c][np.ix_(f, a, [0])]
+            valores = _razao(cubo['area'][c][np.ix_(f, a, u)], total) * 100
+
+        else:
+            # IBGE em relação à CONAB, como gap_ibge_conab das bases agregadas; sem eixo de fonte
+            ibge = cubo['area'][c][np.ix_([FONTES.index('IBGE')], a, u)]
+            conab = cubo['area'][c][np.ix_([FONTES.index('CONAB')], a, u)]
+            valores = (_razao(ibge, conab) - 1) * 100
+
+        n_fontes, n_anos, n_ufs = valores.shape
+        colunas = {
+            'ano': np.tile(np.repeat(np.asarray(self.anos, dtype = 'int16')[a], n_ufs), n_fontes)
+        }
+        if nivel == 'uf':
+            colunas['uf'] = rotulos_uf * (n_fontes * n_anos)
+        if metrica != 'gap':
+            colunas['fonte'] = np.repeat([FONTES[i] for i in f], n_anos * n_ufs).tolist()
+        colunas['valor'] = valores.reshape(-1)
+
+        return colunas
+
+    def dimensions(self):
+        return {
+            'cultura': self.culturas,
+            'fonte': list(FONTES),
+            'ano': self.anos,
+            'uf': self.ufs
+        }
@@ -1,73 +1,565 @@
-import pandas as pd
+import gzip
+import hashlib
 import json
+import os
+import shutil
+from contextlib import contextmanager
+from functools import partial
+from importlib import metadata
 from pathlib import Path
 from config import Config
+from api import geometry
+from api.lazy import lazy_import
+import threading
 import time
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Importados no primeiro uso; o Copy-on-Write é ligado na importação do pandas (api/lazy.py)
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+
+class DataVersion:
+    # Tudo que pertence a uma versão dos dados; o loader troca a versão inteira de uma vez
+
+    def __init__(self, versao, diretorio = None):
+        self.versao = versao
+        self.diretorio = diretorio
+        self.data = {}
+        self.fontes = {}
+        self.indices = {}
+        self.derivados = {}
+        self.raw = {}
+        self.memoria = {}
+        self.compartilhado = {}
+        self.topologia = None
+        self.erros = []
+        self.lock = threading.RLock()
+
+
 class DataLoader:
+
+    # Índices construídos no carregamento: chave -> posições das linhas
+    INDICES = {
+        'base_municipios': [
+            ('cod_municipio',),
+            ('cod_municipio', 'ano'),
+            ('uf', 'ano')
+        ]
+    }
+    
+    # Tipos compactos aplicados no carregamento: textos repetidos viram category e códigos viram inteiros de largura fixa;
+    # variações e percentuais ficam numéricos e só viram texto na resposta (api/formatting.py)
+    SCHEMAS = {
+        'base_municipios': {
+            'cod_municipio': 'int32',
+            'ano': 'int16',
+            'municipio': 'category',
+            'uf': 'category',
+            'estado': 'category',
+            'ano_safra': 'category',
+            'variacao': 'float32',
+            'variacao_estado_ano': 'float32',
+            'representatividade_mun': 'float32',
+            'ranking': 'Int16'
+        },
+        'base_ibge': {'cod_municipio': 'int32', 'ano': 'int16'},
+        'base_conab': {'ano': 'int16', 'safra': 'category', 'uf': 'category'},
+        'df_2022': {'cod_municipio': 'int32'},
+        'mun_5100201': {'cod_municipio': 'int32', 'ano': 'int16'},
+        'df_nacional': {'ano': 'int16', 'fonte': 'category'},
+        'df_estadual': {'uf': 'category', 'ano': 'int16', 'fonte': 'category'},
+        'area_estadual': {
+            'uf': 'category',
+            'ano': 'int16',
+            'ano_safra': 'category'
+        }
+    }
+    
+    # Muda quando o layout dos arquivos Arrow compartilhados muda; entra no nome do diretório junto com SCHEMAS
+    FORMATO_COMPARTILHADO = 1
+
+    # Datasets processados pelo notebook de extração
+    DATA_FILES = {
+        'base_ibge': 'base_ibge.feather',
+        'base_conab': 'base_conab.feather',
+        'df_nacional': 'df_nacional.feather',
+        'df_estadual': 'df_estadual.feather',
+        'df_2022': 'df_2022.feather',
+        'mun_5100201': 'mun_5100201.feather',
+        'base_municipios': 'base_municipios.feather',
+        'area_nacional': 'area_nacional.feather',
+        'area_estadual': 'area_estadual.feather'
+    }
     
     def __init__(self):
-        self._data = {}
-        
-    def load_all_data(self):
-
-        data_files = {
-            'base_ibge': 'base_ibge.feather',
-            'base_conab': 'base_conab.feather',
-            'df_nacional': 'df_nacional.feather',
-            'df_estadual': 'df_estadual.feather',
-            'df_2022': 'df_2022.feather',
-            'mun_5100201': 'mun_5100201.feather',
-            'df_waterfall_conab_2019_2020': 'df_waterfall_conab_2019_2020.feather',
-            'df_waterfall_conab_2020_2021': 'df_waterfall_conab_2020_2021.feather',
-            'df_waterfall_conab_2021_2022': 'df_waterfall_conab_2021_2022.feather',
-            'df_waterfall_ibge_2019_2020': 'df_waterfall_ibge_2019_2020.feather',
-            'df_waterfall_ibge_2020_2021': 'df_waterfall_ibge_2020_2021.feather',
-            'base_municipios': 'base_municipios.feather',
-            'area_nacional': 'area_nacional.feather',
-            'area_estadual': 'area_estadual.feather'
+        self._atual = DataVersion(None)
+        self._local = threading.local()
+
+        # Leituras por dataset desde o início do processo, somando todas as versões
+        self._acessos = {}
+        self._acessos_lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._estado().versao
+
+    def _estado(self):
+        # Requisição em andamento continua na versão em que começou, mesmo que outra entre em uso
+        return getattr(self._local, 'estado', None) or self._atual
+
+    def state(self):
+        # Versão em uso por esta thread, para repassar com pin() a threads auxiliares
+        return self._estado()
+
+    def pin(self, estado = None):
+        self._local.estado = estado or self._atual
+
+    def unpin(self):
+        self._local.estado = None
+
+    @contextmanager
+    def pinned(self, estado):
+        anterior = getattr(self._local, 'estado', None)
+        self._local.estado = estado
+        try:
+            yield estado
+        finally:
+            self._local.estado = anterior
+
+    def source_files(self):
+        arquivos = [Config.DATA_DIR / f for f in self.DATA_FILES.values()]
+        arquivos.append(Config.GEOJSON_DIR / 'BrazilGeoJSON.geojson')
+        return arquivos
+
+    def current_version(self):
+        return self._compute_version(self.source_files())
+
+    def load_all_data(self, snapshot = None):
+        self.activate(self._build(snapshot))
+
+    def prepare(self):
+        # Monta a nova versão por inteiro fora do caminho das requisições; só entra em uso em activate
+        versao = self.current_version()
+        if versao == self._atual.versao:
+            return None
+
+        estado = self._build(versao = versao, anterior = self._atual)
+
+        # Datasets já usados na versão atual chegam prontos na nova
+        for dataset_name in list(self._atual.data):
+            if dataset_name in estado.fontes:
+                self._materialize(estado, dataset_name)
+
+        if estado.erros:
+            raise RuntimeError('; '.join(estado.erros))
+
+        return estado
+
+    def activate(self, estado):
+        # Troca de referência única: quem lê vê a versão antiga ou a nova, nunca uma mistura
+        self._atual = estado
+
+    def _build(self, snapshot = None, versao = None, anterior = None):
+        versao = snapshot['versao'] if snapshot else versao or self.current_version()
+        estado = DataVersion(versao, self._shared_dir(versao) if Config.SHARED_DATA else None)
+
+        # Apenas registra as fontes: cada dataset vira DataFrame no primeiro acesso
+        estado.fontes = {
+            key: partial(self._load_dataset, estado, key, Config.DATA_DIR / filename)
+            for key, filename in self.DATA_FILES.items()
         }
-        
-        for key, filename in data_files.items():
-            file_path = Config.DATA_DIR / filename
+
+        # Com snapshot as geometrias já vêm comprimidas e a variante do dashboard já renderizada
+        if snapshot:
+            self._restore_geojson(estado, snapshot['geometrias'])
+        else:
+            self._load_geojson(estado, anterior)
+
+        print(f"{len(estado.fontes)} datasets registrados (versão {versao})")
+
+        # Variante usada pelo dashboard fica pronta antes da primeira requisição
+        if estado.raw.get('geo_estados'):
+            self._render_geometry(estado, 'media', 'topojson')
+
+        return estado
+
+    def _shared_layout(self):
+        # Os arquivos dependem dos tipos aplicados e das bibliotecas que os gravam e leem, não só dos dados
+        hash_layout = hashlib.sha1()
+        hash_layout.update(json.dumps(self.SCHEMAS, sort_keys = True).encode('utf-8'))
+        hash_layout.update(f"{self.FORMATO_COMPARTILHADO}:{metadata.version('pyarrow')}:{metadata.version('pandas')}".encode('utf-8'))
+        return hash_layout.hexdigest()[:8]
+
+    def _shared_root(self):
+        # Um escopo por deploy (diretório de dados): instalações lado a lado no mesmo host não apagam as versões umas das outras
+        escopo = hashlib.sha1(str(Path(Config.DATA_DIR).resolve()).encode('utf-8')).hexdigest()[:8]
+        return Path(Config.SHARED_DATA_DIR) / escopo
+
+    def _shared_dir(self, versao):
+        # Um diretório por versão dos dados e layout; um deploy com outros SCHEMAS nunca lê arquivos do anterior
+        raiz = self._shared_root()
+        diretorio = raiz / f"{versao}-{self._shared_layout()}"
+
+        try:
+            diretorio.mkdir(parents = True, exist_ok = True)
+            os.utime(diretorio)
+        except OSError as e:
+            print(f"Diretório compartilhado indisponível ({e}), carregando em memória privada")
+            return None
+
+        self._prune_shared(raiz, diretorio)
+        return diretorio
+
+    def _prune_shared(self, raiz, atual):
+        # Fica a versão anterior mais recente e qualquer outra usada dentro da retenção: workers que ainda
+        # não trocaram de versão continuam mapeando seus arquivos. O uso renova o mtime do diretório
+        limite = time.time() - Config.SHARED_DATA_RETENTION
+        antigos = []
+
+        for diretorio in raiz.iterdir():
             try:
-                self._data[key] = pd.read_feather(file_path)
+                if diretorio.is_dir() and diretorio != atual:
+                    antigos.append((diretorio.stat().st_mtime, diretorio))
             except FileNotFoundError:
-                self._data[key] = pd.DataFrame()
-            except Exception as e:
-                print(f"Erro ao carregar {filename}: {e}")
-                self._data[key] = pd.DataFrame()
-        
-        
-        self._load_geojson()
-        
-    def _load_geojson(self):
+                continue
+
+        for modificado, antigo in sorted(antigos, reverse = True)[1:]:
+            if modificado < limite:
+                shutil.rmtree(antigo, ignore_errors = True)
+
+    def _load_dataset(self, estado, dataset_name, file_path):
+        if estado.diretorio is None:
+            return self._apply_schema(estado, dataset_name, pd.read_feather(file_path))
+
+        destino = estado.diretorio / f'{dataset_name}.arrow'
+        df = None
+
+        # Só o primeiro processo converte o feather; os demais apenas mapeiam o arquivo pronto
+        try:
+            if not destino.exists():
+                df = self._apply_schema(estado, dataset_name, pd.read_feather(file_path))
+                self._write_shared(estado, dataset_name, df, destino)
+
+            return self._attach_shared(estado, dataset_name, destino)
+        except OSError as e:
+            # Diretório removido enquanto esta versão ainda estava em uso: segue com uma cópia privada
+            print(f"Arquivo compartilhado de {dataset_name} indisponível ({e}), carregando em memória privada")
+            if df is None:
+                df = self._apply_schema(estado, dataset_name, pd.read_feather(file_path))
+            return df
+
+    def _write_shared(self, estado, dataset_name, df, destino):
+        tabela = pa.Table.from_pandas(df, preserve_index = False)
+        metadados = dict(tabela.schema.metadata or {})
+        metadados[b'memoria_antes'] = str(estado.memoria[dataset_name][0]).encode()
+        tabela = tabela.replace_schema_metadata(metadados)
+
+        # Sem compressão para que as colunas possam ser lidas direto do mapeamento
+        temporario = destino.with_suffix(f'.{os.getpid()}.tmp')
+        with pa.OSFile(str(temporario), 'wb') as saida:
+            with pa.ipc.new_file(saida, tabela.schema) as escritor:
+                escritor.write_table(tabela)
+
+        os.replace(temporario, destino)
+
+    def _attach_shared(self, estado, dataset_name, destino):
+        # Tabela aberta sobre o mapeamento: nenhuma coluna é lida do arquivo até a conversão
+        tabela = pa.ipc.open_file(pa.memory_map(str(destino))).read_all()
+
+        # split_blocks mantém cada coluna numérica como visão somente leitura sobre o mapeamento
+        df = tabela.to_pandas(split_blocks = True)
+
+        metadados = tabela.schema.metadata or {}
+        depois = int(df.memory_usage(deep = True).sum())
+        antes = int(metadados.get(b'memoria_antes', depois))
+
+        estado.memoria[dataset_name] = (antes, depois)
+        estado.compartilhado[dataset_name] = destino.stat().st_size
+        os.utime(estado.diretorio)
+        return df
+
+    def _apply_schema(self, estado, dataset_name, df):
+        antes = int(df.memory_usage(deep = True).sum())
+
+        for coluna, dtype in self.SCHEMAS.get(dataset_name, {}).items():
+            if coluna not in df.columns:
+                continue
+            try:
+                df[coluna] = df[coluna].astype(dtype)
+            except (TypeError, ValueError) as e:
+                print(f"Não foi possível converter {dataset_name}.{coluna} para {dtype}: {e}")
+
+        estado.memoria[dataset_name] = (antes, int(df.memory_usage(deep = True).sum()))
+        return df
+
+    def memory_report(self):
+        estado = self._estado()
+
+        return {
+            dataset_name: {
+                'antes': antes,
+                'depois': depois,
+                'compartilhado': estado.compartilhado.get(dataset_name, 0)
+            }
+            for dataset_name, (antes, depois) in estado.memoria.items()
+        }
+
+    def process_memory(self):
+        # Resumo do kernel: Pss divide as páginas compartilhadas entre os processos que as mapeiam
+        campos = {
+            'Rss': 'rss',
+            'Pss': 'pss',
+            'Shared_Clean': 'shared_clean',
+            'Shared_Dirty': 'shared_dirty',
+            'Private_Clean': 'private_clean',
+            'Private_Dirty': 'private_dirty'
+        }
+        memoria = {}
+
+        try:
+            with open('/proc/self/smaps_rollup') as f:
+                for linha in f:
+                    partes = linha.split()
+                    nome = partes[0].rstrip(':')
+                    if nome in campos:
+                        memoria[campos[nome]] = int(partes[1]) * 1024
+        except (FileNotFoundError, PermissionError):
+            return None
+
+        memoria['shared'] = memoria.get('shared_clean', 0) + memoria.get('shared_dirty', 0)
+        memoria['private'] = memoria.get('private_clean', 0) + memoria.get('private_dirty', 0)
+        return memoria
+
+    def _normalize_key(self, df, coluna, valor):
+        # Chaves chegam como texto da query string; colunas inteiras precisam do valor numérico
+        if coluna in df.columns and pd.api.types.is_integer_dtype(df[coluna].dtype) and isinstance(valor, str):
+            try:
+                return int(valor)
+            except ValueError:
+                return None
+        return valor
+
+    def _compute_version(self, arquivos):
+        # Hash do conteúdo dos arquivos: muda sempre que algum dataset muda
+        hash_versao = hashlib.sha1()
+
+        for file_path in arquivos:
+            hash_versao.update(file_path.name.encode('utf-8'))
+            try:
+                with open(file_path, 'rb') as f:
+                    for bloco in iter(lambda: f.read(1 << 20), b''):
+                        hash_versao.update(bloco)
+            except FileNotFoundError:
+                continue
+
+        return hash_versao.hexdigest()[:12]
+
+    def build_indices(self):
+        # Todos os índices declarados em INDICES, na versão em uso pela thread (a nova, durante a recarga):
+        # montados antes da troca, a primeira requisição não espera pelo groupby segurando o lock da versão
+        estado = self._estado()
+        for dataset_name, indices in self.INDICES.items():
+            for colunas in indices:
+                self._get_index(estado, dataset_name, colunas)
+
+    def _get_index(self, estado, dataset_name, colunas):
+        # Normalmente já montado por build_indices; senão, construído no primeiro uso e reaproveitado depois
+        chave = (dataset_name, colunas)
+        if chave in estado.indices:
+            return estado.indices[chave]
+
+        with estado.lock:
+            if chave not in estado.indices:
+                df = self._get(estado, dataset_name)
+
+                if df.empty or not set(colunas).issubset(df.columns):
+                    grupos = None
+                else:
+                    grupos = df.groupby(list(colunas) if len(colunas) > 1 else colunas[0], observed = True).indices
+
+                estado.indices[chave] = grupos
+
+        return estado.indices[chave]
+
+    def _load_geojson(self, estado, anterior = None):
         geojson_path = Config.GEOJSON_DIR / 'BrazilGeoJSON.geojson'
         try:
-            with open(geojson_path, 'r', encoding='utf-8') as f:
-                self._data['geo_estados'] = json.load(f)
-                print(f"GeoJSON dos estados carregado")
+            with open(geojson_path, 'rb') as f:
+                conteudo = f.read()
+
+            # O dicionário só é montado se alguém pedir; a topologia é gerada a partir dos bytes
+            estado.fontes['geo_estados'] = partial(json.loads, conteudo)
+
+            # Recarga só de datasets: malha igual à da versão anterior, variantes e topologia reaproveitadas
+            original = anterior.raw.get('geo_estados') if anterior else None
+            if original and original['variantes']['identity'] == conteudo:
+                estado.raw.update({nome: recurso for nome, recurso in anterior.raw.items() if nome.startswith('geo_estados')})
+                estado.topologia = anterior.topologia
+                return
+
+            estado.raw['geo_estados'] = self._precompress(conteudo)
+            print(f"GeoJSON dos estados carregado")
         except FileNotFoundError:
             print(f"GeoJSON dos estados não encontrado")
-            self._data['geo_estados'] = {}
+            estado.data['geo_estados'] = {}
+
+    def _restore_geojson(self, estado, geometrias):
+        estado.raw.update(geometrias)
+        if 'geo_estados' in geometrias:
+            # Os bytes só saem do snapshot se alguém pedir o dicionário
+            variantes = geometrias['geo_estados']['variantes']
+            estado.fontes['geo_estados'] = lambda: json.loads(variantes['identity'])
+
+    def raw_resources(self):
+        return dict(self._estado().raw)
+
+    def _precompress(self, conteudo):
+        # Bytes originais e variantes comprimidas, prontos para servir sem reserializar
+        variantes = {
+            'identity': conteudo,
+            'gzip': gzip.compress(conteudo, compresslevel = 6)
+        }
+
+        if brotli is not None:
+            variantes['br'] = brotli.compress(conteudo, quality = 9)
+
+        return {
+            'etag': hashlib.sha1(conteudo).hexdigest()[:16],
+            'variantes': variantes
+        }
+
+    def _materialize(self, estado, dataset_name):
+        with estado.lock:
+            if dataset_name in estado.data:
+                return estado.data[dataset_name]
+
+            try:
+                dados = estado.fontes[dataset_name]()
+            except FileNotFoundError:
+                dados = pd.DataFrame()
+            except Exception as e:
+                print(f"Erro ao carregar {dataset_name}: {e}")
+                estado.erros.append(f"{dataset_name}: {e}")
+                dados = pd.DataFrame()
+
+            estado.data[dataset_name] = dados
+            return dados
+
+    def _get(self, estado, dataset_name):
+        with self._acessos_lock:
+            self._acessos[dataset_name] = self._acessos.get(dataset_name, 0) + 1
+
+        dados = estado.data.get(dataset_name)
+
+        if dados is None:
+            if dataset_name not in estado.fontes:
+                raise KeyError(f"Dataset '{dataset_name}' não está carregado")
+            dados = self._materialize(estado, dataset_name)
+
+        return dados
+
+    def access_counts(self):
+        with self._acessos_lock:
+            return dict(self._acessos)
+
+    def get(self, dataset_name, copy = False):
+        dados = self._get(self._estado(), dataset_name)
+
+        if copy:
+            return dados.copy()
+
+        # Visão somente leitura: escritas do chamador nunca alteram o cache
+        if isinstance(dados, pd.DataFrame):
+            return dados.copy(deep = False)
+
+        return dados.copy()
     
-    def get(self, dataset_name):
-        if dataset_name not in self._data:
+    def derived(self, chave, calcular):
+        # Resultado derivado dos datasets, calculado uma vez por versão e descartado junto com ela
+        estado = self._estado()
+        if chave in estado.derivados:
+            return estado.derivados[chave]
+
+        with estado.lock:
+            if chave not in estado.derivados:
+                with self.pinned(estado):
+                    estado.derivados[chave] = calcular()
+
+        return estado.derivados[chave]
+
+    def get_raw(self, dataset_name):
+        estado = self._estado()
+
+        if dataset_name not in estado.raw:
             raise KeyError(f"Dataset '{dataset_name}' não está carregado")
-        return self._data[dataset_name].copy()
+        return estado.raw[dataset_name]
+    
+    def get_geometry(self, resolucao = 'alta', formato = 'geojson'):
+        return self._render_geometry(self._estado(), resolucao, formato)
+
+    def _render_geometry(self, estado, resolucao, formato):
+        if resolucao == 'alta' and formato == 'geojson':
+            return estado.raw['geo_estados']
+
+        nome = f'geo_estados_{resolucao}_{formato}'
+
+        # Variantes simplificadas são geradas no primeiro acesso e mantidas em memória
+        with estado.lock:
+            if nome not in estado.raw:
+                if estado.topologia is None:
+                    geojson = estado.data.get('geo_estados') or estado.fontes['geo_estados']()
+                    estado.topologia = geometry.build_topology(geojson)
+
+                estado.raw[nome] = self._precompress(geometry.render(estado.topologia, resolucao, formato))
+
+        return estado.raw[nome]
     
     def get_filtered(self, dataset_name, **filters):
-        df = self.get(dataset_name)
+        return self._filter(self._get(self._estado(), dataset_name), filters)
+
+    def _filter(self, df, filters):
+        df = df.copy(deep = False)
         
         # Aplicando cada filtro
         for column, value in filters.items():
             if column in df.columns:
+                value = [self._normalize_key(df, column, v) for v in value] if isinstance(value, list) else self._normalize_key(df, column, value)
                 if isinstance(value, list):
                     df = df[df[column].isin(value)]
                 else:
                     df = df[df[column] == value]
         
         return df
+    
+    def get_by_index(self, dataset_name, **chaves):
+        # Índice e DataFrame da mesma versão, mesmo que uma troca aconteça no meio da chamada
+        estado = self._estado()
+        colunas = tuple(chaves.keys())
+        indice = None
+
+        for colunas_indice in self.INDICES.get(dataset_name, []):
+            if set(colunas_indice) == set(colunas):
+                indice = self._get_index(estado, dataset_name, colunas_indice)
+                colunas = colunas_indice
+                break
+
+        df = self._get(estado, dataset_name)
+
+        # Sem índice para essa combinação de colunas: varredura completa
+        if indice is None:
+            return self._filter(df, chaves)
+
+        chave = tuple(self._normalize_key(df, c, chaves[c]) for c in colunas)
+        if len(chave) == 1:
+            chave = chave[0]
+
+        posicoes = indice.get(chave, [])
+
+        return df.iloc[posicoes]
 
 
-data_loader = DataLoader()
\ No newline at end of file
+data_loader = DataLoader()
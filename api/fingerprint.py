@@ -0,0 +1,29 @@
+import hashlib
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Bibliotecas que mudam o conteúdo das respostas (arredondamento, serialização, tipos)
+BIBLIOTECAS = ('pandas', 'numpy', 'pyarrow', 'orjson', 'duckdb')
+
+
+@lru_cache(maxsize = None)
+def code_version():
+    # Hash do código que gera as respostas (api/*.py e config.py) e das versões das bibliotecas;
+    # muda a cada deploy que altere o código, mesmo com os mesmos arquivos de dados.
+    # Lido como bytes, sem importar nada pesado: serve antes do pandas estar carregado
+    hash_codigo = hashlib.sha1()
+
+    for arquivo in sorted((RAIZ / 'api').glob('*.py')) + [RAIZ / 'config.py']:
+        hash_codigo.update(arquivo.name.encode('utf-8'))
+        hash_codigo.update(arquivo.read_bytes())
+
+    for biblioteca in BIBLIOTECAS:
+        try:
+            hash_codigo.update(f"{biblioteca}={metadata.version(biblioteca)}".encode('utf-8'))
+        except metadata.PackageNotFoundError:
+            continue
+
+    return hash_codigo.hexdigest()[:12]
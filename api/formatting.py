@@ -0,0 +1,94 @@
+from api.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# Textos pt-BR gerados a partir das colunas numéricas: os datasets guardam só os números e cada resposta
+# formata as linhas que vai entregar. Cada função recebe a coluna inteira (Series ou array) e devolve uma
+# lista; o arredondamento é o do numpy, o mesmo das bases antigas, e vem antes de decidir sinal e cor
+# para que o texto e a classificação nunca discordem.
+
+SEM_DADOS = 'Sem dados para comparação'
+
+
+def _arredondar(valores, casas):
+    return np.round(np.asarray(valores, dtype = 'float64'), casas).tolist()
+
+
+def _numero(valor):
+    # str do float arredondado (3.2, 100.0, 0.19): mesmo texto das bases antigas
+    return str(valor).replace('.', ',')
+
+
+def harvest(anos, deslocamento = 0):
+    # Safra "aa/aa" terminada em ano - deslocamento
+    return [
+        f"{(ano - deslocamento - 1) % 100:02d}/{(ano - deslocamento) % 100:02d}"
+        for ano in np.asarray(anos, dtype = 'int64').tolist()
+    ]
+
+
+def percent(valores, casas = 1, nulo = '-'):
+    # "3,2%", "-1,5%"
+    return [nulo if v != v else f"{_numero(v)}%" for v in _arredondar(valores, casas)]
+
+
+def variation(valores, anos, casas = 1, nulo = '-'):
+    # "+3,2% vs 17/18" em altas, "-3,2% vs 17/18" em quedas e "0% vs 17/18" sem variação
+    textos = []
+
+    for v, safra in zip(_arredondar(valores, casas), harvest(anos, 1)):
+        if v != v:
+            textos.append(nulo)
+        elif v > 0:
+            textos.append(f"+{_numero(v)}% vs {safra}")
+        elif v < 0:
+            textos.append(f"-{_numero(-v)}% vs {safra}")
+        else:
+            textos.append(f"0% vs {safra}")
+
+    return textos
+
+
+def gap(valores, casas = 2, nulo = '-'):
+    # Diferença entre as fontes em módulo, "+0,19%"; qual fonte é maior vai em gap_text
+    return [nulo if v != v else f"+{_numero(abs(v))}%" for v in _arredondar(valores, casas)]
+
+
+def gap_text(valores, anos, casas = 2):
+    return [
+        SEM_DADOS if v != v else f"{'CONAB' if v < 0 else 'IBGE'} superior em {safra}"
+        for v, safra in zip(_arredondar(valores, casas), harvest(anos))
+    ]
+
+
+def gap_summary(valores, anos, casas = 2):
+    # Texto do hover das barras: "IBGE superior em 18/19 com +0,19%"
+    return [
+        texto if valor == '-' else f"{texto} com {valor}"
+        for texto, valor in zip(gap_text(valores, anos, casas), gap(valores, casas))
+    ]
+
+
+def historical_comparison(valores, referencia = None):
+    # Acima ou abaixo da média da série; referencia é a série completa quando valores é só um recorte
+    valores = np.asarray(valores, dtype = 'float64')
+    media = np.nanmean(np.asarray(valores if referencia is None else referencia, dtype = 'float64'))
+
+    return ['Acima da média histórica' if v > media else 'Abaixo da média histórica' for v in valores.tolist()]
+
+
+def count_variation(valores, casas = 2):
+    # Variação da quantidade de municípios: "Aumento de 2,11%"
+    return [
+        SEM_DADOS if v != v else f"{'Diminuição' if v < 0 else 'Aumento'} de {_numero(v)}%"
+        for v in _arredondar(valores, casas)
+    ]
+
+
+def ranking(valores, nulo = None):
+    return [nulo if v != v else f"{int(v)}º no estado" for v in np.asarray(valores, dtype = 'float64').tolist()]
+
+
+def thousands(valor):
+    # Inteiro com separador de milhar pt-BR: 2.472
+    return f"{int(valor):,}".replace(',', '.')
@@ -0,0 +1,256 @@
+from api.json_provider import dumps
+from api.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+
+# Tolerância de simplificação (graus) e grade de quantização do TopoJSON por resolução
+RESOLUCOES = {
+    'alta': {'tolerancia': 0.0, 'quantizacao': 1_000_000},
+    'media': {'tolerancia': 0.005, 'quantizacao': 100_000},
+    'baixa': {'tolerancia': 0.02, 'quantizacao': 10_000}
+}
+
+FORMATOS = ['geojson', 'topojson']
+
+
+def _poligonos(geometria):
+    if geometria['type'] == 'Polygon':
+        return [geometria['coordinates']]
+    if geometria['type'] == 'MultiPolygon':
+        return geometria['coordinates']
+    return []
+
+
+def _aneis(geojson):
+    # Anéis sem o ponto de fechamento, como tuplas para comparar coordenadas exatas
+    for feature in geojson.get('features', []):
+        for poligono in _poligonos(feature['geometry']):
+            for anel in poligono:
+                pontos = [tuple(p) for p in anel]
+                if len(pontos) > 1 and pontos[0] == pontos[-1]:
+                    pontos = pontos[:-1]
+                yield pontos
+
+
+def _junctions(geojson):
+    # Um ponto é junção quando aparece em anéis com vizinhos diferentes: é onde uma fronteira compartilhada começa ou termina
+    vizinhos = {}
+    junctions = set()
+
+    for pontos in _aneis(geojson):
+        n = len(pontos)
+        for i, ponto in enumerate(pontos):
+            par = frozenset((pontos[i - 1], pontos[(i + 1) % n]))
+            anterior = vizinhos.setdefault(ponto, par)
+            if anterior != par:
+                junctions.add(ponto)
+
+    return junctions
+
+
+def build_topology(geojson):
+    junctions = _junctions(geojson)
+    arcs = []
+    indice_arcs = {}
+
+    def registrar_arc(pontos):
+        chave = tuple(pontos)
+        if chave in indice_arcs:
+            return indice_arcs[chave]
+
+        # Arcos compartilhados aparecem invertidos no anel do estado vizinho
+        invertido = chave[::-1]
+        if invertido in indice_arcs:
+            return ~indice_arcs[invertido]
+
+        indice_arcs[chave] = len(arcs)
+        arcs.append(np.array(pontos, dtype = float))
+        return indice_arcs[chave]
+
+    def cortar_anel(pontos):
+        cortes = [i for i, p in enumerate(pontos) if p in junctions]
+
+        # Anel sem junção: começa no menor ponto para que a cópia do vizinho gere o mesmo arco
+        if not cortes:
+            inicio = pontos.index(min(pontos))
+            pontos = pontos[inicio:] + pontos[:inicio]
+            return [registrar_arc(pontos + [pontos[0]])]
+
+        pontos = pontos[cortes[0]:] + pontos[:cortes[0]]
+        cortes = [c - cortes[0] for c in cortes] + [len(pontos)]
+        pontos = pontos + [pontos[0]]
+
+        return [registrar_arc(pontos[a:b + 1]) for a, b in zip(cortes[:-1], cortes[1:])]
+
+    objetos = []
+
+    for feature in geojson.get('features', []):
+        poligonos = []
+        for poligono in _poligonos(feature['geometry']):
+            aneis = []
+            for anel in poligono:
+                pontos = [tuple(p) for p in anel]
+                if len(pontos) > 1 and pontos[0] == pontos[-1]:
+                    pontos = pontos[:-1]
+                aneis.append(cortar_anel(pontos))
+            poligonos.append(aneis)
+
+        objetos.append({
+            'properties': feature.get('properties', {}),
+            'poligonos': poligonos
+        })
+
+    return {'arcs': arcs, 'objetos': objetos}
+
+
+def _douglas_peucker(pontos, tolerancia):
+    manter = np.zeros(len(pontos), dtype = bool)
+    manter[0] = manter[-1] = True
+    pilha = [(0, len(pontos) - 1)]
+
+    while pilha:
+        inicio, fim = pilha.pop()
+        if fim - inicio < 2:
+            continue
+
+        a, b = pontos[inicio], pontos[fim]
+        trecho = pontos[inicio + 1:fim]
+        segmento = b - a
+        comprimento = np.hypot(*segmento)
+
+        if comprimento == 0:
+            distancias = np.hypot(*(trecho - a).T)
+        else:
+            distancias = np.abs(segmento[0] * (trecho[:, 1] - a[1]) - segmento[1] * (trecho[:, 0] - a[0])) / comprimento
+
+        i = int(np.argmax(distancias))
+        if distancias[i] > tolerancia:
+            meio = inicio + 1 + i
+            manter[meio] = True
+            pilha.append((inicio, meio))
+            pilha.append((meio, fim))
+
+    return manter
+
+
+def simplify_arc(pontos, tolerancia):
+    if tolerancia <= 0 or len(pontos) <= 2:
+        return pontos
+
+    manter = _douglas_peucker(pontos, tolerancia)
+
+    # Arco fechado (anel inteiro): garante ao menos um triângulo
+    if len(pontos) > 3 and np.array_equal(pontos[0], pontos[-1]):
+        distancias = np.hypot(*(pontos - pontos[0]).T)
+        distante = int(np.argmax(distancias))
+        manter[distante] = True
+
+        a, b = pontos[0], pontos[distante]
+        segmento = b - a
+        desvio = np.abs(segmento[0] * (pontos[:, 1] - a[1]) - segmento[1] * (pontos[:, 0] - a[0]))
+        manter[int(np.argmax(desvio))] = True
+
+    return pontos[manter]
+
+
+def _montar_anel(arcs, indices):
+    coordenadas = []
+    for indice in indices:
+        arc = arcs[indice] if indice >= 0 else arcs[~indice][::-1]
+        coordenadas.extend(arc.tolist() if not coordenadas else arc[1:].tolist())
+    return coordenadas
+
+
+def _pontos_anel(tamanhos, indices):
+    # Pontos do anel montado pelos arcos; a junção entre dois arcos conta uma vez
+    return 1 + sum(tamanhos[indice if indice >= 0 else ~indice] - 1 for indice in indices)
+
+
+def to_geojson(topologia, tolerancia):
+    arcs = [simplify_arc(arc, tolerancia) for arc in topologia['arcs']]
+    features = []
+
+    for objeto in topologia['objetos']:
+        poligonos = []
+        for poligono in objeto['poligonos']:
+            aneis = [_montar_anel(arcs, anel) for anel in poligono]
+
+            # Anéis que degeneraram na simplificação são descartados (ilhas muito pequenas)
+            if len(aneis[0]) < 4:
+                continue
+            poligonos.append([aneis[0]] + [anel for anel in aneis[1:] if len(anel) >= 4])
+
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'MultiPolygon', 'coordinates': poligonos},
+            'properties': objeto['properties']
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def to_topojson(topologia, tolerancia, quantizacao):
+    arcs = [simplify_arc(arc, tolerancia) for arc in topologia['arcs']]
+
+    todos = np.concatenate(arcs)
+    x0, y0 = todos.min(axis = 0)
+    x1, y1 = todos.max(axis = 0)
+    kx = (x1 - x0) / (quantizacao - 1) or 1
+    ky = (y1 - y0) / (quantizacao - 1) or 1
+
+    arcs_quantizados = []
+    for arc in arcs:
+        q = np.round((arc - [x0, y0]) / [kx, ky]).astype(np.int64)
+
+        # Pontos que caem na mesma célula da grade são redundantes
+        repetido = np.r_[False, (q[1:] == q[:-1]).all(axis = 1)]
+        repetido[-1] = False
+        q = q[~repetido]
+
+        deltas = np.vstack([q[:1], np.diff(q, axis = 0)])
+        arcs_quantizados.append(deltas.tolist())
+
+    # Como no GeoJSON, anéis com menos de 4 pontos depois da simplificação e da grade são descartados
+    tamanhos = [len(arc) for arc in arcs_quantizados]
+    geometrias = []
+
+    for objeto in topologia['objetos']:
+        poligonos = []
+        for poligono in objeto['poligonos']:
+            if _pontos_anel(tamanhos, poligono[0]) < 4:
+                continue
+            poligonos.append([poligono[0]] + [anel for anel in poligono[1:] if _pontos_anel(tamanhos, anel) >= 4])
+
+        geometrias.append({
+            'type': 'MultiPolygon',
+            'arcs': poligonos,
+            'properties': objeto['properties']
+        })
+
+    return {
+        'type': 'Topology',
+        'bbox': [float(x0), float(y0), float(x1), float(y1)],
+        'transform': {
+            'scale': [float(kx), float(ky)],
+            'translate': [float(x0), float(y0)]
+        },
+        'objects': {
+            'estados': {
+                'type': 'GeometryCollection',
+                'geometries': geometrias
+            }
+        },
+        'arcs': arcs_quantizados
+    }
+
+
+def render(topologia, resolucao = 'alta', formato = 'geojson'):
+    parametros = RESOLUCOES[resolucao]
+
+    if formato == 'topojson':
+        dados = to_topojson(topologia, parametros['tolerancia'], parametros['quantizacao'])
+    else:
+        dados = to_geojson(topologia, parametros['tolerancia'])
+
+    return dumps(dados)
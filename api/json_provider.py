@@ -0,0 +1,116 @@
+import dataclasses
+import decimal
+import json
+import math
+import uuid
+from datetime import date
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from api.metrics import timed
+from api.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o):
+    # Tipos numpy/pandas que chegam dos DataFrames sem passar por .tolist()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+
+    if isinstance(o, np.generic):
+        return o.item()
+
+    if isinstance(o, (pd.Series, pd.Index, pd.Categorical)):
+        return np.asarray(o).tolist()
+
+    if o is pd.NA or o is pd.NaT:
+        return None
+
+    if isinstance(o, pd.Timestamp):
+        return o.isoformat()
+
+    if isinstance(o, date):
+        return o.isoformat()
+
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+
+    raise TypeError(f"Objeto do tipo {type(o).__name__} não é serializável em JSON")
+
+
+def _sem_nan(obj):
+    # O json da biblioteca padrão escreve NaN/Infinity (JSON inválido); o orjson escreve null
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+
+    if isinstance(obj, dict):
+        return {chave: _sem_nan(valor) for chave, valor in obj.items()}
+
+    if isinstance(obj, (list, tuple)):
+        return [_sem_nan(valor) for valor in obj]
+
+    if isinstance(obj, (np.ndarray, np.generic, pd.Series, pd.Index, pd.Categorical)):
+        return _sem_nan(_default(obj))
+
+    return obj
+
+
+def dumps(obj):
+    # JSON compacto em UTF-8, para conteúdo montado uma vez e servido como bytes
+    if orjson is not None:
+        return orjson.dumps(obj, default = _default, option = orjson.OPT_SERIALIZE_NUMPY)
+
+    return json.dumps(_sem_nan(obj), default = _default, separators = (',', ':'), ensure_ascii = False).encode('utf-8')
+
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    # json da biblioteca padrão, usado quando o orjson não está instalado; mesma saída do OrjsonProvider:
+    # NaN e infinitos viram null e o texto sai em UTF-8, sem escapes \u
+
+    default = staticmethod(_default)
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        return super().dumps(_sem_nan(obj), **kwargs)
+
+    @timed('serializacao')
+    def response(self, *args, **kwargs):
+        return super().response(*args, **kwargs)
+
+
+class OrjsonProvider(JSONProvider):
+    # Arrays e escalares numpy são serializados direto, sem passar por listas Python;
+    # chaves ordenadas como no provider padrão do Flask e NaN vira null
+
+    OPCOES = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default = _default, option = self.OPCOES).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    @timed('serializacao')
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        opcoes = self.OPCOES | (orjson.OPT_INDENT_2 if self._app.debug else 0)
+
+        return self._app.response_class(
+            orjson.dumps(obj, default = _default, option = opcoes),
+            mimetype = 'application/json'
+        )
+
+
+def json_provider(app):
+    return OrjsonProvider(app) if orjson is not None else NumpyJSONProvider(app)
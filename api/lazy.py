@@ -0,0 +1,59 @@
+import importlib
+import threading
+from importlib import util
+
+# Configuração aplicada assim que a biblioteca é importada, por qualquer módulo.
+# Com Copy-on-Write os DataFrames derivados compartilham memória com o cache
+# e só copiam uma coluna quando ela é efetivamente modificada
+CONFIGURACAO = {
+    'pandas': lambda pd: pd.set_option('mode.copy_on_write', True)
+}
+
+_modulos = {}
+_modulos_lock = threading.Lock()
+
+
+class LazyModule:
+    # Módulo importado no primeiro acesso a um atributo: com o snapshot de inicialização as respostas
+    # pré-computadas e as geometrias são servidas antes de pandas/numpy/pyarrow/duckdb serem carregados
+
+    def __init__(self, nome):
+        self._nome = nome
+        self._modulo = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._modulo is None:
+                modulo = importlib.import_module(self._nome)
+                if self._nome in CONFIGURACAO:
+                    CONFIGURACAO[self._nome](modulo)
+                self._modulo = modulo
+
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._modulo or self.load(), atributo)
+
+    def __repr__(self):
+        return f"<LazyModule {self._nome}{'' if self._modulo is None else ' (carregado)'}>"
+
+
+def lazy_import(nome, opcional = False):
+    # Um proxy por módulo, compartilhado; opcional: None se a biblioteca não estiver instalada
+    if opcional and util.find_spec(nome.partition('.')[0]) is None:
+        return None
+
+    with _modulos_lock:
+        if nome not in _modulos:
+            _modulos[nome] = LazyModule(nome)
+        return _modulos[nome]
+
+
+def load_all():
+    # Importa tudo o que foi adiado, por exemplo no master do gunicorn antes do fork
+    with _modulos_lock:
+        modulos = list(_modulos.values())
+
+    for modulo in modulos:
+        modulo.load()
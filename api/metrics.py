@@ -0,0 +1,276 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+from flask import Response, g, has_request_context, request
+
+# Limites dos histogramas em segundos, do acerto de cache ao processamento de uma base grande
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Fases medidas dentro da requisição; 'total' vai do before_request ao after_request
+FASES = ('processamento', 'serializacao', 'total')
+
+
+def timed(fase):
+    # Soma o tempo da função na fase da requisição atual; chamadas aninhadas da mesma fase contam uma vez
+    def decorator(funcao):
+        @wraps(funcao)
+        def wrapper(*args, **kwargs):
+            if not has_request_context():
+                return funcao(*args, **kwargs)
+
+            fases = g.get('metricas_fases')
+            if fases is None or fase in g.metricas_ativas:
+                return funcao(*args, **kwargs)
+
+            g.metricas_ativas.add(fase)
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                fases[fase] = fases.get(fase, 0.0) + time.perf_counter() - inicio
+                g.metricas_ativas.discard(fase)
+
+        return wrapper
+
+    return decorator
+
+
+def profiling():
+    # Requisição de desenvolvimento com ?_profile: o cache de respostas não é consultado
+    return has_request_context() and g.get('metricas_perfil') is not None
+
+
+class StackSampler:
+    # Amostra a pilha da thread da requisição em intervalos fixos, no formato "folded" dos flamegraphs
+
+    def __init__(self, thread_id, intervalo = 0.001):
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target = self._amostrar, name = 'perfil', daemon = True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._parar.set()
+        self._thread.join()
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                frame = frame.f_back
+            # Amostra tirada depois do stop() mostraria o próprio profiler
+            if pilha and not self._parar.is_set():
+                self.pilhas[';'.join(reversed(pilha))] += 1
+
+    def render(self):
+        return ''.join(f"{pilha} {quantidade}\n" for pilha, quantidade in self.pilhas.most_common())
+
+
+def _nome_funcao(funcao):
+    arquivo, _, nome = funcao
+    return nome if arquivo == '~' else f"{os.path.basename(arquivo)}:{nome}"
+
+
+def folded_from_profile(perfil):
+    # Pilhas "folded" reconstruídas das arestas chamador -> chamado do cProfile, em microssegundos.
+    # O tempo de cada aresta é dividido na proporção do tempo próprio da função e das arestas que ela chama;
+    # aproximado quando uma função é chamada de vários lugares, mas nunca vazio
+    estatisticas = pstats.Stats(perfil).stats
+    chamados = defaultdict(dict)
+    for funcao, (_, _, _, _, chamadores) in estatisticas.items():
+        for chamador, (_, _, _, acumulado) in chamadores.items():
+            chamados[chamador][funcao] = acumulado
+
+    pilhas = Counter()
+
+    def percorrer(funcao, caminho, tempo):
+        _, _, proprio, acumulado, _ = estatisticas[funcao]
+        if acumulado <= 0 or tempo * 1e6 < 1:
+            return
+
+        caminho = caminho + (funcao,)
+        pilhas[';'.join(_nome_funcao(f) for f in caminho)] += tempo * proprio / acumulado
+
+        for chamado, tempo_aresta in chamados[funcao].items():
+            # Recursão: o tempo já está contado na primeira ocorrência da função na pilha
+            if chamado not in caminho:
+                percorrer(chamado, caminho, tempo * tempo_aresta / acumulado)
+
+    for funcao, (_, _, _, acumulado, chamadores) in estatisticas.items():
+        if not chamadores:
+            percorrer(funcao, (), acumulado)
+
+    micros = Counter({pilha: round(tempo * 1e6) for pilha, tempo in pilhas.items() if tempo * 1e6 >= 1})
+    return ''.join(f"{pilha} {quantidade}\n" for pilha, quantidade in micros.most_common())
+
+
+class RequestMetrics:
+    # Tempos por endpoint e fase, contadores de requisições e perfil opcional, por processo
+
+    def __init__(self):
+        self.profile_enabled = False
+        self._requisicoes = Counter()
+        self._histogramas = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.profile_enabled = app.config.get('PROFILE_REQUESTS', False)
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+
+    def _iniciar(self):
+        g.metricas_inicio = time.perf_counter()
+        g.metricas_fases = {}
+        g.metricas_ativas = set()
+
+        modo = request.args.get('_profile')
+        if not self.profile_enabled or modo in (None, '', '0'):
+            return
+
+        # No modo folded o cProfile roda junto: requisições mais curtas que o intervalo de amostragem
+        # não geram amostras e as pilhas saem dele
+        perfil = cProfile.Profile()
+        if modo == 'folded':
+            perfil = (StackSampler(threading.get_ident()), perfil)
+            perfil[0].start()
+            perfil[1].enable()
+        else:
+            perfil.enable()
+
+        g.metricas_perfil = perfil
+
+    def _finalizar(self, resposta):
+        inicio = g.get('metricas_inicio')
+        if inicio is None:
+            return resposta
+
+        fases = g.metricas_fases
+        fases['total'] = time.perf_counter() - inicio
+
+        # Requisições com perfil ficam fora dos histogramas: o profiler distorce os tempos
+        perfil = g.get('metricas_perfil')
+        if perfil is not None:
+            original = resposta
+            resposta = self._resposta_perfil(perfil)
+
+            # O perfil troca o corpo, não a política de acesso: os cabeçalhos de CORS já aplicados à
+            # resposta original passam para a do perfil, qualquer que seja a ordem dos hooks
+            resposta.headers.extend([
+                (nome, valor) for nome, valor in original.headers.items()
+                if nome.startswith('Access-Control-') or nome == 'Vary'
+            ])
+        else:
+            endpoint = request.url_rule.rule if request.url_rule else 'desconhecido'
+            self.observe(endpoint, request.method, resposta.status_code, fases)
+
+        resposta.headers['Server-Timing'] = ', '.join(
+            f"{fase};dur={fases[fase] * 1000:.2f}" for fase in FASES if fase in fases
+        )
+
+        return resposta
+
+    def _resposta_perfil(self, perfil):
+        # X-Profile marca que o corpo foi trocado pelo perfil; a unidade das pilhas depende da origem
+        if isinstance(perfil, tuple):
+            amostrador, perfil = perfil
+            perfil.disable()
+            amostrador.stop()
+
+            if amostrador.pilhas:
+                resposta = Response(amostrador.render(), mimetype = 'text/plain')
+                resposta.headers['X-Profile-Unit'] = 'samples'
+            else:
+                resposta = Response(folded_from_profile(perfil), mimetype = 'text/plain')
+                resposta.headers['X-Profile-Unit'] = 'microseconds'
+
+            resposta.headers['X-Profile'] = 'folded'
+            return resposta
+
+        perfil.disable()
+        saida = io.StringIO()
+        pstats.Stats(perfil, stream = saida).sort_stats('cumulative').print_stats(60)
+
+        resposta = Response(saida.getvalue(), mimetype = 'text/plain')
+        resposta.headers['X-Profile'] = 'cprofile'
+        return resposta
+
+    def observe(self, endpoint, metodo, status, fases):
+        with self._lock:
+            self._requisicoes[(endpoint, metodo, status)] += 1
+
+            for fase, duracao in fases.items():
+                histograma = self._histogramas.get((endpoint, fase))
+                if histograma is None:
+                    histograma = self._histogramas[(endpoint, fase)] = [[0] * len(BUCKETS), 0.0, 0]
+
+                for i, limite in enumerate(BUCKETS):
+                    if duracao <= limite:
+                        histograma[0][i] += 1
+                histograma[1] += duracao
+                histograma[2] += 1
+
+    def render(self, acessos, cache_stats):
+        # Formato texto do Prometheus; com vários workers cada coleta vem de um processo (rótulo pid)
+        with self._lock:
+            requisicoes = dict(self._requisicoes)
+            histogramas = {chave: (list(b), soma, n) for chave, (b, soma, n) in self._histogramas.items()}
+
+        linhas = [
+            '# HELP kynetec_processo_info Processo que respondeu a coleta e versão dos dados em uso',
+            '# TYPE kynetec_processo_info gauge',
+            f'kynetec_processo_info{{pid="{os.getpid()}",versao="{cache_stats["version"]}"}} 1',
+            '# HELP kynetec_requisicoes_total Requisições respondidas por endpoint, método e status',
+            '# TYPE kynetec_requisicoes_total counter'
+        ]
+        for (endpoint, metodo, status), quantidade in sorted(requisicoes.items()):
+            linhas.append(f'kynetec_requisicoes_total{{endpoint="{endpoint}",metodo="{metodo}",status="{status}"}} {quantidade}')
+
+        linhas += [
+            '# HELP kynetec_requisicao_segundos Duração por endpoint e fase (processamento, serializacao, total)',
+            '# TYPE kynetec_requisicao_segundos histogram'
+        ]
+        for (endpoint, fase), (buckets, soma, n) in sorted(histogramas.items()):
+            rotulos = f'endpoint="{endpoint}",fase="{fase}"'
+            for limite, quantidade in zip(BUCKETS, buckets):
+                linhas.append(f'kynetec_requisicao_segundos_bucket{{{rotulos},le="{limite}"}} {quantidade}')
+            linhas.append(f'kynetec_requisicao_segundos_bucket{{{rotulos},le="+Inf"}} {n}')
+            linhas.append(f'kynetec_requisicao_segundos_sum{{{rotulos}}} {soma:.6f}')
+            linhas.append(f'kynetec_requisicao_segundos_count{{{rotulos}}} {n}')
+
+        linhas += [
+            '# HELP kynetec_dataset_acessos_total Leituras de cada dataset pelo DataLoader',
+            '# TYPE kynetec_dataset_acessos_total counter'
+        ]
+        for dataset, quantidade in sorted(acessos.items()):
+            linhas.append(f'kynetec_dataset_acessos_total{{dataset="{dataset}"}} {quantidade}')
+
+        linhas += [
+            '# HELP kynetec_cache_consultas_total Consultas ao cache de respostas por resultado',
+            '# TYPE kynetec_cache_consultas_total counter'
+        ]
+        for resultado in ('precomputed', 'hits', 'misses', 'errors'):
+            linhas.append(f'kynetec_cache_consultas_total{{resultado="{resultado}"}} {cache_stats[resultado]}')
+
+        linhas += [
+            '# HELP kynetec_cache_hit_rate Fração das consultas respondidas pelo cache (pré-computadas ou backend)',
+            '# TYPE kynetec_cache_hit_rate gauge',
+            f'kynetec_cache_hit_rate {cache_stats["hit_rate"]}'
+        ]
+
+        return '\n'.join(linhas) + '\n'
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,508 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+import urllib.request
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import Config
+
+
+# PAM (SIDRA tabela 1612): área plantada de soja por município, uma consulta por ano
+SIDRA_URL = 'https://apisidra.ibge.gov.br/values/t/1612/n6/all/v/109,1000109/p/{ano}/c81/2713/d/v1000109%205'
+CONAB_URL = 'https://portaldeinformacoes.conab.gov.br/downloads/arquivos/SerieHistoricaGraos.txt'
+
+ANOS_IBGE = [2018, 2019, 2020, 2021]
+SAFRAS_CONAB = ['2017/18', '2018/19', '2019/20', '2020/21', '2021/22']
+MUNICIPIO_DESTAQUE = '5100201'
+
+# Muda junto com as colunas de base_municipios: partições gravadas no formato anterior são recalculadas
+VERSAO_MUNICIPIOS = 2
+
+ESTADOS = {
+    'AC': 'Acre', 'AL': 'Alagoas', 'AP': 'Amapá', 'AM': 'Amazonas', 'BA': 'Bahia', 'CE': 'Ceará',
+    'DF': 'Distrito Federal', 'ES': 'Espírito Santo', 'GO': 'Goiás', 'MA': 'Maranhão', 'MT': 'Mato Grosso',
+    'MS': 'Mato Grosso do Sul', 'MG': 'Minas Gerais', 'PA': 'Pará', 'PB': 'Paraíba', 'PR': 'Paraná',
+    'PE': 'Pernambuco', 'PI': 'Piauí', 'RJ': 'Rio de Janeiro', 'RN': 'Rio Grande do Norte',
+    'RS': 'Rio Grande do Sul', 'RO': 'Rondônia', 'RR': 'Roraima', 'SC': 'Santa Catarina',
+    'SP': 'São Paulo', 'SE': 'Sergipe', 'TO': 'Tocantins'
+}
+
+
+class RawCache:
+    # Downloads guardados pelo hash do conteúdo; refs.json aponta cada fonte para o último conteúdo baixado
+
+    def __init__(self, raiz):
+        self.raiz = Path(raiz)
+        self.objetos = self.raiz / 'objetos'
+        self.refs_path = self.raiz / 'refs.json'
+        self.refs = json.loads(self.refs_path.read_text()) if self.refs_path.exists() else {}
+
+    def put(self, nome, conteudo, origem):
+        sha = hashlib.sha256(conteudo).hexdigest()
+        destino = self.objetos / sha[:2] / sha
+
+        if not destino.exists():
+            destino.parent.mkdir(parents = True, exist_ok = True)
+            _escrever_atomico(destino, conteudo)
+
+        self.refs[nome] = {'sha256': sha, 'origem': origem, 'obtido_em': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        self.raiz.mkdir(parents = True, exist_ok = True)
+        _escrever_atomico(self.refs_path, json.dumps(self.refs, indent = 2).encode('utf-8'))
+        return sha
+
+    def get(self, nome):
+        ref = self.refs.get(nome)
+        if ref is None:
+            return None, None
+
+        caminho = self.objetos / ref['sha256'][:2] / ref['sha256']
+        if not caminho.exists():
+            return None, None
+
+        return ref['sha256'], caminho.read_bytes()
+
+    def fetch(self, nome, url, fixture = None, offline = False, atualizar = False):
+        # Fixture tem prioridade; sem ela, o cache só é ignorado quando se pede atualização
+        if fixture is not None:
+            conteudo = Path(fixture).read_bytes()
+            return self.put(nome, conteudo, str(fixture)), conteudo
+
+        sha, conteudo = self.get(nome)
+        if conteudo is not None and not atualizar:
+            return sha, conteudo
+
+        if offline:
+            if conteudo is not None:
+                return sha, conteudo
+            raise FileNotFoundError(f"{nome} não está no cache local e o modo offline está ativo")
+
+        print(f"Baixando {url}")
+        with urllib.request.urlopen(url, timeout = 300) as resposta:
+            conteudo = resposta.read()
+
+        return self.put(nome, conteudo, url), conteudo
+
+
+def _escrever_atomico(destino, conteudo):
+    temporario = destino.with_name(f'.{destino.name}.{os.getpid()}.tmp')
+    temporario.write_bytes(conteudo)
+    os.replace(temporario, destino)
+
+
+def _salvar_feather(df, destino):
+    destino.parent.mkdir(parents = True, exist_ok = True)
+    temporario = destino.with_name(f'.{destino.name}.{os.getpid()}.tmp')
+    df.reset_index(drop = True).to_feather(temporario)
+    os.replace(temporario, destino)
+
+
+def content_hash(df):
+    # Hash das linhas e dos nomes/tipos das colunas: muda só quando o conteúdo muda
+    hash_df = hashlib.sha1(pd.util.hash_pandas_object(df, index = False).values.tobytes())
+    hash_df.update(repr([(c, str(t)) for c, t in df.dtypes.items()]).encode('utf-8'))
+    return hash_df.hexdigest()[:16]
+
+
+def _fingerprint(*partes):
+    return hashlib.sha1('|'.join(map(str, partes)).encode('utf-8')).hexdigest()[:16]
+
+
+def _texto_safra(anos, deslocamento):
+    # Safra "aa/aa" terminada em ano - deslocamento
+    return ((anos - deslocamento - 1) - 2000).astype(str) + "/" + ((anos - deslocamento) - 2000).astype(str)
+
+
+# Extração
+
+def parse_sidra(conteudo):
+    base_ibge = pd.read_json(io.BytesIO(conteudo))
+    base_ibge.columns = base_ibge.iloc[0]
+    base_ibge = base_ibge.iloc[1:].reset_index(drop = True)
+
+    base_ibge = base_ibge[['Município (Código)', 'Município', 'Ano', 'Variável', 'Valor']]
+    base_ibge.columns = ['cod_municipio', 'municipio', 'ano', 'variavel', 'valor']
+
+    cidades = base_ibge[['cod_municipio', 'municipio']].copy().drop_duplicates('cod_municipio').reset_index(drop = True)
+    cidades['uf'] = cidades['municipio'].str[-2:]
+    cidades['municipio'] = cidades['municipio'].str[:-5]
+
+    base_ibge = base_ibge.pivot(
+        index = ['cod_municipio', 'ano'],
+        columns = 'variavel',
+        values = 'valor'
+    ).reset_index()
+    base_ibge.columns.name = None
+    base_ibge.columns = ['cod_municipio', 'ano', 'area_plantada', 'pct_area']
+    base_ibge['ano'] = base_ibge['ano'].astype(int)
+
+    # "-" é zero e "..." é dado não disponível; os dois entram como zero
+    for coluna in ('area_plantada', 'pct_area'):
+        base_ibge[coluna] = base_ibge[coluna].mask(base_ibge[coluna].isin(['-', '...']), 0).astype(float)
+
+    return base_ibge.merge(cidades, on = 'cod_municipio', how = 'left')
+
+
+def parse_conab(conteudo, safras):
+    base_conab = pd.read_table(io.BytesIO(conteudo), encoding = 'latin1', sep = ';')
+
+    colunas_str = base_conab.select_dtypes(include = 'object').columns.tolist()
+    base_conab[colunas_str] = base_conab[colunas_str].apply(lambda s: s.str.strip())
+
+    base_conab = base_conab[base_conab['produto'] == "SOJA"].copy().reset_index(drop = True)
+    base_conab = base_conab[base_conab['ano_agricola'].isin(safras)].reset_index(drop = True)
+
+    base_conab['ano'] = base_conab['ano_agricola'].str[-2:].astype(int) + 2000
+
+    base_conab = base_conab[['ano', 'ano_agricola', 'uf', 'area_plantada_mil_ha']]
+    base_conab.columns = ['ano', 'safra', 'uf', 'area_plantada']
+    base_conab['area_plantada'] = base_conab['area_plantada'] * 1000
+
+    return base_conab.sort_values(['ano', 'uf']).reset_index(drop = True)
+
+
+# Transformações (portadas de notebooks/01_Extracao_Bases.ipynb, com os anos como parâmetro)
+
+def comparacao_wide(base_ibge, base_conab, anos, chaves):
+    wide = base_ibge[base_ibge['ano'].isin(anos)].groupby(chaves)['area_plantada'].agg(area_plantada_ibge = 'sum')
+
+    wide = pd.concat([
+        wide,
+        base_conab[base_conab['ano'].isin(anos)].groupby(chaves)['area_plantada'].agg(area_plantada_conab = 'sum')
+    ], axis = 1)
+
+    wide['variacao_conab_ibge'] = (wide['area_plantada_conab'] / wide['area_plantada_ibge']) - 1
+    wide = wide.reset_index()
+    wide['ano'] = wide['ano'].astype(int)
+    return wide
+
+
+def comparacao_long(wide, chaves):
+    longo = wide.melt(
+        id_vars = chaves,
+        value_vars = ['area_plantada_ibge', 'area_plantada_conab', 'variacao_conab_ibge'],
+        var_name = 'fonte',
+        value_name = 'valor'
+    )
+
+    longo['fonte'] = np.where(
+        longo['fonte'] == "area_plantada_ibge",
+        "IBGE",
+        np.where(
+            longo['fonte'] == "area_plantada_conab",
+            "CONAB",
+            "VARIAÇÃO CONAB X IBGE"
+        )
+    )
+
+    return longo
+
+
+def projecao_municipal(base_ibge, base_conab, ano_projecao):
+    # Área CONAB do estado distribuída pela participação de cada município no último ano do IBGE
+    df_projecao = base_ibge[base_ibge['ano'] == ano_projecao - 1].copy().reset_index(drop = True)
+    df_projecao['total_por_uf'] = df_projecao.groupby('uf')['area_plantada'].transform('sum')
+    df_projecao['repres_mun'] = df_projecao['area_plantada'] / df_projecao['total_por_uf']
+    df_projecao = df_projecao[['cod_municipio', 'uf', 'repres_mun']]
+    df_projecao = df_projecao.merge(base_conab[base_conab['ano'] == ano_projecao][['uf', 'area_plantada']], on = 'uf', how = 'left')
+    df_projecao[f'area_plantada_{ano_projecao}'] = df_projecao['repres_mun'] * df_projecao['area_plantada']
+
+    return df_projecao[['cod_municipio', f'area_plantada_{ano_projecao}']]
+
+
+def serie_municipal(base_ibge, df_projecao, ano_projecao):
+    serie = base_ibge[['cod_municipio', 'area_plantada', 'ano']]
+
+    if df_projecao is not None:
+        projetado = df_projecao.rename(columns = {f'area_plantada_{ano_projecao}': 'area_plantada'})
+        projetado['ano'] = ano_projecao
+        serie = pd.concat([serie, projetado], axis = 0, ignore_index = True)
+
+    return serie
+
+
+def municipio_destaque(serie, cidades, cod_municipio = MUNICIPIO_DESTAQUE):
+    df_municipio = serie[serie['cod_municipio'] == cod_municipio].copy().reset_index(drop = True)
+    df_municipio['area_plantada'] = np.round(df_municipio['area_plantada'], 0).astype(int)
+
+    df_municipio = df_municipio.merge(cidades, on = 'cod_municipio', how = 'left')
+    return df_municipio[['ano', 'cod_municipio', 'municipio', 'area_plantada']]
+
+
+def base_municipios(serie, base_ibge, base_conab, cidades, ano_projecao):
+    # Linhas de todos os anos da série menos o primeiro, que só serve de base para as variações
+    base = serie.sort_values(['cod_municipio', 'ano']).reset_index(drop = True)
+    base = base.merge(cidades, on = 'cod_municipio', how = 'left')
+    base['key'] = base['uf'] + "-" + base['ano'].astype(str)
+
+    d = base_ibge.groupby(['uf', 'ano'])['area_plantada'].agg(area_plantada_estado_ibge = 'sum').reset_index()
+
+    if ano_projecao in set(base['ano']):
+        dd = base_conab[base_conab['ano'] == ano_projecao]
+        dd = dd.groupby('uf')['area_plantada'].agg(area_plantada_estado_ibge = 'sum').reset_index()
+        dd['ano'] = ano_projecao
+        d = pd.concat([d, dd], ignore_index = True, axis = 0)
+
+    # Variações e participações em %, já na precisão exibida: o texto é montado na resposta (api/formatting.py)
+    d['variacao_estado_ano'] = np.round((d['area_plantada_estado_ibge'] / d.groupby('uf')['area_plantada_estado_ibge'].shift(1) - 1) * 100, 1)
+    d['key'] = d['uf'] + "-" + d['ano'].astype(str)
+
+    base = base.merge(d[['key', 'area_plantada_estado_ibge', 'variacao_estado_ano']], on = 'key', how = 'left')
+    base['representatividade_mun'] = np.round((base['area_plantada'] / base['area_plantada_estado_ibge']) * 100, 2)
+
+    anterior = base.groupby('cod_municipio')['area_plantada'].shift(1)
+    base['variacao'] = np.round((base['area_plantada'] / anterior - 1) * 100, 1)
+
+    base = base[base['ano'] > base['ano'].min()].reset_index(drop = True)
+    base = base.drop('key', axis = 1)
+    base['area_plantada_estado_dif'] = np.round((base['area_plantada_estado_ibge'] - base['area_plantada']) / 1000, 1)
+    base['area_plantada_estado_ibge'] = np.round(base['area_plantada_estado_ibge'] / 1000, 1)
+
+    df_ranking = base[base['area_plantada'].notna()].copy()
+    df_ranking = df_ranking[df_ranking['area_plantada'] > 0]
+    df_ranking['ranking'] = df_ranking.groupby(['uf', 'ano'])['area_plantada'].rank(method = 'min', ascending = False)
+    df_ranking['ranking'] = df_ranking['ranking'].astype(int)
+    df_ranking['key'] = df_ranking['cod_municipio'] + "-" + df_ranking['ano'].astype(str)
+    df_ranking = df_ranking[['key', 'ranking']]
+
+    base['key'] = base['cod_municipio'] + "-" + base['ano'].astype(str)
+    base = base.merge(df_ranking, on = 'key', how = 'left')
+    base = base.drop('key', axis = 1)
+    base['ranking'] = base['ranking'].astype('Int64')
+
+    base['area_plantada'] = np.round(base['area_plantada'] / 1000, 1)
+    base = base.rename(columns = {'area_plantada_estado_ibge': 'area_plantada_estado'})
+    base = base.merge(pd.DataFrame({'uf': list(ESTADOS), 'estado': list(ESTADOS.values())}), on = 'uf', how = 'left')
+    base['ano_safra'] = _texto_safra(base['ano'], 0)
+
+    return base
+
+
+def area_nacional(base_ibge, base_conab, ano_projecao):
+    nacional = base_ibge.groupby('ano')['area_plantada'].sum().reset_index().rename(columns = {'area_plantada': 'area_plantada_ibge'})
+
+    if ano_projecao is not None:
+        nacional = pd.concat([nacional, pd.DataFrame([{'ano': ano_projecao, 'area_plantada_ibge': np.nan}])])
+
+    nacional['variacao_ibge'] = ((nacional['area_plantada_ibge'] / nacional['area_plantada_ibge'].shift(1)) - 1) * 100
+
+    nacional = nacional.set_index('ano')
+    nacional = pd.concat(
+        [
+            nacional,
+            base_conab.groupby('ano')[['area_plantada']].sum().rename(columns = {'area_plantada': 'area_plantada_conab'})
+        ], axis = 1
+    ).reset_index()
+    nacional['variacao_conab'] = ((nacional['area_plantada_conab'] / nacional['area_plantada_conab'].shift(1)) - 1) * 100
+
+    nacional = nacional.set_index('ano')
+    d = base_ibge[base_ibge['area_plantada'] > 0].groupby('ano')['cod_municipio'].agg(qtde_mun = 'count')
+    d['var_mun'] = (d['qtde_mun'] / d['qtde_mun'].shift(1) - 1) * 100
+    nacional = pd.concat([nacional, d], axis = 1).reset_index()
+
+    nacional = nacional[nacional['ano'] > nacional['ano'].min()].reset_index(drop = True)
+    nacional['ano_safra'] = _texto_safra(nacional['ano'], 0)
+
+    # Diferença entre as fontes em %, calculada antes de arredondar as áreas
+    nacional['gap_ibge_conab'] = ((nacional['area_plantada_ibge'] / nacional['area_plantada_conab']) - 1) * 100
+
+    nacional['area_plantada_ibge'] = np.round(nacional['area_plantada_ibge'] / 1000000, 1)
+    nacional['area_plantada_conab'] = np.round(nacional['area_plantada_conab'] / 1000000, 1)
+    nacional['qtde_mun'] = nacional['qtde_mun'].fillna(0).astype(int)
+
+    return nacional[['ano', 'ano_safra', 'area_plantada_ibge', 'variacao_ibge', 'area_plantada_conab', 'variacao_conab',
+        'gap_ibge_conab', 'qtde_mun', 'var_mun']]
+
+
+def area_estadual(base_ibge, base_conab, ano_projecao):
+    estadual = base_ibge.groupby(['uf', 'ano'])['area_plantada'].sum().reset_index().rename(columns = {'area_plantada': 'area_plantada_ibge'})
+
+    if ano_projecao is not None:
+        d = pd.DataFrame(list(ESTADOS), columns = ['uf'])
+        d['ano'] = ano_projecao
+        d['area_plantada_ibge'] = np.nan
+        estadual = pd.concat([estadual, d], ignore_index = True, axis = 0)
+
+    estadual = estadual.sort_values(['uf', 'ano']).reset_index(drop = True)
+    estadual['variacao_ibge'] = ((estadual['area_plantada_ibge'] / estadual.groupby('uf')['area_plantada_ibge'].shift(1)) - 1) * 100
+
+    estadual = estadual.set_index(['uf', 'ano'])
+    estadual = pd.concat(
+        [
+            estadual,
+            base_conab.groupby(['uf', 'ano'])[['area_plantada']].sum().rename(columns = {'area_plantada': 'area_plantada_conab'})
+        ], axis = 1
+    ).reset_index()
+    estadual = estadual.sort_values(['uf', 'ano']).reset_index(drop = True)
+    estadual['variacao_conab'] = ((estadual['area_plantada_conab'] / estadual.groupby('uf')['area_plantada_conab'].shift(1)) - 1) * 100
+
+    estadual['ano_safra'] = _texto_safra(estadual['ano'], 0)
+    estadual['gap_ibge_conab'] = ((estadual['area_plantada_ibge'] / estadual['area_plantada_conab']) - 1) * 100
+
+    estadual['area_plantada_ibge'] = np.round(estadual['area_plantada_ibge'] / 1000, 1)
+    estadual['area_plantada_conab'] = np.round(estadual['area_plantada_conab'] / 1000, 1)
+
+    estadual = estadual[estadual['ano'] != estadual['ano'].min()].reset_index(drop = True)
+
+    return estadual[['uf', 'ano', 'area_plantada_ibge', 'variacao_ibge', 'area_plantada_conab', 'variacao_conab',
+        'ano_safra', 'gap_ibge_conab']]
+
+
+# Execução incremental
+
+class Pipeline:
+
+    def __init__(self, saida = None, cache = None, fixtures = None, offline = False, atualizar = False,
+                 anos_ibge = None, safras = None):
+        self.saida = Path(saida or Config.DATA_DIR)
+        self.particoes = self.saida / 'particoes'
+        self.manifesto_path = self.particoes / 'manifesto.json'
+        self.cache = RawCache(cache or Config.RAW_CACHE_DIR)
+        self.fixtures = Path(fixtures) if fixtures else None
+        self.offline = offline or fixtures is not None
+        self.atualizar = atualizar
+        self.anos_ibge = sorted(anos_ibge or ANOS_IBGE)
+        self.safras = sorted(safras or SAFRAS_CONAB)
+        self.manifesto = json.loads(self.manifesto_path.read_text()) if self.manifesto_path.exists() else {}
+        self.recalculadas = []
+        self.gravadas = []
+
+    def _fixture(self, nome):
+        if self.fixtures is None:
+            return None
+        return self.fixtures / nome
+
+    def _particao(self, dataset, ano, entrada, calcular):
+        # Partição reaproveitada do disco quando a impressão digital das entradas não mudou
+        caminho = self.particoes / dataset / f'ano={ano}.feather'
+        registro = self.manifesto.setdefault(dataset, {}).get(str(ano))
+
+        if registro and registro['entrada'] == entrada and caminho.exists():
+            df = pd.read_feather(caminho)
+            return df, registro['conteudo']
+
+        _salvar_feather(calcular(), caminho)
+
+        # Lido de volta para que partições novas e reaproveitadas tenham a mesma representação (None/NaN)
+        df = pd.read_feather(caminho)
+        conteudo = content_hash(df)
+
+        self.manifesto[dataset][str(ano)] = {'entrada': entrada, 'conteudo': conteudo}
+        self.recalculadas.append(f'{dataset}/ano={ano}')
+        return df, conteudo
+
+    def _publicar(self, nome, df):
+        # Arquivo consolidado lido pelo app; só é regravado se o conteúdo mudou
+        df = df.reset_index(drop = True)
+        conteudo = content_hash(df)
+        destino = self.saida / f'{nome}.feather'
+        saidas = self.manifesto.setdefault('_saidas', {})
+
+        if saidas.get(nome) == conteudo and destino.exists():
+            return
+
+        _salvar_feather(df, destino)
+        saidas[nome] = conteudo
+        self.gravadas.append(nome)
+
+    def run(self):
+        inicio = time.perf_counter()
+
+        # IBGE: uma consulta por ano, cada uma vira a partição do seu ano
+        ibge, hash_ibge = {}, {}
+        for ano in self.anos_ibge:
+            nome = f'sidra_1612_{ano}'
+            sha, conteudo = self.cache.fetch(
+                nome, SIDRA_URL.format(ano = ano), self._fixture(f'{nome}.json'), self.offline, self.atualizar
+            )
+            ibge[ano], hash_ibge[ano] = self._particao('base_ibge', ano, sha, lambda c = conteudo: parse_sidra(c))
+
+        # CONAB: arquivo único com toda a série; cada ano só é regravado se as suas linhas mudaram
+        sha, conteudo = self.cache.fetch(
+            'conab_graos', CONAB_URL, self._fixture('SerieHistoricaGraos.txt'), self.offline, self.atualizar
+        )
+        conab_completa = parse_conab(conteudo, self.safras)
+        conab, hash_conab = {}, {}
+        for ano, linhas in conab_completa.groupby('ano'):
+            entrada = _fingerprint(content_hash(linhas.reset_index(drop = True)))
+            conab[ano], hash_conab[ano] = self._particao('base_conab', ano, entrada, lambda l = linhas: l)
+
+        base_ibge = pd.concat([ibge[ano] for ano in self.anos_ibge], ignore_index = True)
+        base_ibge = base_ibge.sort_values(['cod_municipio', 'ano']).reset_index(drop = True)
+        base_conab = pd.concat(list(conab.values()), ignore_index = True).sort_values(['ano', 'uf']).reset_index(drop = True)
+
+        cidades = base_ibge[['cod_municipio', 'municipio', 'uf']].drop_duplicates('cod_municipio').reset_index(drop = True)
+
+        anos_conab = sorted(conab)
+        ano_projecao = self.anos_ibge[-1] + 1 if self.anos_ibge[-1] + 1 in anos_conab else None
+        anos_comparacao = [ano for ano in self.anos_ibge[1:] if ano in anos_conab]
+
+        df_projecao = projecao_municipal(base_ibge, base_conab, ano_projecao) if ano_projecao else None
+        serie = serie_municipal(base_ibge, df_projecao, ano_projecao)
+
+        # Municípios: cada ano depende só do próprio ano e do anterior (e da CONAB no ano projetado)
+        municipios = []
+        for ano in self.anos_ibge[1:] + ([ano_projecao] if ano_projecao else []):
+            anos_fatia = [ano - 1, ano]
+            dependencias = [hash_ibge.get(a) for a in anos_fatia] + [hash_conab.get(ano) if ano == ano_projecao else None]
+
+            def calcular(anos_fatia = anos_fatia):
+                fatia = serie[serie['ano'].isin(anos_fatia)]
+                return base_municipios(
+                    fatia, base_ibge[base_ibge['ano'].isin(anos_fatia)], base_conab,
+                    cidades[cidades['cod_municipio'].isin(fatia['cod_municipio'])], ano_projecao
+                )
+
+            entrada = _fingerprint(VERSAO_MUNICIPIOS, *dependencias, content_hash(cidades))
+            df, _ = self._particao('base_municipios', ano, entrada, calcular)
+            municipios.append(df)
+
+        self._publicar('base_ibge', base_ibge[['cod_municipio', 'ano', 'area_plantada']])
+        self._publicar('base_conab', base_conab)
+
+        # Agregados por estado e por ano: poucas centenas de linhas, recalculados a cada execução
+        nacional = comparacao_wide(base_ibge, base_conab, anos_comparacao, ['ano'])
+        estadual = comparacao_wide(base_ibge, base_conab, anos_comparacao, ['uf', 'ano'])
+        self._publicar('df_nacional', comparacao_long(nacional, ['ano']))
+        self._publicar('df_estadual', comparacao_long(estadual, ['uf', 'ano']))
+
+        if ano_projecao:
+            self._publicar(f'df_{ano_projecao}', df_projecao)
+        self._publicar(f'mun_{MUNICIPIO_DESTAQUE}', municipio_destaque(serie, cidades))
+
+        base = pd.concat(municipios, ignore_index = True)
+        self._publicar('base_municipios', base.sort_values(['cod_municipio', 'ano'], kind = 'stable'))
+        self._publicar('area_nacional', area_nacional(base_ibge, base_conab, ano_projecao))
+        self._publicar('area_estadual', area_estadual(base_ibge, base_conab, ano_projecao))
+
+        self.particoes.mkdir(parents = True, exist_ok = True)
+        _escrever_atomico(self.manifesto_path, json.dumps(self.manifesto, indent = 2, sort_keys = True).encode('utf-8'))
+
+        print(f"Partições recalculadas: {', '.join(self.recalculadas) or 'nenhuma'}")
+        print(f"Arquivos atualizados: {', '.join(self.gravadas) or 'nenhum'}")
+        print(f"Pipeline concluído em {time.perf_counter() - inicio:.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Extrai IBGE/CONAB e gera os datasets processados do dashboard')
+    parser.add_argument('--saida', default = str(Config.DATA_DIR))
+    parser.add_argument('--cache', default = str(Config.RAW_CACHE_DIR))
+    parser.add_argument('--fixtures', help = 'Diretório com sidra_1612_<ano>.json e SerieHistoricaGraos.txt; implica --offline')
+    parser.add_argument('--offline', action = 'store_true', help = 'Usa apenas o que já está no cache local')
+    parser.add_argument('--atualizar', action = 'store_true', help = 'Baixa de novo as fontes mesmo se estiverem no cache')
+    parser.add_argument('--anos-ibge', type = int, nargs = '+', default = ANOS_IBGE)
+    parser.add_argument('--safras', nargs = '+', default = SAFRAS_CONAB)
+    args = parser.parse_args()
+
+    Pipeline(
+        saida = args.saida,
+        cache = args.cache,
+        fixtures = args.fixtures,
+        offline = args.offline,
+        atualizar = args.atualizar,
+        anos_ibge = args.anos_ibge,
+        safras = args.safras
+    ).run()
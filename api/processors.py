@@ -1,10 +1,19 @@
-import pandas as pd
-import numpy as np
 import math, json
+from itertools import combinations
 from api.data_loader import data_loader
+from api.metrics import timed
+from api import formatting
+from api.search import MunicipalityIndex
+from api.cube import AreaCube
+from api.lazy import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
 
 class DataProcessor:
     @staticmethod
+    @timed('processamento')
     def preparar_dados_barplot():
         try:
             df_nacional = data_loader.get('area_nacional')
@@ -15,11 +24,7 @@ class DataProcessor:
                 return {'error': 'Dados estaduais não disponíveis'}
             
             df = df_nacional.copy()
-            df['comp_gap_text'] = np.where(
-                df['gap_ibge_conab'] != "-",
-                df['gap_ibge_conab_text'] + " com " + df['gap_ibge_conab'],
-                df['gap_ibge_conab_text']
-            )
+            df['comp_gap_text'] = formatting.gap_summary(df['gap_ibge_conab'], df['ano'])
 
             dados_plotly = {
                 'series': [
@@ -28,7 +33,7 @@ class DataProcessor:
                         'color': '#2B4C7E',
                         'data': {
                             'x': df['ano_safra'].tolist(),
-                            'y': df['area_plantada_ibge'].tolist(),
+                            'y': df['area_plantada_ibge'].to_numpy(),
                             'customdata': df['comp_gap_text'].tolist()
                         }
                     },
@@ -37,7 +42,7 @@ class DataProcessor:
                         'color': '#17A589',
                         'data': {
                             'x': df['ano_safra'].tolist(),
-                            'y': df['area_plantada_conab'].tolist(),
+                            'y': df['area_plantada_conab'].to_numpy(),
                             'customdata': df['comp_gap_text'].tolist()
                         }
                     }
@@ -59,6 +64,7 @@ class DataProcessor:
 
 
     @staticmethod
+    @timed('processamento')
     def preparar_dados_stackedbars():
         try:
             df_estadual = data_loader.get('area_estadual')
@@ -68,7 +74,13 @@ class DataProcessor:
             if df_estadual is None or df_estadual.empty:
                 return {'error': 'Dados estaduais não disponíveis'}
 
-            df_totais = df_estadual.groupby('uf').agg({
+            # Uma ordenação e uma divisão por UF: cada série sai pronta, sem máscaras por estado
+            df = df_estadual.sort_values(['uf', 'ano'], kind = 'stable')
+            df['comp_gap_text'] = formatting.gap_summary(df['gap_ibge_conab'], df['ano'])
+
+            grupos = df.groupby('uf', sort = False, observed = True)
+
+            df_totais = grupos.agg({
                 'area_plantada_ibge': 'sum',
                 'area_plantada_conab': 'sum'
             }).reset_index()
@@ -79,42 +91,40 @@ class DataProcessor:
                 df_totais.sort_values('area_total', ascending=False)['uf'].tolist()
             )
 
+            colunas = ['ano_safra', 'area_plantada_ibge', 'area_plantada_conab', 'comp_gap_text']
+            series_por_uf = {
+                uf: [df_estado[coluna].to_numpy() for coluna in colunas]
+                for uf, df_estado in grupos[colunas]
+            }
+
             series_estados = []
 
             for uf in estados_ordenados:
-                df_estado = df_estadual[df_estadual['uf'] == uf].sort_values('ano')
-
-                anos = df_estado['ano_safra'].tolist()
-                valores_ibge = df_estado['area_plantada_ibge'].tolist()
-                valores_conab = df_estado['area_plantada_conab'].tolist()
-
-                df_estado['comp_gap_text'] = np.where(
-                    df_estado['gap_ibge_conab'] != "-",
-                    df_estado['gap_ibge_conab_text'] + " com " + df_estado['gap_ibge_conab'],
-                    df_estado['gap_ibge_conab_text']
-                )
+                anos, valores_ibge, valores_conab, variacao = series_por_uf[uf]
 
                 series_estados.append({
                     'uf': uf,
                     'anos': anos,
                     'valores_ibge': valores_ibge,
                     'valores_conab': valores_conab,
-                    'variacao': df_estado['comp_gap_text'].tolist()
+                    'variacao': variacao
                 })
             
-            totais_por_ano = {}
-        
-            for ano in sorted(df_estadual['ano'].unique()):
-                df_ano = df_estadual[df_estadual['ano'] == ano]
-
-                ano_int = int(ano)
-                
-                totais_por_ano[ano_int] = {
-                    'ibge': round(df_ano['area_plantada_ibge'].sum()/1000, 1),
-                    'conab': round(df_ano['area_plantada_conab'].sum()/1000, 1)
+            df_totais_ano = df.groupby('ano')[['area_plantada_ibge', 'area_plantada_conab']].sum()
+
+            totais_por_ano = {
+                int(ano): {
+                    'ibge': round(ibge/1000, 1),
+                    'conab': round(conab/1000, 1)
                 }
+                for ano, ibge, conab in zip(
+                    df_totais_ano.index,
+                    df_totais_ano['area_plantada_ibge'],
+                    df_totais_ano['area_plantada_conab']
+                )
+            }
             
-            anos_disponiveis = sorted(df_estadual['ano'].unique().tolist())
+            anos_disponiveis = df_totais_ano.index.tolist()
 
             dados_plotly = {
                 'series': series_estados,
@@ -139,45 +149,90 @@ class DataProcessor:
 
 
     @staticmethod
+    def anos_waterfall(fonte = 'CONAB'):
+        # Anos em que a fonte tem área registrada para algum estado
+        coluna = f'area_plantada_{fonte.lower()}'
+
+        def calcular():
+            df_estadual = data_loader.get('area_estadual')
+            totais = df_estadual.groupby('ano')[coluna].sum(min_count = 1)
+            return [int(ano) for ano in totais.index[totais.notna()]]
+
+        return data_loader.derived(('anos_waterfall', coluna), calcular)
+
+
+    @staticmethod
+    def periodos_waterfall():
+        anos = sorted(set(DataProcessor.anos_waterfall('IBGE')) | set(DataProcessor.anos_waterfall('CONAB')))
+        return [f"{inicio}-{fim}" for inicio, fim in combinations(anos, 2)]
+
+
+    @staticmethod
+    def calcular_waterfall(fonte, ano_inicio, ano_fim):
+        # START, variação de cada UF e END a partir de area_estadual (milhares de hectares);
+        # memorizado por versão dos dados, o resultado não deve ser alterado por quem chama
+        coluna = f'area_plantada_{fonte.lower()}'
+
+        def calcular():
+            df_estadual = data_loader.get('area_estadual')
+            por_uf = df_estadual[df_estadual['ano'].isin([ano_inicio, ano_fim])].pivot(
+                index = 'uf',
+                columns = 'ano',
+                values = coluna
+            )
+
+            # UFs sem dado em um dos anos ficam de fora, assim como as que não variaram
+            variacao = (por_uf[ano_fim] - por_uf[ano_inicio]).round(1)
+            variacao = variacao[variacao.abs() > 0]
+
+            # START e END são os totais nacionais de cada ano, somados sem arredondar e arredondados só
+            # para exibição; somar as variações já arredondadas acumularia o erro de cada UF no END.
+            # END vai como 'absolute': com 'total' o Plotly desenharia a soma das barras, não este valor
+            inicio = round(por_uf[ano_inicio].sum(), 1)
+            fim = round(por_uf[ano_fim].sum(), 1)
+
+            return pd.DataFrame({
+                'step': [str(ano_inicio), *variacao.index.astype(str), str(ano_fim)],
+                'valor': [inicio, *variacao.tolist(), fim],
+                'measure': ['absolute', *['relative'] * len(variacao), 'absolute']
+            })
+
+        return data_loader.derived(('waterfall', coluna, ano_inicio, ano_fim), calcular)
+
+
+    @staticmethod
+    @timed('processamento')
     def preparar_dados_waterfall(fonte = 'CONAB', periodo = '2019-2020'):
-        dataset_name = f'df_waterfall_{fonte.lower()}_{periodo.replace("-", "_")}'
+        ano_inicio, ano_fim = map(int, periodo.split("-"))
 
-        try:
-            df_copy = data_loader.get(dataset_name)
-        except KeyError:
+        anos_disponiveis = DataProcessor.anos_waterfall(fonte)
+        if ano_inicio not in anos_disponiveis or ano_fim not in anos_disponiveis:
             return {
                 'error': f"Dados não disponíveis para {fonte} {periodo}",
+                'anos_disponiveis': anos_disponiveis,
                 'series': []
             }
-        
-        df = df_copy.copy()
 
-        start = df.iloc[0,1] - 1000000
+        df = DataProcessor.calcular_waterfall(fonte, ano_inicio, ano_fim).copy()
+
+        start = df['valor'].iloc[0] * 1000 - 1000000
         start = round(start / 500_000) * 500_000
         start = start / 1000
 
-        e = df.shape[0] - 1
-        end = df.iloc[e,1] + 1000000
+        end = df['valor'].iloc[-1] * 1000 + 1000000
         end = math.ceil(end / 500_000) * 500_000
         end = end / 1000
 
-        prim_ano = periodo.split("-")[0]
-        prim_ano = str(((int(prim_ano) - 1) - 2000)) + "/" + str((int(prim_ano)) - 2000)
-        df.iloc[0,0] = prim_ano
-
-        fin_ano = prim_ano = periodo.split("-")[1]
-        fin_ano = str(((int(fin_ano) - 1) - 2000)) + "/" + str((int(fin_ano)) - 2000)
-        df.iloc[df.shape[0]-1,0] = fin_ano
+        df.loc[df.index[0], 'step'] = f"{ano_inicio - 2001}/{ano_inicio - 2000}"
+        df.loc[df.index[-1], 'step'] = f"{ano_fim - 2001}/{ano_fim - 2000}"
 
-        df['valor'] = df['valor'] / 1000
-        
         dados_plotly = {
             'series': [
                 {
                     'name': f"Variação {fonte} {periodo}",
                     'data': {
                         'x': df['step'].tolist(),
-                        'y': df['valor'].tolist(),
+                        'y': df['valor'].to_numpy(),
                         'measure': df['measure'].tolist()
                     },
                     'colors': {
@@ -201,10 +256,34 @@ class DataProcessor:
 
 
     @staticmethod
+    def textos_nacionais():
+        # Textos dos KPIs de todos os anos, formatados uma vez por versão dos dados; a comparação
+        # com a média histórica precisa da série inteira
+        def calcular():
+            df = data_loader.get('area_nacional')
+            textos = df[['ano', 'area_plantada_ibge', 'area_plantada_conab', 'qtde_mun']].copy()
+
+            for fonte in ('ibge', 'conab'):
+                variacao = df[f'variacao_{fonte}']
+                textos[f'variacao_{fonte}'] = formatting.percent(variacao)
+                textos[f'variacao_{fonte}_text'] = formatting.variation(variacao, df['ano'])
+                textos[f'comp_{fonte}'] = formatting.historical_comparison(variacao)
+
+            textos['gap_ibge_conab'] = formatting.gap(df['gap_ibge_conab'])
+            textos['gap_ibge_conab_text'] = formatting.gap_text(df['gap_ibge_conab'], df['ano'])
+            textos['var_mun_text'] = formatting.count_variation(df['var_mun'])
+
+            return textos
+
+        return data_loader.derived(('textos', 'area_nacional'), calcular)
+
+
+    @staticmethod
+    @timed('processamento')
     def preparar_dados_kpis(ano = 2021, fonte = 'todas'):
-        df_area_nacional = data_loader.get('area_nacional')
+        df_area_nacional = DataProcessor.textos_nacionais()
 
-        df = df_area_nacional[df_area_nacional['ano'] == ano].copy()
+        df = df_area_nacional[df_area_nacional['ano'] == ano]
         dados = df.iloc[0]
 
         kpis = {}
@@ -315,8 +394,7 @@ class DataProcessor:
 
         ### KPI MUNICÍPIOS PRODUTORES ###
         if (dados['qtde_mun'] > 0):
-            qtde_municipios = int(dados['qtde_mun'])
-            qtde_municipios = f"{qtde_municipios:,}".replace(',', '.')
+            qtde_municipios = formatting.thousands(dados['qtde_mun'])
             texto_variacao = dados['var_mun_text']
         else:
             qtde_municipios = "-"
@@ -340,10 +418,11 @@ class DataProcessor:
 
 
     @staticmethod
+    @timed('processamento')
     def preparar_dados_evolucao_temporal(cod_municipio='5100201'):
-        df_municipios = data_loader.get('base_municipios')
+        df_municipios = data_loader.get_by_index('base_municipios', cod_municipio = cod_municipio)
 
-        df = df_municipios[df_municipios['cod_municipio'] == cod_municipio].copy().sort_values('ano').reset_index(drop = True)
+        df = df_municipios.sort_values('ano').reset_index(drop = True)
         
         info_municipio = {
             'codigo': cod_municipio,
@@ -353,11 +432,11 @@ class DataProcessor:
         }
 
         anos = df['ano_safra'].tolist()
-        area_municipio = df['area_plantada'].tolist()
-        area_resto_estado = df['area_plantada_estado_dif'].tolist()
+        area_municipio = df['area_plantada'].to_numpy()
+        area_resto_estado = df['area_plantada_estado_dif'].to_numpy()
         area_total_estado = df['area_plantada_estado'].tolist()
-        variacoes_municipio = df['variacao'].tolist()
-        variacoes_estado = df['variacao_estado_ano'].tolist()
+        variacoes_municipio = formatting.variation(df['variacao'], df['ano'], nulo = None)
+        variacoes_estado = formatting.variation(df['variacao_estado_ano'], df['ano'], nulo = None)
 
         customdata_municipio = list(zip(variacoes_municipio))
         customdata_estado = list(zip(variacoes_estado, area_total_estado))
@@ -407,18 +486,19 @@ class DataProcessor:
 
 
     @staticmethod
+    @timed('processamento')
     def preparar_dados_municipio_destaque(cod_municipio = '5100201', ano = 2021):
-        df_municipios = data_loader.get('base_municipios')
-
-        df = df_municipios[(df_municipios['cod_municipio'] == cod_municipio) & (df_municipios['ano'] == ano)].copy()
+        df = data_loader.get_by_index('base_municipios', cod_municipio = cod_municipio, ano = ano)
         
         dados = df.iloc[0]
         area_formatada = f"{dados['area_plantada']:.1f} mil ha"
 
-        variacao_texto = dados['variacao']
-        if variacao_texto.startswith('+'):
+        # Seta pelo valor arredondado, o mesmo que aparece no texto
+        variacao = np.round(float(dados['variacao']), 1)
+        variacao_texto = formatting.variation([dados['variacao']], [ano])[0]
+        if variacao > 0:
             variacao_formatada = f"↑ {variacao_texto}"
-        elif variacao_texto.startswith('-'):
+        elif variacao < 0:
             variacao_formatada = f"↓ {variacao_texto}"
         else:
             variacao_formatada = f"{variacao_texto}"
@@ -431,7 +511,7 @@ class DataProcessor:
                 'nome': dados['municipio'],
                 'estado': dados['estado'],
                 'uf': dados['uf'],
-                'ranking': dados['ranking']
+                'ranking': formatting.ranking(df['ranking'])[0]
             },
             'metricas': {
                 'area_plantada': {
@@ -441,7 +521,7 @@ class DataProcessor:
                 },
                 'representatividade': {
                     'titulo': f'% DO ESTADO ({dados["uf"]})',
-                    'valor': dados['representatividade_mun'],
+                    'valor': formatting.percent([dados['representatividade_mun']], 2, nulo = None)[0],
                     'label': 'Representatividade'
                 }
             },
@@ -452,6 +532,7 @@ class DataProcessor:
 
 
     @staticmethod
+    @timed('processamento')
     def preparar_dados_mapa_estados(ano = 2021, fonte = 'conab'):
         df_estadual = data_loader.get('area_estadual')
     
@@ -465,34 +546,32 @@ class DataProcessor:
         COR_NEGATIVA = '#CD8B8B'
         COR_NEUTRA = '#DADAD9'
 
-        cores_estados = {}
-        dados_estados = []
-
-        for _, row in df.iterrows():
-            uf = row['uf']
-            variacao_texto = str(row[coluna_variacao])
-            area_plantada = row[coluna_area]
-            tam_text = int(len(variacao_texto))
-
-            if variacao_texto.startswith('+'):
-                cor = COR_POSITIVA
-                tipo_variacao = 'positiva'
-            elif ((variacao_texto.startswith('-')) &  (tam_text > 1)):
-                cor = COR_NEGATIVA
-                tipo_variacao = 'negativa'
-            else:
-                cor = COR_NEUTRA
-                tipo_variacao = 'neutra'
-            
-            cores_estados[uf] = cor
+        # Cor pelo valor arredondado, o mesmo que aparece no texto
+        variacao = df[coluna_variacao].round(1)
+        positiva = variacao > 0
+        negativa = variacao < 0
+        variacoes = formatting.variation(df[coluna_variacao], df['ano'])
+
+        cores = np.select([positiva, negativa], [COR_POSITIVA, COR_NEGATIVA], COR_NEUTRA)
+        tipos_variacao = np.select([positiva, negativa], ['positiva', 'negativa'], 'neutra')
+
+        ufs = df['uf'].tolist()
+        cores = cores.tolist()
 
-            dados_estados.append({
+        cores_estados = dict(zip(ufs, cores))
+
+        dados_estados = [
+            {
                 'uf': uf,
                 'area_plantada': area_plantada,
                 'variacao': variacao_texto,
                 'tipo_variacao': tipo_variacao,
                 'cor': cor
-            })
+            }
+            for uf, area_plantada, variacao_texto, tipo_variacao, cor in zip(
+                ufs, df[coluna_area].tolist(), variacoes, tipos_variacao.tolist(), cores
+            )
+        ]
         
         dados_estados_ = {
             'cores_estados': cores_estados,
@@ -522,12 +601,13 @@ class DataProcessor:
 
 
     @staticmethod
-    def preparar_geojson_brasil():
+    @timed('processamento')
+    def preparar_geojson_brasil(resolucao = 'alta', formato = 'geojson'):
         try:
-            geojson_data = data_loader.get('geo_estados')
+            geojson_raw = data_loader.get_geometry(resolucao, formato)
             
             
-            return geojson_data
+            return geojson_raw
         
         except Exception as e:
             print(f"Erro ao buscar GeoJSON: {e}")
@@ -535,14 +615,10 @@ class DataProcessor:
 
 
     @staticmethod
+    @timed('processamento')
     def buscar_info_municipio(cod_municipio):
         try:
-            df_municipios = data_loader.get('base_municipios')
-            
-            df_mun = df_municipios[
-                (df_municipios['cod_municipio'] == cod_municipio) &
-                (df_municipios['ano'] == 2021)
-            ]
+            df_mun = data_loader.get_by_index('base_municipios', cod_municipio = cod_municipio, ano = 2021)
             
             if df_mun.empty:
                 return None
@@ -564,25 +640,25 @@ class DataProcessor:
 
 
     @staticmethod
+    @timed('processamento')
     def buscar_municipios_por_estado(uf, ano = 2021):
         try:
-            df_municipios = data_loader.get('base_municipios')
+            df_municipios = data_loader.get_by_index('base_municipios', uf = uf.upper(), ano = ano)
             
-            df_estado = df_municipios[
-                (df_municipios['uf'] == uf.upper()) & 
-                (df_municipios['ano'] == ano) &
-                (df_municipios['area_plantada'] > 0)
-            ].copy()
+            df_estado = df_municipios[df_municipios['area_plantada'] > 0]
             
             if df_estado.empty:
                 return None
             
             municipios = [
                 {
-                    'codigo': str(row['cod_municipio']),
-                    'nome': row['municipio']
+                    'codigo': codigo,
+                    'nome': nome
                 }
-                for _, row in df_estado.iterrows()
+                for codigo, nome in zip(
+                    map(str, df_estado['cod_municipio'].tolist()),
+                    df_estado['municipio'].tolist()
+                )
             ]
             
             return municipios
@@ -590,4 +666,44 @@ class DataProcessor:
 
         except Exception as e:
             print(f"Erro ao buscar municípios do estado {uf}: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def indice_municipios():
+        # Índice de busca por nome e código, montado uma vez por versão dos dados
+        return data_loader.derived(
+            ('busca', 'municipios'),
+            lambda: MunicipalityIndex.from_frame(data_loader.get('base_municipios'))
+        )
+
+
+    @staticmethod
+    @timed('processamento')
+    def buscar_municipios(consulta, limite = 10, uf = None, ano = 2021):
+        return DataProcessor.indice_municipios().search(consulta, limite, uf, ano)
+
+
+    @staticmethod
+    def cubo_area():
+        # Cubo cultura x fonte x ano x uf montado das bases de origem, uma vez por versão dos dados
+        def calcular():
+            municipios = data_loader.get('base_municipios').drop_duplicates('cod_municipio')
+            uf_municipio = dict(zip(municipios['cod_municipio'].tolist(), municipios['uf'].astype(str).tolist()))
+
+            return AreaCube.from_bases(data_loader.get('base_ibge'), data_loader.get('base_conab'), uf_municipio)
+
+        return data_loader.derived(('cubo', 'area'), calcular)
+
+
+    @staticmethod
+    @timed('processamento')
+    def agregar(nivel = 'nacional', metrica = 'area', anos = None, fontes = None, ufs = None, cultura = 'soja'):
+        return DataProcessor.cubo_area().query(nivel, metrica, anos, fontes, ufs, cultura)
+
+
+    @staticmethod
+    def preparar_derivados():
+        # Estruturas em memória usadas pelas buscas e agregações, montadas antes da primeira requisição
+        data_loader.build_indices()
+        DataProcessor.indice_municipios()
+        DataProcessor.cubo_area()
@@ -0,0 +1,138 @@
+import hmac
+import threading
+import time
+from api.data_loader import data_loader
+from api.cache import response_cache
+from api.snapshot import startup_snapshot
+from api.processors import DataProcessor
+
+
+class DataReloader:
+    # Observa os arquivos processados e troca a versão carregada sem reiniciar os workers
+
+    def __init__(self, intervalo = 0, token = None):
+        self.intervalo = intervalo
+        self.token = token
+        self.marcador = None
+        self.app = None
+        self.ultima_recarga = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.intervalo = app.config.get('DATA_RELOAD_INTERVAL', self.intervalo)
+        self.token = app.config.get('DATA_RELOAD_TOKEN', self.token)
+        self.marcador = app.config.get('DATA_RELOAD_MARKER', self.marcador)
+
+    def start(self):
+        # Chamado por quem atende requisições: no gunicorn o post_fork de cada worker, nunca o master
+        # (preload_app), cuja thread não passaria pelo fork e só releria os arquivos à toa
+        if self.app is None or self.intervalo <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._thread = threading.Thread(target = self._watch, name = 'data-reloader', daemon = True)
+        self._thread.start()
+
+    def authorized(self, token):
+        return bool(self.token) and bool(token) and hmac.compare_digest(token, self.token)
+
+    def _signature(self):
+        assinatura = []
+
+        for file_path in data_loader.source_files():
+            try:
+                info = file_path.stat()
+                assinatura.append((file_path.name, info.st_mtime_ns, info.st_size))
+            except FileNotFoundError:
+                assinatura.append((file_path.name, None, None))
+
+        return tuple(assinatura)
+
+    def _marker(self):
+        try:
+            return self.marcador.stat().st_mtime_ns
+        except (AttributeError, FileNotFoundError):
+            return None
+
+    def _watch(self):
+        anterior = self._signature()
+        marcador = self._marker()
+        pendente = None
+
+        while True:
+            time.sleep(self.intervalo)
+
+            # Recarga pedida a outro worker pelo endpoint: segue sem esperar os arquivos estabilizarem
+            if self._marker() != marcador:
+                marcador = self._marker()
+                anterior = self._signature()
+                pendente = None
+                self.reload()
+                continue
+
+            atual = self._signature()
+
+            if atual == anterior:
+                pendente = None
+                continue
+
+            # Só recarrega quando os arquivos param de mudar entre duas verificações seguidas
+            if atual != pendente:
+                pendente = atual
+                continue
+
+            anterior = atual
+            pendente = None
+            self.reload()
+
+    def reload_async(self):
+        threading.Thread(target = self.reload, name = 'data-reload', daemon = True).start()
+
+    def request_reload(self):
+        # Cada worker tem sua própria cópia da versão em uso: este recarrega já, os demais pelo marcador,
+        # na próxima verificação do observador (DATA_RELOAD_INTERVAL; com 0 só este worker troca)
+        if self.marcador is not None:
+            try:
+                self.marcador.parent.mkdir(parents = True, exist_ok = True)
+                self.marcador.write_text(f"{time.time()}\n")
+            except OSError as e:
+                print(f"Não foi possível sinalizar a recarga aos demais workers: {e}")
+
+        self.reload_async()
+
+    def reload(self):
+        # Uma recarga por vez; a versão atual continua servindo até a nova estar completa
+        with self._lock:
+            inicio = time.perf_counter()
+            anterior = data_loader.version
+
+            try:
+                estado = data_loader.prepare()
+                if estado is None:
+                    return anterior
+
+                # Respostas da nova versão calculadas antes da troca, com a versão nova fixada nesta thread
+                with self.app.app_context(), data_loader.pinned(estado):
+                    DataProcessor.preparar_derivados()
+                    precomputed = response_cache.build_precomputed(self.app)
+
+            except Exception as e:
+                print(f"Recarga dos dados abortada, mantendo a versão {anterior}: {e}")
+                self.ultima_recarga = {'sucesso': False, 'versao': anterior, 'erro': str(e)}
+                return anterior
+
+            data_loader.activate(estado)
+            response_cache.replace(precomputed)
+            startup_snapshot.save(estado.versao, precomputed, dict(estado.raw))
+
+            duracao = time.perf_counter() - inicio
+            print(f"Dados recarregados: versão {anterior} -> {estado.versao} em {duracao:.2f}s")
+            self.ultima_recarga = {'sucesso': True, 'versao': estado.versao, 'anterior': anterior, 'duracao': round(duracao, 3)}
+
+            return estado.versao
+
+
+data_reloader = DataReloader()
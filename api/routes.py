@@ -1,18 +1,51 @@
-from flask import Blueprint, jsonify, request
+import gzip
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Response, current_app, jsonify, request
 from api.processors import DataProcessor
+from api.data_loader import data_loader
+from api.cache import response_cache, send_precompressed
+from api.geometry import RESOLUCOES, FORMATOS
+from api.cube import METRICAS as METRICAS_AGREGADO
+from api.sql import QueryTimeout, columns, sql_engine
+from api.tiles import tile_store
+from api.reload import data_reloader
+from api import series
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+ANOS_VALIDOS = [2019, 2020, 2021, 2022]
+FONTES_VALIDAS = ['todas', 'ibge', 'conab']
+FONTES_WATERFALL = ['IBGE', 'CONAB']
+
+
+def _formato_invalido(formato):
+    return jsonify({
+        'success': False,
+        'error': f'Formato inválido: "{formato}". Use: {", ".join(series.FORMATOS)}'
+    }), 400
+
+
 @api_bp.route('/comparacao_nacional')
-def get_comparacao_nacional():
+@response_cache.cached(
+    padroes = {'formato': series.negotiated_format},
+    dominio = {'formato': series.FORMATOS},
+    vary = 'Accept'
+)
+def get_comparacao_nacional(formato):
+    if formato not in series.FORMATOS:
+        return _formato_invalido(formato)
+
     try:
         dados = DataProcessor.preparar_dados_barplot()
 
-        return jsonify({
+        return series.respond({
             'success': True,
             'data': dados,
             'message': 'Dados carregados com sucesso'
-        })
+        }, formato)
     
     except Exception as e:
         return jsonify({
@@ -23,7 +56,15 @@ def get_comparacao_nacional():
 
 
 @api_bp.route('/comparacao_estadual')
-def get_comparacao_estadual():
+@response_cache.cached(
+    padroes = {'formato': series.negotiated_format},
+    dominio = {'formato': series.FORMATOS},
+    vary = 'Accept'
+)
+def get_comparacao_estadual(formato):
+    if formato not in series.FORMATOS:
+        return _formato_invalido(formato)
+
     try:
         dados = DataProcessor.preparar_dados_stackedbars()
 
@@ -35,11 +76,11 @@ def get_comparacao_estadual():
             }), 404
         
 
-        return jsonify({
+        return series.respond({
             'success': True,
             'data': dados,
             'message': f"Dados de {dados['metadata']['total_estados']} estados carregados"
-        })
+        }, formato)
     
 
     except Exception as e:
@@ -51,29 +92,43 @@ def get_comparacao_estadual():
 
 
 @api_bp.route('/waterfall')
-def get_waterfall():
-    fonte = request.args.get('fonte', 'CONAB').upper()
-    periodo = request.args.get('periodo', '2019-2020')
+@response_cache.cached(
+    padroes = {'fonte': 'CONAB', 'periodo': '2019-2020'},
+    dominio = {'fonte': FONTES_WATERFALL, 'periodo': DataProcessor.periodos_waterfall}
+)
+def get_waterfall(fonte, periodo):
+    fonte = fonte.upper()
 
-    fontes_validas = ['IBGE', 'CONAB']
-    periodos_validos = ['2019-2020', '2020-2021', '2021-2022']
+    fontes_validas = FONTES_WATERFALL
 
     if fonte not in fontes_validas:
         return jsonify({
             'success': False,
             'error': f'Fonte inválida. Use: {", ".join(fontes_validas)}'
         }), 400
-    
-    if periodo not in periodos_validos:
+
+    try:
+        ano_inicio, ano_fim = map(int, periodo.split('-'))
+    except ValueError:
+        ano_inicio = ano_fim = None
+
+    if ano_inicio is None or ano_inicio >= ano_fim:
         return jsonify({
             'success': False,
-            'error': f'Período inválido. Use: {", ".join(periodos_validos)}'
+            'error': f'Período inválido: "{periodo}". Use ANOINICIAL-ANOFINAL, por exemplo 2019-2021.'
         }), 400
     
 
     try:
         dados = DataProcessor.preparar_dados_waterfall(fonte, periodo)
 
+        if 'error' in dados:
+            return jsonify({
+                'success': False,
+                'error': dados['error'],
+                'anos_disponiveis': dados['anos_disponiveis']
+            }), 404
+
         return jsonify({
             'success': True,
             'data': dados,
@@ -91,20 +146,23 @@ def get_waterfall():
 
 
 @api_bp.route('/kpis')
-def get_kpis():
-    ano_str = request.args.get('ano', '2021')
-    fonte = request.args.get('fonte', 'todas').lower()
+@response_cache.cached(
+    padroes = {'ano': '2021', 'fonte': 'todas'},
+    dominio = {'ano': list(map(str, ANOS_VALIDOS)), 'fonte': FONTES_VALIDAS}
+)
+def get_kpis(ano, fonte):
+    fonte = fonte.lower()
 
 
-    anos_validos = [2019, 2020, 2021, 2022]
-    fontes_validas = ['todas', 'ibge', 'conab']
+    anos_validos = ANOS_VALIDOS
+    fontes_validas = FONTES_VALIDAS
 
     try:
-        ano = int(ano_str)
+        ano = int(ano)
     except ValueError:
         return jsonify({
             'success': False,
-            'error': f'Ano inválido: "{ano_str}". Deve ser um número inteiro.'
+            'error': f'Ano inválido: "{ano}". Deve ser um número inteiro.'
         }), 400
     
     if ano not in anos_validos:
@@ -150,8 +208,13 @@ def get_kpis():
 
 
 @api_bp.route('/evolucao_temporal')
-def get_evolucao_temporal():
-    cod_municipio = request.args.get('cod_municipio', '5100201')
+@response_cache.cached(
+    padroes = {'cod_municipio': '5100201', 'formato': series.negotiated_format},
+    vary = 'Accept'
+)
+def get_evolucao_temporal(cod_municipio, formato):
+    if formato not in series.FORMATOS:
+        return _formato_invalido(formato)
 
     try:
         dados = DataProcessor.preparar_dados_evolucao_temporal(cod_municipio)
@@ -164,14 +227,14 @@ def get_evolucao_temporal():
             }), 404
         
 
-        return jsonify({
+        return series.respond({
             'success': True,
             'data': dados,
             'parameters': {
                 'cod_municipio': cod_municipio
             },
             'message': 'Dados de evolução temporal carregados com sucesso'
-        })
+        }, formato)
     
     except Exception as e:
         return jsonify({
@@ -182,19 +245,17 @@ def get_evolucao_temporal():
 
 
 @api_bp.route('/municipio_destaque')
-def get_municipio_destaque():
-    cod_municipio = request.args.get('cod_municipio', '5100201')
-    ano_str = request.args.get('ano', '2021')
-    
+@response_cache.cached(padroes = {'cod_municipio': '5100201', 'ano': '2021'})
+def get_municipio_destaque(cod_municipio, ano):
     try:
-        ano = int(ano_str)
+        ano = int(ano)
     except ValueError:
         return jsonify({
             'success': False,
-            'error': f'Ano inválido: "{ano_str}". Deve ser um número inteiro.'
+            'error': f'Ano inválido: "{ano}". Deve ser um número inteiro.'
         }), 400
     
-    anos_validos = [2019, 2020, 2021, 2022]
+    anos_validos = ANOS_VALIDOS
     if ano not in anos_validos:
         return jsonify({
             'success': False,
@@ -233,16 +294,19 @@ def get_municipio_destaque():
 
 
 @api_bp.route('/mapa_estados')
-def get_mapa_estados():
-    ano_str = request.args.get('ano', '2021')
-    fonte = request.args.get('fonte', 'todas').lower()
+@response_cache.cached(
+    padroes = {'ano': '2021', 'fonte': 'todas'},
+    dominio = {'ano': list(map(str, ANOS_VALIDOS)), 'fonte': FONTES_VALIDAS}
+)
+def get_mapa_estados(ano, fonte):
+    fonte = fonte.lower()
 
     try:
-        ano = int(ano_str)
+        ano = int(ano)
     except ValueError:
         return jsonify({
             'success': False,
-            'error': f'Ano inválido: "{ano_str}". Deve ser um número inteiro.'
+            'error': f'Ano inválido: "{ano}". Deve ser um número inteiro.'
         }), 400
 
     try:
@@ -277,17 +341,32 @@ def get_mapa_estados():
 
 @api_bp.route('/geojson_brasil')
 def get_geojson_brasil():
+    resolucao = request.args.get('resolucao', 'alta').lower()
+    formato = request.args.get('formato', 'geojson').lower()
+
+    if resolucao not in RESOLUCOES:
+        return jsonify({
+            'success': False,
+            'error': f'Resolução inválida. Use: {", ".join(RESOLUCOES)}'
+        }), 400
+
+    if formato not in FORMATOS:
+        return jsonify({
+            'success': False,
+            'error': f'Formato inválido. Use: {", ".join(FORMATOS)}'
+        }), 400
+
     try:
-        geojson_data = DataProcessor.preparar_geojson_brasil()
+        geojson_raw = DataProcessor.preparar_geojson_brasil(resolucao, formato)
 
-        if geojson_data is None:
+        if geojson_raw is None:
             return jsonify({
                 'success': False,
                 'error': 'GeoJSON não disponível',
                 'message': 'Erro ao carregar dados geográficos do Brasil'
             }), 500
 
-        return jsonify(geojson_data)
+        return send_precompressed(geojson_raw)
     
 
     except Exception as e:
@@ -299,16 +378,16 @@ def get_geojson_brasil():
 
 
 @api_bp.route('/municipios_por_estado')
-def get_municipios_por_estado():
-    uf = request.args.get('uf', '').upper()
-    ano_str = request.args.get('ano', '2021')
+@response_cache.cached(padroes = {'uf': '', 'ano': '2021'})
+def get_municipios_por_estado(uf, ano):
+    uf = uf.upper()
 
     try:
-        ano = int(ano_str)
+        ano = int(ano)
     except ValueError:
         return jsonify({
             'success': False,
-            'error': f'Ano inválido: "{ano_str}". Deve ser um número inteiro.'
+            'error': f'Ano inválido: "{ano}". Deve ser um número inteiro.'
         }), 400
 
 
@@ -342,10 +421,75 @@ def get_municipios_por_estado():
         }), 500
 
 
-@api_bp.route('/municipio_info')
-def get_municipio_info():
-    cod_municipio = request.args.get('cod_municipio', '')
+# Sem cache de respostas: cada tecla gera uma consulta nova e o índice em memória responde em microssegundos
+@api_bp.route('/municipios/busca')
+def get_busca_municipios():
+    consulta = request.args.get('q', '').strip()
+    uf = request.args.get('uf', '').strip().upper() or None
+    limite_str = request.args.get('limite', '10')
+    ano_str = request.args.get('ano', '2021')
+
+    if not consulta:
+        return jsonify({
+            'success': False,
+            'error': 'Informe o nome ou código do município em "q".'
+        }), 400
+
+    if len(consulta) > 100:
+        return jsonify({
+            'success': False,
+            'error': 'Consulta muito longa: use até 100 caracteres.'
+        }), 400
 
+    try:
+        limite = int(limite_str)
+        ano = int(ano_str)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': f'Parâmetros inválidos: limite "{limite_str}" e ano "{ano_str}" devem ser números inteiros.'
+        }), 400
+
+    if not 1 <= limite <= 50:
+        return jsonify({
+            'success': False,
+            'error': f'Limite inválido: {limite}. Use um valor entre 1 e 50.'
+        }), 400
+
+    if ano not in ANOS_VALIDOS:
+        return jsonify({
+            'success': False,
+            'error': f'Ano inválido: {ano}. Anos disponíveis: {ANOS_VALIDOS}'
+        }), 400
+
+
+    try:
+        municipios = DataProcessor.buscar_municipios(consulta, limite, uf, ano)
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'q': consulta,
+                'uf': uf,
+                'ano': ano,
+                'municipios': municipios,
+                'total': len(municipios)
+            },
+            'message': f'{len(municipios)} municípios encontrados'
+        })
+
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Erro interno ao buscar municípios'
+        }), 500
+
+
+@api_bp.route('/municipio_info')
+@response_cache.cached(padroes = {'cod_municipio': ''})
+def get_municipio_info(cod_municipio):
     try:
         info = DataProcessor.buscar_info_municipio(cod_municipio)
         
@@ -366,4 +510,420 @@ def get_municipio_info():
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+def _lista(valor, converter = str):
+    # Parâmetro com vários valores separados por vírgula; ausente ou vazio = todos
+    valor = valor.strip()
+    if not valor:
+        return None
+    return [converter(item.strip()) for item in valor.split(',') if item.strip()]
+
+
+@api_bp.route('/agregado')
+@response_cache.cached(
+    padroes = {
+        'nivel': 'nacional',
+        'metrica': 'area',
+        'ano': '',
+        'fonte': 'todas',
+        'uf': '',
+        'cultura': 'soja',
+        'formato': series.negotiated_format
+    },
+    vary = 'Accept'
+)
+def get_agregado(nivel, metrica, ano, fonte, uf, cultura, formato):
+    # Qualquer recorte do cubo de área (cultura x fonte x ano x uf) em formato longo, colunas como arrays
+    if formato not in series.FORMATOS:
+        return _formato_invalido(formato)
+
+    nivel = nivel.lower()
+    metrica = metrica.lower()
+    cultura = cultura.lower()
+
+    try:
+        anos = _lista(ano, int)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': f'Ano inválido: "{ano}". Use anos inteiros separados por vírgula.'
+        }), 400
+
+    fontes = _lista(fonte, str.upper)
+    if fontes == ['TODAS']:
+        fontes = None
+
+    ufs = _lista(uf, str.upper)
+
+
+    try:
+        colunas = DataProcessor.agregar(nivel, metrica, anos, fontes, ufs, cultura)
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Erro interno ao agregar dados'
+        }), 500
+
+
+    return series.respond({
+        'success': True,
+        'data': {
+            'nivel': nivel,
+            'metrica': metrica,
+            'cultura': cultura,
+            'unidade': METRICAS_AGREGADO[metrica],
+            'colunas': colunas,
+            'total': len(colunas['valor'])
+        },
+        'message': f"{len(colunas['valor'])} linhas agregadas"
+    }, formato)
+
+
+# Consultas livres ficam fora do cache de respostas; POST aceita o mesmo conteúdo em JSON para SQL longo
+@api_bp.route('/consulta', methods = ['GET', 'POST'])
+def get_consulta():
+    if not sql_engine.available:
+        return jsonify({
+            'success': False,
+            'error': 'Consultas SQL indisponíveis: o pacote duckdb não está instalado.'
+        }), 503
+
+    formato = series.negotiated_format()
+    if formato not in series.FORMATOS:
+        return _formato_invalido(formato)
+
+    if request.method == 'POST':
+        corpo = request.get_json(silent = True) or {}
+        if not isinstance(corpo, dict):
+            return jsonify({
+                'success': False,
+                'error': 'Corpo inválido: envie um objeto JSON com "sql" e, opcionalmente, "parametros" e "limite".'
+            }), 400
+
+        sql = corpo.get('sql', '')
+        parametros = corpo.get('parametros')
+        limite_str = str(corpo.get('limite', sql_engine.row_limit))
+    else:
+        sql = request.args.get('sql', '')
+        parametros = request.args.get('parametros')
+        limite_str = request.args.get('limite', str(sql_engine.row_limit))
+
+        try:
+            parametros = json.loads(parametros) if parametros else None
+        except ValueError:
+            # JSON malformado é recusado na validação abaixo, junto com os tipos errados
+            parametros = ''
+
+    if not str(sql).strip():
+        return jsonify({
+            'success': False,
+            'error': 'Informe a consulta em "sql". As tabelas estão em information_schema.tables e as colunas em information_schema.columns.'
+        }), 400
+
+    if parametros is not None and not isinstance(parametros, (dict, list)):
+        return jsonify({
+            'success': False,
+            'error': 'Parâmetros inválidos: use um objeto JSON para $nome ou uma lista para ?.'
+        }), 400
+
+    try:
+        limite = int(limite_str)
+    except ValueError:
+        limite = 0
+
+    if not 1 <= limite <= sql_engine.max_rows:
+        return jsonify({
+            'success': False,
+            'error': f'Limite inválido: "{limite_str}". Use um valor entre 1 e {sql_engine.max_rows}.'
+        }), 400
+
+
+    try:
+        tabela, truncado = sql_engine.execute(sql, parametros, limite)
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    except QueryTimeout as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Restrinja a consulta com filtros ou agregações'
+        }), 504
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Erro interno ao executar a consulta'
+        }), 500
+
+
+    mensagem = f"{tabela.num_rows} linhas" + (f" (cortado em {limite})" if truncado else '')
+
+    # Clientes Arrow recebem o próprio resultado do DuckDB, sem passar por arrays intermediários
+    if formato == 'arrow':
+        return series.respond_table(tabela, {
+            'success': True,
+            'data': {'total': tabela.num_rows, 'limite': limite, 'truncado': truncado},
+            'message': mensagem
+        })
+
+    return series.respond({
+        'success': True,
+        'data': {
+            'colunas': columns(tabela),
+            'tipos': {campo.name: str(campo.type) for campo in tabela.schema},
+            'total': tabela.num_rows,
+            'limite': limite,
+            'truncado': truncado
+        },
+        'message': mensagem
+    }, formato)
+
+
+# Painéis do dashboard servidos juntos por /api/painel: view de origem e seus parâmetros a partir dos filtros globais
+PAINEIS = {
+    'comparacao_nacional': (get_comparacao_nacional, lambda filtros: {'formato': filtros['formato']}),
+    'comparacao_estadual': (get_comparacao_estadual, lambda filtros: {'formato': filtros['formato']}),
+    'kpis': (get_kpis, lambda filtros: {'ano': filtros['ano'], 'fonte': filtros['fonte']}),
+    'mapa_estados': (get_mapa_estados, lambda filtros: {'ano': filtros['ano'], 'fonte': filtros['fonte']}),
+    'waterfall': (get_waterfall, lambda filtros: {
+        'fonte': 'CONAB' if filtros['fonte'] == 'todas' else filtros['fonte'].upper(),
+        'periodo': filtros['periodo']
+    }),
+    'municipio_destaque': (get_municipio_destaque, lambda filtros: {
+        'cod_municipio': filtros['cod_municipio'],
+        'ano': filtros['ano']
+    }),
+    'evolucao_temporal': (get_evolucao_temporal, lambda filtros: {
+        'cod_municipio': filtros['cod_municipio'],
+        'formato': filtros['formato']
+    }),
+    'municipio_info': (get_municipio_info, lambda filtros: {'cod_municipio': filtros['cod_municipio']})
+}
+
+_executor_paineis = None
+_executor_lock = threading.Lock()
+
+
+def _executor():
+    # Criado no primeiro uso, já dentro do worker: threads não atravessam o fork do gunicorn
+    global _executor_paineis
+
+    with _executor_lock:
+        if _executor_paineis is None:
+            _executor_paineis = ThreadPoolExecutor(
+                max_workers = current_app.config.get('PAINEL_WORKERS', 4),
+                thread_name_prefix = 'painel'
+            )
+
+    return _executor_paineis
+
+
+def _executar_painel(app, estado, nome, args):
+    # A view da rota individual chamada direto com os parâmetros do painel: mesma validação, mesma chave
+    # e mesmo cache de respostas, sem montar uma requisição
+    view = PAINEIS[nome][0]
+
+    with app.app_context(), data_loader.pinned(estado):
+        try:
+            resposta = app.make_response(response_cache.fetch(view.__wrapped__, f"{api_bp.url_prefix}/{nome}", args))
+        except Exception as e:
+            resposta = app.make_response((jsonify({'success': False, 'error': str(e)}), 500))
+
+    return resposta.status_code, resposta.get_data()
+
+
+@api_bp.route('/painel')
+@response_cache.cached(padroes = {
+    'ano': '2021',
+    'fonte': 'todas',
+    'cod_municipio': '5100201',
+    'periodo': '2020-2021',
+    'formato': 'json',
+    'paineis': ''
+})
+def get_painel(ano, fonte, cod_municipio, periodo, formato, paineis):
+    filtros = {
+        'ano': ano,
+        'fonte': fonte.lower(),
+        'cod_municipio': cod_municipio,
+        'periodo': periodo,
+        'formato': formato
+    }
+
+    # Os painéis entram no corpo como JSON, então Arrow não se aplica aqui
+    if filtros['formato'] not in ('json', 'bdata'):
+        return _formato_invalido(filtros['formato'])
+
+    nomes = [nome for nome in paineis.split(',') if nome] or list(PAINEIS)
+    invalidos = [nome for nome in nomes if nome not in PAINEIS]
+
+    if invalidos:
+        return jsonify({
+            'success': False,
+            'error': f'Painéis inválidos: {", ".join(invalidos)}. Use: {", ".join(PAINEIS)}'
+        }), 400
+
+    # Todos os painéis na versão dos dados desta requisição, calculados em paralelo
+    app = current_app._get_current_object()
+    estado = data_loader.state()
+
+    tarefas = {}
+    for nome in nomes:
+        args = PAINEIS[nome][1](filtros)
+        tarefas[nome] = (args, _executor().submit(_executar_painel, app, estado, nome, args))
+
+    # Cada resposta já é JSON pronto (muitas vêm do cache) e entra no corpo sem ser decodificada
+    partes = []
+    status = []
+    for nome, (args, tarefa) in tarefas.items():
+        status_painel, corpo = tarefa.result()
+        status.append(status_painel)
+        partes.append(
+            b'"%s":{"status":%d,"parametros":%s,"resposta":%s}'
+            % (nome.encode(), status_painel, json.dumps(args).encode(), corpo)
+        )
+
+    # Nenhum painel respondeu: o lote falha com o status deles (400 se forem diferentes, 500 se algum for erro interno)
+    sucesso = any(s < 400 for s in status)
+    if sucesso:
+        status_lote = 200
+    elif len(set(status)) == 1:
+        status_lote = status[0]
+    else:
+        status_lote = 500 if any(s >= 500 for s in status) else 400
+
+    inicio = b'{"success":true,' if sucesso else '{"success":false,"error":"Nenhum painel pôde ser carregado",'.encode('utf-8')
+    resposta = Response(
+        inicio + b'"paineis":{' + b','.join(partes) + b'}}',
+        status = status_lote,
+        mimetype = 'application/json'
+    )
+
+    # Erro interno num painel pode ser transitório: o lote não entra no cache de respostas
+    if any(s >= 500 for s in status):
+        resposta.cache_control.no_store = True
+
+    return resposta
+
+
+@api_bp.route('/tiles/<int:z>/<int:x>/<int:y>')
+def get_tile(z, x, y):
+    if not tile_store.disponivel():
+        return jsonify({
+            'success': False,
+            'error': 'Tiles de municípios não disponíveis',
+            'message': 'Gere o MBTiles com python -m api.tiles'
+        }), 404
+
+    try:
+        # Fora da pirâmide de tiles: 404, não 204 como uma área sem municípios
+        if not tile_store.contains(z, x, y):
+            return jsonify({
+                'success': False,
+                'error': f'Tile inexistente: {z}/{x}/{y}. Use 0 <= z <= {tile_store.max_zoom()} e 0 <= x, y < 2^z.'
+            }), 404
+
+        tile = tile_store.get_tile(z, x, y)
+
+        # Tile vazio: nenhum município intersecta essa área
+        if tile is None:
+            return Response(status = 204)
+
+        resposta = Response(tile, mimetype = 'application/vnd.mapbox-vector-tile')
+        if request.accept_encodings['gzip']:
+            resposta.headers['Content-Encoding'] = 'gzip'
+        else:
+            resposta.set_data(gzip.decompress(tile))
+
+        resposta.headers['Vary'] = 'Accept-Encoding'
+        resposta.headers['Cache-Control'] = 'public, max-age=86400'
+        return resposta
+    
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def _token():
+    return request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+
+
+def _nao_autorizado():
+    return jsonify({
+        'success': False,
+        'error': 'Não autorizado'
+    }), 401
+
+
+# Diagnóstico (pids, memória do processo, tamanho dos datasets): mesmo token da recarga dos dados
+@api_bp.route('/cache_stats')
+def get_cache_stats():
+    if not data_reloader.authorized(_token()):
+        return _nao_autorizado()
+
+    return jsonify({
+        'success': True,
+        'data': response_cache.stats()
+    })
+
+
+@api_bp.route('/memoria')
+def get_memoria():
+    if not data_reloader.authorized(_token()):
+        return _nao_autorizado()
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'pid': os.getpid(),
+            'processo': data_loader.process_memory(),
+            'datasets': data_loader.memory_report()
+        }
+    })
+
+
+@api_bp.route('/admin/reload', methods = ['GET', 'POST'])
+def reload_dados():
+    if not data_reloader.authorized(_token()):
+        return _nao_autorizado()
+
+    if request.method == 'GET':
+        return jsonify({
+            'success': True,
+            'data': {
+                'versao': data_loader.version,
+                'ultima_recarga': data_reloader.ultima_recarga
+            }
+        })
+
+    # A nova versão é montada em segundo plano; este worker troca assim que ela estiver pronta
+    # e os demais na próxima verificação do observador de arquivos
+    data_reloader.request_reload()
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'versao': data_loader.version,
+            'propagacao_segundos': data_reloader.intervalo or None
+        },
+        'message': 'Recarga iniciada'
+    }), 202
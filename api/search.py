@@ -0,0 +1,141 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from api.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+
+def normalize(texto):
+    # Sem acentos, minúsculo e só letras/dígitos separados por um espaço: "Santa Bárbara d'Oeste" -> "santa barbara d oeste"
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', texto))
+
+
+def trigrams(texto):
+    # Trigramas com bordas em cada palavra, como no pg_trgm: "boa" -> "  b", " bo", "boa", "oa "
+    resultado = set()
+    for palavra in texto.split():
+        palavra = f"  {palavra} "
+        resultado.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return resultado
+
+
+class MunicipalityIndex:
+    # Índice em memória dos municípios de uma versão dos dados: prefixos por busca binária num array
+    # ordenado de sufixos por palavra ("agua boa", "boa") e trigramas para tolerar erros de digitação
+
+    # Similaridade mínima (Jaccard dos trigramas) para uma sugestão aproximada
+    SIMILARIDADE_MINIMA = 0.3
+
+    def __init__(self, codigos, nomes, ufs, estados, areas):
+        # areas: {ano: array alinhado com codigos}, usado para ordenar os resultados
+        self.codigos = list(codigos)
+        self.nomes = list(nomes)
+        self.ufs = list(ufs)
+        self.estados = list(estados)
+        self.areas = areas
+        self.ufs_array = np.asarray(self.ufs)
+
+        chaves = []
+        for posicao, nome in enumerate(self.nomes):
+            palavras = normalize(nome).split()
+            for inicio in range(len(palavras)):
+                # Nome inteiro vem com prioridade 0; começando numa palavra do meio, prioridade 1
+                chaves.append((' '.join(palavras[inicio:]), min(inicio, 1), posicao))
+        for posicao, codigo in enumerate(self.codigos):
+            chaves.append((str(codigo), 0, posicao))
+
+        chaves.sort()
+        self.chaves = [chave for chave, _, _ in chaves]
+        self.prioridades = np.array([prioridade for _, prioridade, _ in chaves], dtype = np.int8)
+        self.posicoes = np.array([posicao for _, _, posicao in chaves], dtype = np.int32)
+
+        postagens = {}
+        tamanhos = np.zeros(len(self.nomes), dtype = np.int32)
+        for posicao, nome in enumerate(self.nomes):
+            tris = trigrams(normalize(nome))
+            tamanhos[posicao] = len(tris)
+            for tri in tris:
+                postagens.setdefault(tri, []).append(posicao)
+
+        self.trigramas = {tri: np.array(lista, dtype = np.int32) for tri, lista in postagens.items()}
+        self.tamanhos = tamanhos
+
+    @classmethod
+    def from_frame(cls, df):
+        # Uma entrada por município; área por ano vinda das linhas de base_municipios
+        municipios = df.drop_duplicates('cod_municipio').sort_values('cod_municipio')
+        codigos = municipios['cod_municipio'].astype(str).tolist()
+
+        tabela = df.pivot_table(index = 'cod_municipio', columns = 'ano', values = 'area_plantada', aggfunc = 'sum', observed = True)
+        tabela = tabela.reindex(municipios['cod_municipio'].to_numpy()).fillna(0)
+        areas = {int(ano): tabela[ano].to_numpy(dtype = 'float64') for ano in tabela.columns}
+
+        return cls(codigos, municipios['municipio'].astype(str), municipios['uf'].astype(str), municipios['estado'].astype(str), areas)
+
+    def _area(self, ano):
+        if ano in self.areas:
+            return self.areas[ano]
+        return self.areas[max(self.areas)] if self.areas else np.zeros(len(self.nomes))
+
+    def _prefixo(self, consulta):
+        # Por município: 0 nome igual à consulta, 1 nome começa com ela, 2 uma palavra do meio começa, 3 nada
+        inicio = bisect_left(self.chaves, consulta)
+        fim = bisect_left(self.chaves, consulta + '\uffff', inicio)
+
+        melhor = np.full(len(self.nomes), 3, dtype = np.int8)
+        np.minimum.at(melhor, self.posicoes[inicio:fim], self.prioridades[inicio:fim] + 1)
+
+        # Chaves iguais à consulta ficam no começo da faixa
+        i = inicio
+        while i < fim and self.chaves[i] == consulta:
+            if self.prioridades[i] == 0:
+                melhor[self.posicoes[i]] = 0
+            i += 1
+
+        return melhor
+
+    def _aproximados(self, consulta):
+        tris = trigrams(consulta)
+        postagens = [self.trigramas[tri] for tri in tris if tri in self.trigramas]
+        if not postagens:
+            return np.zeros(len(self.nomes))
+
+        comuns = np.bincount(np.concatenate(postagens), minlength = len(self.nomes))
+        return comuns / (len(tris) + self.tamanhos - comuns)
+
+    def search(self, consulta, limite = 10, uf = None, ano = None):
+        consulta = normalize(consulta)
+        if not consulta:
+            return []
+
+        area = self._area(ano)
+        filtro = self.ufs_array == uf.upper() if uf else np.ones(len(self.nomes), dtype = bool)
+
+        # Nome exato, prefixo do nome, prefixo de uma palavra do meio; dentro de cada grupo, maior área primeiro
+        prioridade = self._prefixo(consulta)
+        candidatos = np.flatnonzero((prioridade < 3) & filtro)
+        ordem = np.lexsort((-area[candidatos], prioridade[candidatos]))
+        selecionados = [(int(p), 'prefixo') for p in candidatos[ordem[:limite]]]
+
+        # Completa com nomes parecidos quando os prefixos não bastam (erros de digitação)
+        if len(selecionados) < limite and len(consulta) >= 3:
+            similaridade = self._aproximados(consulta)
+            similaridade[candidatos] = 0
+            aproximados = np.flatnonzero((similaridade >= self.SIMILARIDADE_MINIMA) & filtro)
+            ordem = np.lexsort((-area[aproximados], -similaridade[aproximados]))
+            selecionados += [(int(p), 'aproximado') for p in aproximados[ordem[:limite - len(selecionados)]]]
+
+        return [
+            {
+                'codigo': self.codigos[p],
+                'nome': self.nomes[p],
+                'uf': self.ufs[p],
+                'estado': self.estados[p],
+                'area_plantada': float(area[p]),
+                'correspondencia': correspondencia
+            }
+            for p, correspondencia in selecionados
+        ]
@@ -0,0 +1,113 @@
+import base64
+from flask import Response, current_app, request
+from api.metrics import timed
+from api.lazy import lazy_import
+
+np = lazy_import('numpy')
+pa = lazy_import('pyarrow')
+
+MIMETYPE_ARROW = 'application/vnd.apache.arrow.stream'
+
+# json: listas de números; bdata: arrays numéricos como buffers little-endian em base64
+# ({'dtype', 'bdata'}, como o Plotly); arrow: IPC stream com um buffer tipado por array
+FORMATOS = ['json', 'bdata', 'arrow']
+
+# Tipos aceitos pelo Plotly em bdata, pelo nome do dtype; os demais inteiros vão como float64
+DTYPES_BDATA = {
+    'float64': 'f8',
+    'float32': 'f4',
+    'int32': 'i4',
+    'uint32': 'u4',
+    'int16': 'i2',
+    'uint16': 'u2',
+    'int8': 'i1',
+    'uint8': 'u1'
+}
+
+
+def negotiated_format():
+    # ?formato= tem prioridade; sem ele, o Accept escolhe entre Arrow e JSON
+    formato = request.args.get('formato')
+    if formato:
+        return formato
+
+    if request.accept_mimetypes.best_match(['application/json', MIMETYPE_ARROW]) == MIMETYPE_ARROW:
+        return 'arrow'
+
+    return 'json'
+
+
+def _numerico(valor):
+    return isinstance(valor, np.ndarray) and valor.ndim == 1 and valor.dtype.kind in 'iuf'
+
+
+def _substituir(obj, converter):
+    if _numerico(obj):
+        return converter(obj)
+
+    if isinstance(obj, dict):
+        return {chave: _substituir(valor, converter) for chave, valor in obj.items()}
+
+    if isinstance(obj, (list, tuple)):
+        return [_substituir(valor, converter) for valor in obj]
+
+    return obj
+
+
+def _bdata(array):
+    dtype = DTYPES_BDATA.get(array.dtype.name, 'f8')
+    buffer = np.ascontiguousarray(array, dtype = np.dtype(dtype).newbyteorder('<'))
+
+    return {'dtype': dtype, 'bdata': base64.b64encode(buffer.tobytes()).decode('ascii')}
+
+
+def to_bdata(payload):
+    return _substituir(payload, _bdata)
+
+
+def to_arrow(payload):
+    # Tabela de uma linha: cada array numérico vira uma coluna list<tipo>; o restante do payload
+    # segue como JSON nos metadados do schema, com {"$coluna": nome} no lugar de cada array
+    colunas = {}
+
+    def registrar(array):
+        nome = f"c{len(colunas)}"
+        colunas[nome] = pa.array([array], type = pa.list_(pa.from_numpy_dtype(array.dtype)))
+        return {'$coluna': nome}
+
+    estrutura = _substituir(payload, registrar)
+
+    tabela = pa.table(colunas) if colunas else pa.table({'vazio': pa.nulls(1)})
+    tabela = tabela.replace_schema_metadata({'payload': current_app.json.dumps(estrutura)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabela.schema) as writer:
+        writer.write_table(tabela)
+
+    return sink.getvalue().to_pybytes()
+
+
+@timed('serializacao')
+def respond_table(tabela, payload):
+    # Tabela Arrow já pronta (resultado de /api/consulta) vai como está no IPC stream, uma coluna por campo;
+    # o restante do payload segue como JSON nos metadados do schema, como em to_arrow
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[b'payload'] = current_app.json.dumps(payload).encode('utf-8')
+    tabela = tabela.replace_schema_metadata(metadados)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabela.schema) as writer:
+        writer.write_table(tabela)
+
+    return Response(sink.getvalue().to_pybytes(), mimetype = MIMETYPE_ARROW)
+
+
+@timed('serializacao')
+def respond(payload, formato):
+    if formato == 'arrow':
+        return Response(to_arrow(payload), mimetype = MIMETYPE_ARROW)
+
+    if formato == 'bdata':
+        return current_app.json.response(to_bdata(payload))
+
+    return current_app.json.response(payload)
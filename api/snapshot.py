@@ -0,0 +1,143 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from config import Config
+from api.fingerprint import code_version
+
+
+# Muda quando a estrutura do arquivo muda; snapshots de outro formato são ignorados
+FORMATO = 3
+
+# Arquivo: cabeçalho (assinatura, tamanho do índice), índice JSON e os bytes das respostas e geometrias.
+# Nada no arquivo é executado ao carregar, e os bytes são lidos do mapeamento só quando servidos:
+# as páginas ficam no cache do sistema, compartilhadas entre os processos
+ASSINATURA = b'SNAPSHOT'
+CABECALHO = struct.Struct('<8sQ')
+
+
+class _Trechos(Mapping):
+    # Entradas do índice -> bytes do mapeamento; entradas com campos extras viram tuplas (corpo, *extras)
+
+    def __init__(self, mapa, inicio, indice):
+        self._mapa = mapa
+        self._inicio = inicio
+        self._indice = indice
+
+    def __getitem__(self, chave):
+        posicao, tamanho, *extras = self._indice[chave]
+        corpo = self._mapa[self._inicio + posicao:self._inicio + posicao + tamanho]
+        return (corpo, *extras) if extras else corpo
+
+    def __iter__(self):
+        return iter(self._indice)
+
+    def __len__(self):
+        return len(self._indice)
+
+
+class StartupSnapshot:
+    # Respostas pré-computadas e geometrias comprimidas de uma versão dos dados, num único arquivo
+
+    def __init__(self, path = None, ativo = True):
+        self.path = path
+        self.ativo = ativo
+
+    def init_app(self, app):
+        self.path = app.config.get('SNAPSHOT_PATH', self.path)
+        self.ativo = app.config.get('STARTUP_SNAPSHOT', self.ativo)
+
+    def load(self, versao):
+        if not self.ativo or self.path is None:
+            return None
+
+        try:
+            with open(self.path, 'rb') as f:
+                mapa = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+            assinatura, tamanho = CABECALHO.unpack_from(mapa)
+            if assinatura != ASSINATURA:
+                raise ValueError('assinatura desconhecida')
+
+            indice = json.loads(mapa[CABECALHO.size:CABECALHO.size + tamanho])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Snapshot de inicialização ilegível ({e}), ignorando")
+            return None
+
+        # Snapshot de outra versão dos dados ou gerado por outro código (deploy) não serve:
+        # o app carrega normalmente e gera um novo
+        if indice.get('formato') != FORMATO or indice.get('versao') != versao:
+            return None
+
+        if indice.get('codigo') != code_version():
+            print("Snapshot de inicialização gerado por outra versão do código, ignorando")
+            return None
+
+        inicio = CABECALHO.size + tamanho
+        print(f"Snapshot de inicialização carregado (versão {versao})")
+
+        return {
+            'versao': versao,
+            'respostas': _Trechos(mapa, inicio, indice['respostas']),
+            'geometrias': {
+                nome: {'etag': recurso['etag'], 'variantes': _Trechos(mapa, inicio, recurso['variantes'])}
+                for nome, recurso in indice['geometrias'].items()
+            }
+        }
+
+    def save(self, versao, respostas, geometrias):
+        if not self.ativo or self.path is None:
+            return
+
+        blocos = []
+        posicao = 0
+
+        def guardar(corpo):
+            nonlocal posicao
+            blocos.append(corpo)
+            posicao += len(corpo)
+            return [posicao - len(corpo), len(corpo)]
+
+        indice = {
+            'formato': FORMATO,
+            'versao': versao,
+            'codigo': code_version(),
+            'respostas': {
+                chave: guardar(corpo) + [status, mimetype]
+                for chave, (corpo, status, mimetype) in respostas.items()
+            },
+            'geometrias': {
+                nome: {
+                    'etag': recurso['etag'],
+                    'variantes': {encoding: guardar(corpo) for encoding, corpo in recurso['variantes'].items()}
+                }
+                for nome, recurso in geometrias.items()
+            }
+        }
+        cabecalho = json.dumps(indice, separators = (',', ':')).encode('utf-8')
+
+        # Grava ao lado e renomeia: outro processo nunca lê um arquivo pela metade, e quem já mapeou
+        # o anterior continua lendo o arquivo antigo até soltá-lo
+        temporario = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            self.path.parent.mkdir(parents = True, exist_ok = True)
+            with open(temporario, 'wb') as f:
+                f.write(CABECALHO.pack(ASSINATURA, len(cabecalho)))
+                f.write(cabecalho)
+                f.writelines(blocos)
+            os.replace(temporario, self.path)
+        except OSError as e:
+            print(f"Não foi possível gravar o snapshot de inicialização: {e}")
+
+
+startup_snapshot = StartupSnapshot(Config.SNAPSHOT_PATH, Config.STARTUP_SNAPSHOT)
+
+
+if __name__ == '__main__':
+    # Gera (ou confirma) o snapshot da versão atual dos dados, por exemplo no build do deploy
+    from app import create_app
+
+    create_app(os.environ.get('FLASK_ENV', 'production'))
@@ -0,0 +1,139 @@
+import os
+import threading
+from functools import partial
+from config import Config
+from api.data_loader import data_loader
+from api.lazy import lazy_import
+
+pa = lazy_import('pyarrow')
+pc = lazy_import('pyarrow.compute')
+ds = lazy_import('pyarrow.dataset')
+duckdb = lazy_import('duckdb', opcional = True)
+
+# Formatos de arquivo de DATA_DIR que viram views, pela extensão
+FORMATOS_ARQUIVO = {'.feather': 'feather', '.parquet': 'parquet'}
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def columns(tabela):
+    # Resultado em colunas: números como arrays (json, bdata ou arrow via api/series.py), o resto como listas
+    colunas = {}
+
+    for nome, coluna in zip(tabela.column_names, tabela.columns):
+        tipo = coluna.type
+
+        if pa.types.is_floating(tipo) or (pa.types.is_integer(tipo) and coluna.null_count == 0):
+            colunas[nome] = coluna.to_numpy()
+        elif pa.types.is_integer(tipo) or pa.types.is_decimal(tipo):
+            # Inteiros com nulos e decimais vão como float64, nulo = NaN
+            colunas[nome] = pc.cast(coluna, pa.float64()).to_numpy()
+        elif pa.types.is_string(tipo) or pa.types.is_large_string(tipo) or pa.types.is_boolean(tipo):
+            colunas[nome] = coluna.to_pylist()
+        else:
+            # Datas, listas e structs como texto
+            colunas[nome] = [None if valor is None else str(valor) for valor in coluna.to_pylist()]
+
+    return colunas
+
+
+class SqlEngine:
+    # DuckDB em memória com uma view por arquivo de DATA_DIR, aberto só para consultas SELECT.
+    # Filtros e projeções descem até o scan do dataset Arrow e os fragmentos são lidos em paralelo
+    # pelas threads do banco.
+
+    def __init__(self):
+        self.timeout = 5.0
+        self.row_limit = 1000
+        self.max_rows = 10000
+        self.threads = 0
+        self.memory_limit = '1GB'
+
+    def init_app(self, app):
+        self.timeout = app.config.get('SQL_TIMEOUT', 5.0)
+        self.row_limit = app.config.get('SQL_ROW_LIMIT', 1000)
+        self.max_rows = app.config.get('SQL_MAX_ROWS', 10000)
+        self.threads = app.config.get('SQL_THREADS', 0)
+        self.memory_limit = app.config.get('SQL_MEMORY_LIMIT', '1GB')
+
+    @property
+    def available(self):
+        return duckdb is not None
+
+    def _build(self):
+        configuracao = {'memory_limit': self.memory_limit}
+        if self.threads:
+            configuracao['threads'] = self.threads
+
+        conexao = duckdb.connect(':memory:', config = configuracao)
+
+        # Cada arquivo vira uma view sobre o dataset Arrow: nada é copiado para o banco, o scan lê o
+        # arquivo a cada consulta (só as colunas e grupos de linhas pedidos). Quem abre o arquivo é o
+        # pyarrow, então as views continuam legíveis com o acesso a arquivos do banco bloqueado
+        arquivos = sorted(p for p in Config.DATA_DIR.iterdir() if p.suffix in FORMATOS_ARQUIVO)
+        views = {caminho.stem: ds.dataset(str(caminho), format = FORMATOS_ARQUIVO[caminho.suffix]) for caminho in arquivos}
+
+        # Sem acesso a arquivos (read_csv, COPY, ATTACH...) e sem poder reverter isso por SET
+        conexao.execute("SET enable_external_access = false")
+        conexao.execute("SET lock_configuration = true")
+
+        print(f"Consultas SQL: {len(views)} views (versão {data_loader.version})")
+        return conexao, views
+
+    def _connection(self):
+        # Um banco por versão dos dados e por processo: criado no primeiro uso, já dentro do worker,
+        # porque as threads do DuckDB não atravessam o fork do gunicorn
+        return data_loader.derived(('sql', os.getpid()), self._build)
+
+    def _open_cursor(self, conexao, views):
+        cursor = conexao.cursor()
+        for nome, dataset in views.items():
+            cursor.register(nome, dataset)
+        return cursor
+
+    def _cursor(self):
+        # Views de objetos Arrow valem só no cursor que as registrou: um cursor por thread e versão,
+        # registrado uma vez, em vez de registrar os arquivos a cada consulta
+        conexao, views = self._connection()
+        return data_loader.derived(('sql', os.getpid(), threading.get_ident()), partial(self._open_cursor, conexao, views))
+
+    def _validate(self, conexao, sql):
+        try:
+            comandos = conexao.extract_statements(sql)
+        except duckdb.Error as e:
+            raise ValueError(f"SQL inválido: {e}")
+
+        if len(comandos) != 1:
+            raise ValueError('Envie exatamente um comando SQL')
+
+        if comandos[0].type != duckdb.StatementType.SELECT:
+            raise ValueError('Apenas consultas SELECT são permitidas')
+
+        # Sem o ';' final, para caber na subconsulta do limite
+        return comandos[0].query.strip().rstrip(';').strip()
+
+    def execute(self, sql, parametros = None, limite = None):
+        # parametros: dict para $nome ou lista para ?; devolve a tabela Arrow e se o limite cortou linhas
+        cursor = self._cursor()
+        consulta = self._validate(cursor, sql)
+        limite = min(limite or self.row_limit, self.max_rows)
+
+        temporizador = threading.Timer(self.timeout, cursor.interrupt)
+        temporizador.start()
+
+        try:
+            # Uma linha além do limite indica que o resultado foi cortado; quebras de linha isolam comentários -- da consulta
+            tabela = cursor.execute(f"SELECT * FROM (\n{consulta}\n) LIMIT {limite + 1}", parametros).to_arrow_table()
+        except duckdb.InterruptException:
+            raise QueryTimeout(f"Consulta interrompida após {self.timeout:g}s")
+        except duckdb.Error as e:
+            raise ValueError(str(e))
+        finally:
+            temporizador.cancel()
+
+        return tabela.slice(0, limite), tabela.num_rows > limite
+
+
+sql_engine = SqlEngine()
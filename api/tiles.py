@@ -0,0 +1,371 @@
+import argparse
+import gzip
+import json
+import math
+import sqlite3
+import struct
+import threading
+from pathlib import Path
+from config import Config
+from api import geometry
+from api.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+EXTENT = 4096
+BUFFER = 64
+CAMADA = 'municipios'
+
+
+### CODIFICAÇÃO MAPBOX VECTOR TILE (protobuf) ###
+
+def _varint(valor):
+    saida = bytearray()
+    while True:
+        byte = valor & 0x7F
+        valor >>= 7
+        if valor:
+            saida.append(byte | 0x80)
+        else:
+            saida.append(byte)
+            return bytes(saida)
+
+
+def _zigzag(valor):
+    return (valor << 1) ^ (valor >> 31)
+
+
+def _campo(numero, tipo, conteudo):
+    chave = _varint((numero << 3) | tipo)
+    if tipo == 2:
+        return chave + _varint(len(conteudo)) + conteudo
+    return chave + conteudo
+
+
+def _valor(valor):
+    if isinstance(valor, str):
+        return _campo(1, 2, valor.encode('utf-8'))
+    if isinstance(valor, bool):
+        return _campo(7, 0, _varint(int(valor)))
+    if isinstance(valor, int):
+        return _campo(6, 0, _varint((valor << 1) ^ (valor >> 63)))
+    return _campo(3, 1, struct.pack('<d', float(valor)))
+
+
+def _comando(identificador, quantidade):
+    return (identificador & 0x7) | (quantidade << 3)
+
+
+def _geometria(aneis):
+    # MoveTo, LineTo e ClosePath com deltas zigzag; o cursor continua entre os anéis
+    comandos = []
+    cx, cy = 0, 0
+
+    for anel in aneis:
+        x, y = anel[0]
+        comandos += [_comando(1, 1), _zigzag(x - cx), _zigzag(y - cy)]
+        cx, cy = x, y
+
+        comandos.append(_comando(2, len(anel) - 1))
+        for x, y in anel[1:]:
+            comandos += [_zigzag(x - cx), _zigzag(y - cy)]
+            cx, cy = x, y
+
+        comandos.append(_comando(7, 1))
+
+    return comandos
+
+
+def encode_tile(features, nome_camada = CAMADA):
+    chaves, valores = [], []
+    indice_chaves, indice_valores = {}, {}
+    corpo_features = b''
+
+    for feature in features:
+        tags = []
+        for chave, valor in feature['properties'].items():
+            if chave not in indice_chaves:
+                indice_chaves[chave] = len(chaves)
+                chaves.append(chave)
+
+            valor_chave = (type(valor).__name__, valor)
+            if valor_chave not in indice_valores:
+                indice_valores[valor_chave] = len(valores)
+                valores.append(valor)
+
+            tags += [indice_chaves[chave], indice_valores[valor_chave]]
+
+        conteudo = b''
+        if feature.get('id') is not None:
+            conteudo += _campo(1, 0, _varint(feature['id']))
+        conteudo += _campo(2, 2, b''.join(_varint(t) for t in tags))
+        conteudo += _campo(3, 0, _varint(3))
+        conteudo += _campo(4, 2, b''.join(_varint(c) for c in _geometria(feature['aneis'])))
+
+        corpo_features += _campo(2, 2, conteudo)
+
+    camada = _campo(15, 0, _varint(2))
+    camada += _campo(1, 2, nome_camada.encode('utf-8'))
+    camada += corpo_features
+    camada += b''.join(_campo(3, 2, c.encode('utf-8')) for c in chaves)
+    camada += b''.join(_campo(4, 2, _valor(v)) for v in valores)
+    camada += _campo(5, 0, _varint(EXTENT))
+
+    return _campo(3, 2, camada)
+
+
+### PROJEÇÃO E RECORTE ###
+
+def _mercator(pontos):
+    # Longitude/latitude para coordenadas Web Mercator normalizadas em [0, 1]
+    lon = pontos[:, 0]
+    lat = np.clip(pontos[:, 1], -85.0511, 85.0511)
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0
+    return np.column_stack([x, y])
+
+
+def _recortar(anel, minimo, maximo):
+    # Sutherland–Hodgman contra a janela quadrada do tile (com buffer)
+    for eixo, limite, dentro in ((0, minimo, lambda v: v >= minimo), (0, maximo, lambda v: v <= maximo),
+                                  (1, minimo, lambda v: v >= minimo), (1, maximo, lambda v: v <= maximo)):
+        if not anel:
+            return []
+
+        saida = []
+        anterior = anel[-1]
+        for ponto in anel:
+            if dentro(ponto[eixo]):
+                if not dentro(anterior[eixo]):
+                    saida.append(_intersecao(anterior, ponto, eixo, limite))
+                saida.append(ponto)
+            elif dentro(anterior[eixo]):
+                saida.append(_intersecao(anterior, ponto, eixo, limite))
+            anterior = ponto
+        anel = saida
+
+    return anel
+
+
+def _intersecao(a, b, eixo, limite):
+    t = (limite - a[eixo]) / (b[eixo] - a[eixo])
+    ponto = [a[0] + t * (b[0] - a[0]), a[1] + t * (b[1] - a[1])]
+    ponto[eixo] = limite
+    return ponto
+
+
+def _area(anel):
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(anel, anel[1:] + anel[:1])) / 2
+
+
+def _anel_tile(anel, z, tx, ty, exterior):
+    escala = (2 ** z) * EXTENT
+    pontos = [[x * escala - tx * EXTENT, y * escala - ty * EXTENT] for x, y in anel[:-1]]
+    pontos = _recortar(pontos, -BUFFER, EXTENT + BUFFER)
+
+    inteiros = []
+    for x, y in pontos:
+        ponto = (int(round(x)), int(round(y)))
+        if not inteiros or inteiros[-1] != ponto:
+            inteiros.append(ponto)
+    if len(inteiros) > 1 and inteiros[0] == inteiros[-1]:
+        inteiros.pop()
+
+    if len(inteiros) < 3:
+        return None
+
+    # Anel exterior com área positiva e interior negativa, como pede a especificação MVT
+    area = _area(inteiros)
+    if area == 0:
+        return None
+    if (area > 0) != exterior:
+        inteiros.reverse()
+
+    return inteiros
+
+
+### PIPELINE ###
+
+def _atributos_municipios():
+    # Atributos numéricos (variação em %, uma casa): o estilo do mapa filtra e colore por valor
+    df = pd.read_feather(Config.DATA_DIR / 'base_municipios.feather')
+    atributos = {}
+
+    for row in df.to_dict('records'):
+        codigo = str(row['cod_municipio'])
+        propriedades = atributos.setdefault(codigo, {
+            'cod_municipio': codigo,
+            'nome': row['municipio'],
+            'uf': row['uf']
+        })
+
+        ano = int(row['ano'])
+        if pd.notna(row['area_plantada']):
+            propriedades[f'area_plantada_{ano}'] = float(row['area_plantada'])
+        if pd.notna(row['variacao']):
+            propriedades[f'variacao_{ano}'] = round(float(row['variacao']), 1)
+
+    return atributos
+
+
+def _tiles_feature(coordenadas, z):
+    pontos = np.concatenate([np.array(anel) for poligono in coordenadas for anel in poligono])
+    n = 2 ** z
+    margem = BUFFER / EXTENT
+    x0, y0 = np.floor((pontos.min(axis = 0)) * n - margem).astype(int)
+    x1, y1 = np.floor((pontos.max(axis = 0)) * n + margem).astype(int)
+
+    for tx in range(max(x0, 0), min(x1, n - 1) + 1):
+        for ty in range(max(y0, 0), min(y1, n - 1) + 1):
+            yield tx, ty
+
+
+def build_mbtiles(geojson_path, saida, zooms = range(4, 10), campo_codigo = 'CD_MUN'):
+    with open(geojson_path, 'rb') as f:
+        municipios = json.load(f)
+
+    atributos = _atributos_municipios()
+
+    # Topologia com arcos compartilhados: a simplificação não abre frestas entre municípios vizinhos
+    topologia = geometry.build_topology(municipios)
+    limites = np.concatenate(topologia['arcs'])
+    limites = [*limites.min(axis = 0), *limites.max(axis = 0)]
+    topologia['arcs'] = [_mercator(arc) for arc in topologia['arcs']]
+
+    for objeto, feature in zip(topologia['objetos'], municipios['features']):
+        codigo = str(feature['properties'].get(campo_codigo, ''))
+        objeto['properties'] = atributos.get(codigo, {'cod_municipio': codigo})
+
+    saida.parent.mkdir(parents = True, exist_ok = True)
+    if saida.exists():
+        saida.unlink()
+
+    conexao = sqlite3.connect(saida)
+    conexao.executescript("""
+        CREATE TABLE metadata (name TEXT, value TEXT);
+        CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+    """)
+
+    for z in zooms:
+        # Tolerância de meio pixel do tile nesse zoom
+        simplificado = geometry.to_geojson(topologia, 0.5 / ((2 ** z) * EXTENT))
+
+        tiles = {}
+        for i, feature in enumerate(simplificado['features']):
+            coordenadas = feature['geometry']['coordinates']
+            if not coordenadas:
+                continue
+            for tile in _tiles_feature(coordenadas, z):
+                tiles.setdefault(tile, []).append(i)
+
+        for (tx, ty), indices in tiles.items():
+            features_tile = []
+            for i in indices:
+                feature = simplificado['features'][i]
+                aneis = []
+                for poligono in feature['geometry']['coordinates']:
+                    exterior = _anel_tile(poligono[0], z, tx, ty, True)
+                    if exterior is None:
+                        continue
+                    aneis.append(exterior)
+                    for furo in poligono[1:]:
+                        interior = _anel_tile(furo, z, tx, ty, False)
+                        if interior is not None:
+                            aneis.append(interior)
+
+                if aneis:
+                    codigo = feature['properties'].get('cod_municipio', '')
+                    features_tile.append({
+                        'id': int(codigo) if codigo.isdigit() else None,
+                        'properties': feature['properties'],
+                        'aneis': aneis
+                    })
+
+            if features_tile:
+                # MBTiles usa o esquema TMS: linha invertida em relação ao XYZ
+                conexao.execute(
+                    'INSERT INTO tiles VALUES (?, ?, ?, ?)',
+                    (z, tx, (2 ** z) - 1 - ty, gzip.compress(encode_tile(features_tile)))
+                )
+
+        print(f"Zoom {z}: {len(tiles)} tiles")
+
+    campos = sorted({chave for propriedades in atributos.values() for chave in propriedades})
+    metadados = {
+        'name': CAMADA,
+        'format': 'pbf',
+        'minzoom': str(min(zooms)),
+        'maxzoom': str(max(zooms)),
+        'bounds': ','.join(f'{v:.4f}' for v in limites),
+        'json': json.dumps({
+            'vector_layers': [{
+                'id': CAMADA,
+                'fields': {campo: 'String' if campo in ('nome', 'uf', 'cod_municipio') else 'Number' for campo in campos},
+                'minzoom': min(zooms),
+                'maxzoom': max(zooms)
+            }]
+        })
+    }
+    conexao.executemany('INSERT INTO metadata VALUES (?, ?)', metadados.items())
+    conexao.commit()
+    conexao.close()
+
+
+### LEITURA ###
+
+class TileStore:
+
+    def __init__(self, path = None):
+        self.path = path
+        self._local = threading.local()
+        self._max_zoom = None
+
+    def init_app(self, app):
+        self.path = app.config.get('TILES_PATH', self.path)
+        self._max_zoom = None
+
+    def disponivel(self):
+        return self.path is not None and self.path.exists()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            conexao = sqlite3.connect(f'file:{self.path}?mode=ro', uri = True, check_same_thread = False)
+            self._local.conexao = conexao
+        return conexao
+
+    def max_zoom(self):
+        # Lido uma vez dos metadados do MBTiles
+        if self._max_zoom is None:
+            linha = self._conexao().execute("SELECT value FROM metadata WHERE name = 'maxzoom'").fetchone()
+            self._max_zoom = int(linha[0]) if linha else 0
+        return self._max_zoom
+
+    def contains(self, z, x, y):
+        return 0 <= z <= self.max_zoom() and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+    def get_tile(self, z, x, y):
+        linha = self._conexao().execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            (z, x, (2 ** z) - 1 - y)
+        ).fetchone()
+
+        return linha[0] if linha else None
+
+
+tile_store = TileStore(Config.TILES_PATH)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Gera o MBTiles de municípios a partir da malha municipal do IBGE')
+    parser.add_argument('--malha', default = str(Config.MUNICIPIOS_GEOJSON))
+    parser.add_argument('--saida', default = str(Config.TILES_PATH))
+    parser.add_argument('--zoom-min', type = int, default = 4)
+    parser.add_argument('--zoom-max', type = int, default = 9)
+    parser.add_argument('--campo-codigo', default = 'CD_MUN')
+    args = parser.parse_args()
+
+    build_mbtiles(Path(args.malha), Path(args.saida), range(args.zoom_min, args.zoom_max + 1), args.campo_codigo)
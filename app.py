@@ -1,35 +1,98 @@
-from flask import Flask, render_template
+from flask import Flask, Response, render_template
 from flask_cors import CORS
 from config import config
 from api.routes import api_bp
 from api.data_loader import data_loader
+from api.cache import response_cache
+from api.tiles import tile_store
+from api.snapshot import startup_snapshot
+from api.reload import data_reloader
+from api.json_provider import json_provider
+from api.metrics import request_metrics
+from api.processors import DataProcessor
+from api.sql import sql_engine
+from api import lazy
 import os
+import threading
 
 
 def create_app(config_name = 'development'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = json_provider(app)
 
     CORS(app)
 
+    # Registrado antes dos demais hooks para que o tempo total cubra a requisição inteira
+    request_metrics.init_app(app)
+
     app.register_blueprint(api_bp)
+
+    # Cada requisição usa do início ao fim a versão dos dados que estava ativa quando chegou
+    @app.before_request
+    def fixar_versao_dados():
+        data_loader.pin()
+
+    @app.teardown_request
+    def liberar_versao_dados(exc):
+        data_loader.unpin()
         
     @app.route('/')
     def index():
-        return render_template('dashboard.html')
+        # ETag da variante que o dashboard baixa (media/topojson), não do arquivo de origem
+        try:
+            geojson_versao = data_loader.get_geometry('media', 'topojson')['etag']
+        except KeyError:
+            geojson_versao = ''
+
+        return render_template('dashboard.html', geojson_versao = geojson_versao)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(
+            request_metrics.render(data_loader.access_counts(), response_cache.stats()),
+            mimetype = 'text/plain; version=0.0.4'
+        )
     
 
     with app.app_context():
-        data_loader.load_all_data()
+        startup_snapshot.init_app(app)
+        snapshot = startup_snapshot.load(data_loader.current_version())
+
+        data_loader.load_all_data(snapshot)
+
+        # Com snapshot as respostas pré-computadas saem sem pandas: as bibliotecas e as estruturas
+        # derivadas ficam para warm_up, ou para a primeira requisição que precisar delas
+        if snapshot is None:
+            DataProcessor.preparar_derivados()
         print("Dados carregados com sucesso!")
+
+        response_cache.init_app(app, snapshot['respostas'] if snapshot else None)
+        tile_store.init_app(app)
+        sql_engine.init_app(app)
+
+        if snapshot is None:
+            startup_snapshot.save(data_loader.version, response_cache.precomputed(), data_loader.raw_resources())
+
+        data_reloader.init_app(app)
     
     return app
 
 
+def warm_up():
+    # Importa o que o snapshot adiou e monta índices, índice de busca e cubo da versão atual
+    lazy.load_all()
+    DataProcessor.preparar_derivados()
+
+
 if __name__ == '__main__':
     env = 'production' if os.environ.get('PORT') else 'development'
 
     app = create_app(env)
     port = int(os.environ.get('PORT', 5000))
 
+    # Servidor de desenvolvimento: este processo atende as requisições
+    data_reloader.start()
+    threading.Thread(target = warm_up, daemon = True).start()
+
     app.run(host='0.0.0.0', port=port, debug=(env == 'development'))
\ No newline at end of file
@@ -0,0 +1,69 @@
+import json
+import platform
+import statistics
+import time
+
+
+def percentis(tempos):
+    # Tempos em segundos; resultado em milissegundos
+    if len(tempos) < 2:
+        valor = round(tempos[0] * 1000, 3) if tempos else None
+        return {'p50': valor, 'p95': valor, 'p99': valor}
+
+    cortes = statistics.quantiles(tempos, n = 100, method = 'inclusive')
+
+    return {
+        'p50': round(cortes[49] * 1000, 3),
+        'p95': round(cortes[94] * 1000, 3),
+        'p99': round(cortes[98] * 1000, 3)
+    }
+
+
+def cabecalho(**parametros):
+    return {
+        'gerado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'parametros': parametros
+    }
+
+
+def salvar(resultados, saida):
+    with open(saida, 'w', encoding = 'utf-8') as f:
+        json.dump(resultados, f, indent = 2, ensure_ascii = False)
+        f.write('\n')
+
+
+def comparar(atual, base, metrica, tolerancia):
+    # Casos presentes nos dois resultados cuja métrica piorou além da tolerância (0.2 = 20%)
+    regressoes = []
+
+    for cenario, casos in atual['cenarios'].items():
+        for caso, medidas in casos.items():
+            anterior = base.get('cenarios', {}).get(cenario, {}).get(caso)
+            if not anterior or anterior.get(metrica) in (None, 0) or medidas.get(metrica) is None:
+                continue
+
+            variacao = medidas[metrica] / anterior[metrica] - 1
+            if variacao > tolerancia:
+                regressoes.append({
+                    'cenario': cenario,
+                    'caso': caso,
+                    'metrica': metrica,
+                    'base': anterior[metrica],
+                    'atual': medidas[metrica],
+                    'variacao': round(variacao, 3)
+                })
+
+    return regressoes
+
+
+def relatar_regressoes(regressoes):
+    if not regressoes:
+        print("Nenhuma regressão acima da tolerância")
+        return 0
+
+    print(f"{len(regressoes)} regressões:")
+    for r in regressoes:
+        print(f"  {r['cenario']} / {r['caso']}: {r['metrica']} {r['base']} -> {r['atual']} ({r['variacao']:+.0%})")
+
+    return 1
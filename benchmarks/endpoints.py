@@ -0,0 +1,266 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import urlencode
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from comum import cabecalho, comparar, percentis, relatar_regressoes, salvar
+
+# Token dos endpoints de diagnóstico, passado ao app medido
+TOKEN = 'benchmark'
+
+# Todas as rotas do app (api/routes.py e /metrics), com as combinações de parâmetros que o dashboard usa
+CASOS = [
+    ('comparacao_nacional', '/api/comparacao_nacional', {}, {}),
+    ('comparacao_nacional[bdata]', '/api/comparacao_nacional', {'formato': 'bdata'}, {}),
+    ('comparacao_nacional[arrow]', '/api/comparacao_nacional', {}, {'Accept': 'application/vnd.apache.arrow.stream'}),
+    ('comparacao_estadual', '/api/comparacao_estadual', {}, {}),
+    ('comparacao_estadual[bdata]', '/api/comparacao_estadual', {'formato': 'bdata'}, {}),
+    ('waterfall[conab 2020-2021]', '/api/waterfall', {'fonte': 'CONAB', 'periodo': '2020-2021'}, {}),
+    ('waterfall[ibge 2019-2021]', '/api/waterfall', {'fonte': 'IBGE', 'periodo': '2019-2021'}, {}),
+    ('kpis[2021 todas]', '/api/kpis', {'ano': '2021', 'fonte': 'todas'}, {}),
+    ('kpis[2022 conab]', '/api/kpis', {'ano': '2022', 'fonte': 'conab'}, {}),
+    ('mapa_estados[2021 todas]', '/api/mapa_estados', {'ano': '2021', 'fonte': 'todas'}, {}),
+    ('mapa_estados[2019 ibge]', '/api/mapa_estados', {'ano': '2019', 'fonte': 'ibge'}, {}),
+    ('evolucao_temporal', '/api/evolucao_temporal', {'cod_municipio': '5100201'}, {}),
+    ('evolucao_temporal[bdata]', '/api/evolucao_temporal', {'cod_municipio': '4314902', 'formato': 'bdata'}, {}),
+    ('municipio_destaque', '/api/municipio_destaque', {'cod_municipio': '5100201', 'ano': '2021'}, {}),
+    ('municipios_por_estado[MT]', '/api/municipios_por_estado', {'uf': 'MT', 'ano': '2021'}, {}),
+    ('municipios_por_estado[RS 2019]', '/api/municipios_por_estado', {'uf': 'RS', 'ano': '2019'}, {}),
+    ('municipio_info', '/api/municipio_info', {'cod_municipio': '5100201'}, {}),
+    ('municipios_busca[sao]', '/api/municipios/busca', {'q': 'sao'}, {}),
+    ('municipios_busca[aproximado MT]', '/api/municipios/busca', {'q': 'sorrizo', 'uf': 'MT'}, {}),
+    ('geojson_brasil[media topojson br]', '/api/geojson_brasil', {'resolucao': 'media', 'formato': 'topojson'}, {'Accept-Encoding': 'br'}),
+    ('geojson_brasil[alta geojson]', '/api/geojson_brasil', {'resolucao': 'alta', 'formato': 'geojson'}, {}),
+    ('agregado[nacional area]', '/api/agregado', {}, {}),
+    ('agregado[uf x ano variacao]', '/api/agregado', {'nivel': 'uf', 'metrica': 'variacao'}, {}),
+    ('agregado[arrow]', '/api/agregado', {'nivel': 'uf', 'metrica': 'area', 'ano': '2021'}, {'Accept': 'application/vnd.apache.arrow.stream'}),
+    ('consulta[group by]', '/api/consulta', {'sql': 'SELECT uf, ano, sum(valor) AS area FROM df_estadual GROUP BY ALL ORDER BY uf, ano'}, {}),
+    ('consulta[arrow]', '/api/consulta', {'sql': 'SELECT * FROM base_municipios WHERE ano = 2021', 'limite': '1000'}, {'Accept': 'application/vnd.apache.arrow.stream'}),
+    ('tiles', '/api/tiles/4/5/8', {}, {}),
+    ('painel', '/api/painel', {}, {}),
+    ('painel[bdata 2022 conab]', '/api/painel', {'ano': '2022', 'fonte': 'conab', 'formato': 'bdata'}, {}),
+    ('cache_stats', '/api/cache_stats', {}, {'Authorization': f'Bearer {TOKEN}'}),
+    ('memoria', '/api/memoria', {}, {'Authorization': f'Bearer {TOKEN}'}),
+    ('metrics', '/metrics', {}, {}),
+    ('admin_reload[sem token]', '/api/admin/reload', {}, {})
+]
+
+
+def _url(caminho, params):
+    return f"{caminho}?{urlencode(params)}" if params else caminho
+
+
+def medir_cliente(cliente, caminho, params, headers, requisicoes, alocacoes):
+    url = _url(caminho, params)
+    resposta = cliente.get(url, headers = headers)
+
+    tempos = []
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        t = time.perf_counter()
+        cliente.get(url, headers = headers)
+        tempos.append(time.perf_counter() - t)
+    total = time.perf_counter() - inicio
+
+    # Alocações numa passada separada: o tracemalloc deixa cada requisição bem mais lenta
+    picos, retidos = [], []
+    tracemalloc.start()
+    for _ in range(alocacoes):
+        antes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        cliente.get(url, headers = headers)
+        atual, pico = tracemalloc.get_traced_memory()
+        picos.append(pico - antes)
+        retidos.append(atual - antes)
+    tracemalloc.stop()
+
+    return {
+        'status': resposta.status_code,
+        'bytes': len(resposta.data),
+        'requisicoes': requisicoes,
+        'req_s': round(requisicoes / total, 1),
+        **percentis(tempos),
+        'alocacao_pico_kb': round(statistics.median(picos) / 1024, 1),
+        'alocacao_retida_kb': round(statistics.median(retidos) / 1024, 1)
+    }
+
+
+def cenario_cliente(args, sem_cache = False):
+    from app import create_app
+    from api.cache import response_cache
+    from api.reload import data_reloader
+    from cachelib import NullCache
+
+    app = create_app('development')
+    app.debug = False
+    data_reloader.token = TOKEN
+
+    if sem_cache:
+        # Cada requisição percorre o processor: sem respostas pré-computadas e sem backend
+        response_cache.clear()
+        response_cache.backend = NullCache()
+        response_cache.backend_type = 'NullCache'
+
+    cliente = app.test_client()
+
+    return {
+        nome: medir_cliente(cliente, caminho, params, headers, args.requisicoes, args.alocacoes)
+        for nome, caminho, params, headers in CASOS
+    }
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _aguardar(porta, processo, limite = 120):
+    fim = time.time() + limite
+    while time.time() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError(f"gunicorn terminou com código {processo.returncode}")
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout = 2)
+            conexao.request('GET', '/api/cache_stats', headers = {'Authorization': f'Bearer {TOKEN}'})
+            if conexao.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+
+    raise TimeoutError("gunicorn não respondeu a tempo")
+
+
+def carga(porta, caminho, params, headers, requisicoes, concorrencia):
+    # Gerador local: N threads, cada uma com sua conexão, dividindo o total de requisições
+    url = _url(caminho, params)
+    tempos, status = [], {}
+    restantes = [requisicoes]
+    lock = threading.Lock()
+
+    def trabalhador():
+        conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout = 30)
+        while True:
+            with lock:
+                if restantes[0] <= 0:
+                    break
+                restantes[0] -= 1
+
+            t = time.perf_counter()
+            conexao.request('GET', url, headers = headers)
+            resposta = conexao.getresponse()
+            resposta.read()
+            decorrido = time.perf_counter() - t
+
+            with lock:
+                tempos.append(decorrido)
+                status[resposta.status] = status.get(resposta.status, 0) + 1
+        conexao.close()
+
+    threads = [threading.Thread(target = trabalhador) for _ in range(concorrencia)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - inicio
+
+    return {
+        'status': {str(codigo): quantidade for codigo, quantidade in sorted(status.items())},
+        'requisicoes': requisicoes,
+        'concorrencia': concorrencia,
+        'req_s': round(requisicoes / total, 1),
+        **percentis(tempos)
+    }
+
+
+def cenario_gunicorn(args):
+    porta = _porta_livre()
+    env = {
+        **os.environ,
+        'PYTHONPATH': str(RAIZ),
+        'FLASK_ENV': 'production',
+        'DATA_RELOAD_INTERVAL': '0',
+        'DATA_RELOAD_TOKEN': TOKEN,
+        'REDIS_URL': os.environ.get('REDIS_URL', 'redis://127.0.0.1:1/0')
+    }
+
+    processo = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn',
+            '-c', str(RAIZ / 'gunicorn.conf.py'),
+            '--bind', f'127.0.0.1:{porta}',
+            '--workers', str(args.workers),
+            '--log-level', 'warning',
+            'wsgi:app'
+        ],
+        cwd = RAIZ,
+        env = env,
+        stdout = subprocess.DEVNULL,
+        stderr = subprocess.DEVNULL
+    )
+
+    try:
+        _aguardar(porta, processo)
+        return {
+            nome: carga(porta, caminho, params, headers, args.requisicoes, args.concorrencia)
+            for nome, caminho, params, headers in CASOS
+        }
+    finally:
+        processo.terminate()
+        processo.wait(timeout = 30)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Vazão, latência e alocações de cada rota da API')
+    parser.add_argument('--modo', choices = ['cliente', 'gunicorn', 'todos'], default = 'todos')
+    parser.add_argument('--requisicoes', type = int, default = 200, help = 'requisições por caso')
+    parser.add_argument('--alocacoes', type = int, default = 20, help = 'requisições medidas com tracemalloc')
+    parser.add_argument('--concorrencia', type = int, default = 8, help = 'conexões simultâneas contra o gunicorn')
+    parser.add_argument('--workers', type = int, default = 2)
+    parser.add_argument('--saida', default = str(RAIZ / 'benchmarks' / 'endpoints.json'))
+    parser.add_argument('--base', help = 'resultado anterior para comparar (p95)')
+    parser.add_argument('--tolerancia', type = float, default = 0.2)
+    args = parser.parse_args()
+
+    os.chdir(RAIZ)
+
+    cenarios = {}
+    if args.modo in ('cliente', 'todos'):
+        cenarios['cliente'] = cenario_cliente(args)
+        cenarios['cliente_sem_cache'] = cenario_cliente(args, sem_cache = True)
+    if args.modo in ('gunicorn', 'todos'):
+        cenarios['gunicorn'] = cenario_gunicorn(args)
+
+    resultados = {
+        **cabecalho(
+            requisicoes = args.requisicoes,
+            alocacoes = args.alocacoes,
+            concorrencia = args.concorrencia,
+            workers = args.workers
+        ),
+        'cenarios': cenarios
+    }
+    salvar(resultados, args.saida)
+
+    for cenario, casos in cenarios.items():
+        print(f"\n{cenario}")
+        for nome, medidas in casos.items():
+            print(f"  {nome:<36} {medidas['req_s']:>9} req/s  p50 {medidas['p50']:>8} ms  p95 {medidas['p95']:>8} ms  p99 {medidas['p99']:>8} ms")
+
+    if args.base:
+        with open(args.base, encoding = 'utf-8') as f:
+            sys.exit(relatar_regressoes(comparar(resultados, json.load(f), 'p95', args.tolerancia)))
@@ -0,0 +1,94 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+
+def payloads(app):
+    # O mesmo conteúdo que cada rota entrega ao jsonify, com arrays numpy onde o processor os usa
+    from api.data_loader import data_loader
+    from api.processors import DataProcessor
+    from api import geometry
+    from config import Config
+
+    with open(Config.GEOJSON_DIR / 'BrazilGeoJSON.geojson', encoding = 'utf-8') as f:
+        topologia = geometry.build_topology(json.load(f))
+
+    with app.app_context():
+        data_loader.pin()
+        dados = {
+            'comparacao_nacional': DataProcessor.preparar_dados_barplot(),
+            'comparacao_estadual': DataProcessor.preparar_dados_stackedbars(),
+            'waterfall': DataProcessor.preparar_dados_waterfall('CONAB', '2019-2022'),
+            'kpis': DataProcessor.preparar_dados_kpis(2021, 'todas'),
+            'mapa_estados': DataProcessor.preparar_dados_mapa_estados(2021, 'todas'),
+            'evolucao_temporal': DataProcessor.preparar_dados_evolucao_temporal('5100201'),
+            'municipio_destaque': DataProcessor.preparar_dados_municipio_destaque('5100201', 2021),
+            'municipios_por_estado': DataProcessor.buscar_municipios_por_estado('MT', 2021),
+            'geojson_brasil': geometry.to_geojson(topologia, geometry.RESOLUCOES['alta']['tolerancia'])
+        }
+        data_loader.unpin()
+
+    return {nome: {'success': True, 'data': conteudo} for nome, conteudo in dados.items()}
+
+
+def medir(app, provider, payload, repeticoes):
+    with app.app_context():
+        corpo = provider.response(payload).get_data()
+
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            provider.response(payload).get_data()
+            tempos.append(time.perf_counter() - inicio)
+
+    return {'ms': round(statistics.median(tempos) * 1000, 3), 'bytes': len(corpo)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Compara tempo e tamanho da serialização JSON de cada endpoint')
+    parser.add_argument('--repeticoes', type = int, default = 50)
+    parser.add_argument('--saida', default = str(RAIZ / 'benchmarks' / 'json_encode.json'))
+    args = parser.parse_args()
+
+    from app import create_app
+    from api.json_provider import NumpyJSONProvider, OrjsonProvider, orjson
+
+    app = create_app('development')
+
+    # Respostas compactas, como em produção
+    app.debug = False
+
+    providers = {'json': NumpyJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+
+    endpoints = {}
+    for nome, payload in payloads(app).items():
+        endpoints[nome] = {
+            provider: medir(app, instancia, payload, args.repeticoes)
+            for provider, instancia in providers.items()
+        }
+
+        if 'orjson' in endpoints[nome]:
+            endpoints[nome]['aceleracao'] = round(endpoints[nome]['json']['ms'] / endpoints[nome]['orjson']['ms'], 1)
+
+    resultados = {
+        'gerado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'orjson': getattr(orjson, '__version__', None),
+        'repeticoes': args.repeticoes,
+        'endpoints': endpoints
+    }
+
+    with open(args.saida, 'w', encoding = 'utf-8') as f:
+        json.dump(resultados, f, indent = 2, ensure_ascii = False)
+        f.write('\n')
+
+    print(json.dumps(resultados['endpoints'], indent = 2))
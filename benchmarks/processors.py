@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import numpy as np
+import pandas as pd
+from comum import cabecalho, comparar, percentis, relatar_regressoes, salvar
+
+# Datasets lidos pelo DataProcessor; os demais são copiados sem alteração
+ESCALAVEIS = ['area_nacional', 'area_estadual', 'base_municipios']
+COLUNAS_AREA = ['area_plantada', 'area_plantada_ibge', 'area_plantada_conab', 'area_plantada_estado', 'area_plantada_estado_dif']
+ULTIMO_ANO = 2022
+
+
+def _safra(anos):
+    return ((anos - 1) % 100).map('{:02d}'.format) + "/" + (anos % 100).map('{:02d}'.format)
+
+
+def escalar(df, fator):
+    # A base real fica como está e cada cópia recua 4 anos, com áreas um pouco diferentes:
+    # séries fator vezes mais longas, no mesmo formato que os processors leem
+    copias = []
+    for i in range(fator):
+        copia = df.copy()
+        if i > 0:
+            copia['ano'] = copia['ano'] - 4 * i
+            copia['ano_safra'] = _safra(copia['ano'])
+            for coluna in COLUNAS_AREA:
+                if coluna in copia.columns:
+                    copia[coluna] = copia[coluna] * (1 - i / (2 * fator))
+        copias.append(copia)
+
+    return pd.concat(copias, ignore_index = True).sort_values('ano', kind = 'stable').reset_index(drop = True)
+
+
+def gerar_base(destino, fator):
+    from config import Config
+
+    for arquivo in Config.DATA_DIR.glob('*.feather'):
+        if arquivo.stem in ESCALAVEIS and fator > 1:
+            escalar(pd.read_feather(arquivo), fator).to_feather(destino / arquivo.name)
+        else:
+            shutil.copy(arquivo, destino / arquivo.name)
+
+
+def area_estadual_sintetica(ufs, anos, culturas, semente = 0):
+    # UFs x anos x culturas no formato de area_estadual: cada cultura soma uma linha por UF e ano,
+    # como as demais culturas de grãos da série da CONAB
+    rng = np.random.default_rng(semente)
+    grade = pd.MultiIndex.from_product(
+        [ufs, range(ULTIMO_ANO - anos + 1, ULTIMO_ANO + 1), range(culturas)],
+        names = ['uf', 'ano', 'cultura']
+    ).to_frame(index = False)
+
+    ibge = rng.uniform(1, 5000, len(grade)).round(1)
+    conab = (ibge * rng.uniform(0.9, 1.1, len(grade))).round(1)
+
+    grade['area_plantada_ibge'] = ibge
+    grade['variacao_ibge'] = rng.uniform(-20, 20, len(grade))
+    grade['area_plantada_conab'] = conab
+    grade['variacao_conab'] = rng.uniform(-20, 20, len(grade))
+    grade['ano_safra'] = _safra(grade['ano'])
+    grade['gap_ibge_conab'] = (ibge - conab) / conab * 100
+
+    return grade
+
+
+def gerar_base_sintetica(destino, anos, culturas):
+    from config import Config
+
+    gerar_base(destino, 1)
+    ufs = sorted(pd.read_feather(Config.DATA_DIR / 'area_estadual.feather')['uf'].unique())
+    area_estadual_sintetica(ufs, anos, culturas).to_feather(destino / 'area_estadual.feather')
+
+
+def casos_sinteticos():
+    from api.processors import DataProcessor as P
+
+    return [
+        ('preparar_dados_stackedbars', lambda: P.preparar_dados_stackedbars(), None),
+        ('preparar_dados_mapa_estados', lambda: P.preparar_dados_mapa_estados(2021, 'todas'), None)
+    ]
+
+
+def casos(ano_inicial):
+    from api.data_loader import data_loader
+    from api.processors import DataProcessor as P
+
+    def sem_memo():
+        # Resultados derivados são memorizados por versão; aqui cada chamada recalcula
+        data_loader.state().derivados.clear()
+
+    def mascara(uf, ano):
+        # Varredura que get_by_index substitui, para comparar nas UFs com mais municípios
+        df = data_loader.get('base_municipios')
+        return df[(df['uf'] == uf) & (df['ano'] == ano)]
+
+    return [
+        ('preparar_dados_barplot', lambda: P.preparar_dados_barplot(), None),
+        ('preparar_dados_stackedbars', lambda: P.preparar_dados_stackedbars(), None),
+        ('preparar_dados_waterfall[serie completa]', lambda: P.preparar_dados_waterfall('CONAB', f'{ano_inicial}-{ULTIMO_ANO}'), sem_memo),
+        ('preparar_dados_waterfall[memorizado]', lambda: P.preparar_dados_waterfall('CONAB', f'{ano_inicial}-{ULTIMO_ANO}'), None),
+        ('preparar_dados_kpis', lambda: P.preparar_dados_kpis(2021, 'todas'), None),
+        ('preparar_dados_evolucao_temporal', lambda: P.preparar_dados_evolucao_temporal('5100201'), None),
+        ('preparar_dados_municipio_destaque', lambda: P.preparar_dados_municipio_destaque('5100201', 2021), None),
+        ('preparar_dados_mapa_estados', lambda: P.preparar_dados_mapa_estados(2021, 'todas'), None),
+        ('preparar_geojson_brasil', lambda: P.preparar_geojson_brasil('media', 'topojson'), None),
+        ('buscar_info_municipio', lambda: P.buscar_info_municipio('5100201'), None),
+        ('buscar_municipios_por_estado', lambda: P.buscar_municipios_por_estado('MT', 2021), None),
+        # UFs com mais municípios produtores, onde o iterrows anterior pesava mais
+        *[
+            (f'buscar_municipios_por_estado[{uf}]', lambda uf = uf: P.buscar_municipios_por_estado(uf, 2021), None)
+            for uf in ('RS', 'PR', 'MG', 'SP')
+        ],
+        ('preparar_dados_mapa_estados[2019 ibge]', lambda: P.preparar_dados_mapa_estados(2019, 'ibge'), None),
+        ('buscar_municipios', lambda: P.buscar_municipios('sao', 10, None, 2021), None),
+        ('buscar_municipios[aproximado]', lambda: P.buscar_municipios('sorrizo', 10, None, 2021), None),
+        ('agregar[uf x ano]', lambda: P.agregar('uf', 'variacao'), None),
+        ('agregar[celula]', lambda: P.agregar('nacional', 'gap', [2021]), None),
+        # Visão somente leitura de get() contra a cópia completa: a alocação não deve crescer com a base
+        ('data_loader.get[base_municipios]', lambda: data_loader.get('base_municipios'), None),
+        ('data_loader.get[base_municipios, copy]', lambda: data_loader.get('base_municipios', copy = True), None),
+        ('get_by_index[MG 2021]', lambda: data_loader.get_by_index('base_municipios', uf = 'MG', ano = 2021), None),
+        ('mascara[MG 2021]', lambda: mascara('MG', 2021), None),
+        ('get_by_index[SP 2021]', lambda: data_loader.get_by_index('base_municipios', uf = 'SP', ano = 2021), None),
+        ('mascara[SP 2021]', lambda: mascara('SP', 2021), None)
+    ]
+
+
+def medir(funcao, preparar, repeticoes, alocacoes):
+    if preparar:
+        preparar()
+    inicio = time.perf_counter()
+    funcao()
+    primeira = time.perf_counter() - inicio
+
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    picos = []
+    tracemalloc.start()
+    for _ in range(alocacoes):
+        if preparar:
+            preparar()
+        antes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        funcao()
+        picos.append(tracemalloc.get_traced_memory()[1] - antes)
+    tracemalloc.stop()
+
+    return {
+        'primeira_ms': round(primeira * 1000, 3),
+        'mediana_ms': round(statistics.median(tempos) * 1000, 3),
+        **percentis(tempos),
+        'alocacao_pico_kb': round(statistics.median(picos) / 1024, 1)
+    }
+
+
+def executar(gerar, montar_casos, args):
+    from config import Config
+    from api.data_loader import data_loader
+
+    original = Config.DATA_DIR
+
+    with tempfile.TemporaryDirectory() as temporario:
+        gerar(Path(temporario))
+
+        Config.DATA_DIR = Path(temporario)
+        Config.SHARED_DATA = False
+        data_loader.load_all_data()
+        data_loader.pin()
+
+        try:
+            linhas = {nome: len(data_loader.get(nome)) for nome in ESCALAVEIS}
+
+            resultados = {
+                nome: medir(funcao, preparar, args.repeticoes, args.alocacoes)
+                for nome, funcao, preparar in montar_casos()
+            }
+        finally:
+            data_loader.unpin()
+            Config.DATA_DIR = original
+
+    return linhas, resultados
+
+
+def cenario(fator, args):
+    from api.data_loader import data_loader
+
+    return executar(
+        lambda destino: gerar_base(destino, fator),
+        lambda: casos(int(data_loader.get('area_estadual')['ano'].min())),
+        args
+    )
+
+
+def cenario_sintetico(culturas, args):
+    return executar(lambda destino: gerar_base_sintetica(destino, args.anos, culturas), casos_sinteticos, args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Micro-benchmark dos métodos do DataProcessor em bases sintéticas ampliadas')
+    parser.add_argument('--fatores', type = int, nargs = '+', default = [1, 10, 100])
+    parser.add_argument('--anos', type = int, default = 20, help = 'anos da area_estadual sintética (27 UFs)')
+    parser.add_argument('--culturas', type = int, nargs = '*', default = [1, 5, 20], help = 'culturas por UF e ano; vazio desliga')
+    parser.add_argument('--repeticoes', type = int, default = 30)
+    parser.add_argument('--alocacoes', type = int, default = 5)
+    parser.add_argument('--saida', default = str(RAIZ / 'benchmarks' / 'processors.json'))
+    parser.add_argument('--base', help = 'resultado anterior para comparar (mediana)')
+    parser.add_argument('--tolerancia', type = float, default = 0.2)
+    args = parser.parse_args()
+
+    os.chdir(RAIZ)
+
+    cenarios, linhas = {}, {}
+    for fator in args.fatores:
+        linhas[f'{fator}x'], cenarios[f'{fator}x'] = cenario(fator, args)
+
+    for culturas in args.culturas:
+        nome = f'sintetico {args.anos} anos x 27 UFs x {culturas} culturas'
+        linhas[nome], cenarios[nome] = cenario_sintetico(culturas, args)
+
+    resultados = {
+        **cabecalho(
+            fatores = args.fatores,
+            anos_sinteticos = args.anos,
+            culturas = args.culturas,
+            repeticoes = args.repeticoes,
+            alocacoes = args.alocacoes
+        ),
+        'linhas': linhas,
+        'cenarios': cenarios
+    }
+    salvar(resultados, args.saida)
+
+    for nome_cenario, medidas_cenario in cenarios.items():
+        print(f"\n{nome_cenario}  {linhas[nome_cenario]}")
+        for nome, medidas in medidas_cenario.items():
+            print(f"  {nome:<44} primeira {medidas['primeira_ms']:>9} ms  mediana {medidas['mediana_ms']:>9} ms  p95 {medidas['p95']:>9} ms")
+
+    if args.base:
+        with open(args.base, encoding = 'utf-8') as f:
+            sys.exit(relatar_regressoes(comparar(resultados, json.load(f), 'mediana_ms', args.tolerancia)))
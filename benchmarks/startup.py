@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Executado num processo novo a cada medição: do import do app até o primeiro 200 em /api/kpis
+MEDICAO = """
+import json, sys, time
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+app = create_app('development')
+criado = time.perf_counter()
+resposta = app.test_client().get('/api/kpis')
+respondido = time.perf_counter()
+print(json.dumps({
+    'status': resposta.status_code,
+    'importacao': importado - inicio,
+    'create_app': criado - importado,
+    'primeira_resposta': respondido - criado,
+    'total': respondido - inicio,
+    'pandas_carregado': 'pandas' in sys.modules
+}))
+"""
+
+
+def medir(env):
+    processo = subprocess.run(
+        [sys.executable, '-c', MEDICAO],
+        cwd = RAIZ,
+        env = {**os.environ, 'PYTHONPATH': str(RAIZ), **env},
+        capture_output = True,
+        text = True,
+        check = True
+    )
+    resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+
+    if resultado['status'] != 200:
+        raise RuntimeError(f"/api/kpis respondeu {resultado['status']}")
+
+    return resultado
+
+
+def cenario(repeticoes, env):
+    medicoes = [medir(env()) for _ in range(repeticoes)]
+
+    resultado = {
+        etapa: round(statistics.median(m[etapa] for m in medicoes), 4)
+        for etapa in ('importacao', 'create_app', 'primeira_resposta', 'total')
+    }
+
+    # Com snapshot a primeira resposta sai sem importar pandas/numpy/pyarrow (api/lazy.py)
+    resultado['pandas_carregado'] = any(m['pandas_carregado'] for m in medicoes)
+    return resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Mede o tempo de inicialização do app até o primeiro 200 em /api/kpis')
+    parser.add_argument('--repeticoes', type = int, default = 5)
+    parser.add_argument('--saida', default = str(RAIZ / 'benchmarks' / 'startup.json'))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporario:
+        # Sem snapshot e sem arquivos Arrow prontos: o caminho de um deploy novo
+        frio = cenario(args.repeticoes, lambda: {
+            'STARTUP_SNAPSHOT': 'False',
+            'SHARED_DATA_DIR': tempfile.mkdtemp(dir = temporario)
+        })
+
+        # Primeira execução gera o snapshot e os arquivos Arrow; as medidas usam os dois
+        compartilhado = str(Path(temporario) / 'compartilhado')
+        medir({'SHARED_DATA_DIR': compartilhado})
+        com_snapshot = cenario(args.repeticoes, lambda: {'SHARED_DATA_DIR': compartilhado})
+
+    resultados = {
+        'gerado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'repeticoes': args.repeticoes,
+        'cenarios': {
+            'sem_snapshot': frio,
+            'com_snapshot': com_snapshot
+        }
+    }
+
+    with open(args.saida, 'w', encoding = 'utf-8') as f:
+        json.dump(resultados, f, indent = 2, ensure_ascii = False)
+        f.write('\n')
+
+    print(json.dumps(resultados['cenarios'], indent = 2))
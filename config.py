@@ -10,21 +10,63 @@ class Config:
     DEBUG = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
 
     DATA_DIR = BASE_DIR / 'dados' / 'processados'
+    RAW_CACHE_DIR = BASE_DIR / 'dados' / 'brutos'
     GEOJSON_DIR = BASE_DIR / 'dados' / 'geojson'
     CACHE_DIR = BASE_DIR / 'dados' / 'cache'
+    TILES_PATH = BASE_DIR / 'dados' / 'tiles' / 'municipios.mbtiles'
+    MUNICIPIOS_GEOJSON = GEOJSON_DIR / 'BR_Municipios.geojson'
+
+    # Datasets gravados uma vez como Arrow IPC e mapeados em memória por todos os workers
+    SHARED_DATA = os.environ.get('SHARED_DATA', 'True').lower() == 'true'
+    SHARED_DATA_DIR = Path(os.environ.get(
+        'SHARED_DATA_DIR',
+        '/dev/shm/kynetec' if Path('/dev/shm').is_dir() else BASE_DIR / 'dados' / 'compartilhado'
+    ))
+    # Versões antigas só são apagadas depois de tantos segundos sem uso (workers ainda podem mapeá-las)
+    SHARED_DATA_RETENTION = int(os.environ.get('SHARED_DATA_RETENTION', 3600))
+
+    # Respostas e geometrias prontas da última versão carregada, lidas na inicialização seguinte
+    STARTUP_SNAPSHOT = os.environ.get('STARTUP_SNAPSHOT', 'True').lower() == 'true'
+    SNAPSHOT_PATH = BASE_DIR / 'dados' / 'snapshot' / 'startup.bin'
+
+    # Recarga dos dados sem reiniciar: intervalo de verificação dos arquivos (0 desliga) e token do endpoint,
+    # exigido também por /api/cache_stats e /api/memoria
+    DATA_RELOAD_INTERVAL = int(os.environ.get('DATA_RELOAD_INTERVAL', 0))
+    DATA_RELOAD_TOKEN = os.environ.get('DATA_RELOAD_TOKEN')
+    # Arquivo tocado por POST /api/admin/reload; o observador de cada worker recarrega quando ele muda
+    DATA_RELOAD_MARKER = BASE_DIR / 'dados' / 'recarga'
+
+    # Threads por worker para montar os painéis de /api/painel em paralelo
+    PAINEL_WORKERS = int(os.environ.get('PAINEL_WORKERS', 4))
+
+    # ?_profile=1 (cProfile) ou ?_profile=folded (pilhas amostradas) devolvem o perfil da requisição
+    PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'False').lower() == 'true'
+
+    # /api/consulta: SQL somente leitura sobre os arquivos de DATA_DIR; segundos por consulta, linhas padrão
+    # e máximas por resposta, threads do DuckDB (0 = todos os núcleos) e memória máxima do banco
+    SQL_TIMEOUT = float(os.environ.get('SQL_TIMEOUT', 5))
+    SQL_ROW_LIMIT = int(os.environ.get('SQL_ROW_LIMIT', 1000))
+    SQL_MAX_ROWS = int(os.environ.get('SQL_MAX_ROWS', 10000))
+    SQL_THREADS = int(os.environ.get('SQL_THREADS', 0))
+    SQL_MEMORY_LIMIT = os.environ.get('SQL_MEMORY_LIMIT', '1GB')
     
     CACHE_TYPE = 'FileSystemCache'
     CACHE_DIR = str(CACHE_DIR)
     CACHE_DEFAULT_TIMEOUT = 3600
+    CACHE_REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_KEY_PREFIX = 'kynetec:'
+    RESPONSE_CACHE_MAX_ITEMS = 1024
     
     SEND_FILE_MAX_AGE_DEFAULT = 0
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    PROFILE_REQUESTS = True
     
 class ProductionConfig(Config):
     DEBUG = False
     CACHE_TYPE = 'RedisCache'
+    DATA_RELOAD_INTERVAL = int(os.environ.get('DATA_RELOAD_INTERVAL', 30))
     
 
 config = {
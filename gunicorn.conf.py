@@ -0,0 +1,21 @@
+import gc
+
+# O app (e os datasets) é carregado uma vez no master e herdado pelos workers via fork
+preload_app = True
+
+
+def when_ready(server):
+    # Bibliotecas e estruturas adiadas pelo snapshot são carregadas aqui, uma vez, e herdadas pelos
+    # workers; numa thread do master elas poderiam estar no meio de um import durante o fork
+    from app import warm_up
+    warm_up()
+
+    # Objetos já carregados saem do alcance do coletor: sem isso cada coleta
+    # nos workers escreve nos cabeçalhos e duplica as páginas herdadas
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # O observador de arquivos roda numa thread por worker; o master (create_app no preload) não inicia nenhuma
+    from api.reload import data_reloader
+    data_reloader.start()
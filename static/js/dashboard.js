@@ -5,9 +5,104 @@ let modoComparacao = 'nacional';
 let dadosMapaAtuais = null;
 
 
+let painelPrecarregado = null;
+
+// Painéis cujas séries numéricas chegam como buffers binários (bdata) em vez de listas JSON
+const PAINEIS_BINARIOS = ['comparacao_nacional', 'comparacao_estadual', 'evolucao_temporal'];
+
+const TIPOS_BDATA = {
+    f8: Float64Array, f4: Float32Array,
+    i4: Int32Array, u4: Uint32Array,
+    i2: Int16Array, u2: Uint16Array,
+    i1: Int8Array, u1: Uint8Array
+};
+
+
+function decodificarBdata(valor) {
+    // {dtype, bdata} -> typed array sobre os bytes little-endian, sem converter número a número
+    if (Array.isArray(valor)) {
+        return valor.map(decodificarBdata);
+    }
+
+    if (valor && typeof valor === 'object' && !ArrayBuffer.isView(valor)) {
+        if (typeof valor.bdata === 'string' && TIPOS_BDATA[valor.dtype]) {
+            const binario = atob(valor.bdata);
+            const bytes = new Uint8Array(binario.length);
+            for (let i = 0; i < binario.length; i++) {
+                bytes[i] = binario.charCodeAt(i);
+            }
+            return new TIPOS_BDATA[valor.dtype](bytes.buffer);
+        }
+
+        for (const chave of Object.keys(valor)) {
+            valor[chave] = decodificarBdata(valor[chave]);
+        }
+    }
+
+    return valor;
+}
+
+
+function chavePainel(painel, params = {}) {
+    const pares = Object.keys(params).sort().map(nome => `${nome}=${params[nome]}`);
+    return `${painel}?${pares.join('&')}`;
+}
+
+function precarregarPainel(filtros, paineis = null) {
+    // Uma única requisição a /api/painel traz todos os painéis do estado atual dos filtros
+    const params = new URLSearchParams({...filtros, formato: 'bdata'});
+    if (paineis) {
+        params.set('paineis', paineis.join(','));
+    }
+
+    painelPrecarregado = fetch(`/api/painel?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            const respostas = {};
+            for (const [painel, conteudo] of Object.entries(data.paineis || {})) {
+                respostas[chavePainel(painel, conteudo.parametros)] = conteudo.resposta;
+            }
+            return respostas;
+        })
+        .catch(error => {
+            console.error('Erro ao carregar painéis:', error);
+            return {};
+        });
+}
+
+function obterDados(painel, params = {}) {
+    // Usa a resposta de /api/painel quando ela cobre o painel com os mesmos parâmetros
+    params = Object.fromEntries(new URLSearchParams(params));
+    if (PAINEIS_BINARIOS.includes(painel)) {
+        params.formato = 'bdata';
+    }
+
+    const buscarIndividual = () => {
+        const query = new URLSearchParams(params).toString();
+        return fetch(`/api/${painel}${query ? '?' + query : ''}`).then(response => response.json());
+    };
+
+    const resposta = painelPrecarregado
+        ? painelPrecarregado.then(respostas => respostas[chavePainel(painel, params)] || buscarIndividual())
+        : buscarIndividual();
+
+    return resposta.then(decodificarBdata);
+}
+
+
 function inicializarDashboard() {
     console.log('Dashboard iniciando...');
 
+    const municipioPadrao = '5100201';
+    const anoPadrao = 2021;
+
+    precarregarPainel({
+        ano: document.getElementById('filtro-ano')?.value || anoPadrao,
+        fonte: (document.getElementById('filtro-fonte')?.value || 'todas').toLowerCase(),
+        cod_municipio: municipioPadrao,
+        periodo: document.getElementById('filtro-periodo-waterfall')?.value || '2020-2021'
+    });
+
     configurarFiltrosKPIs();
     
     carregarGraficoComparacao();
@@ -15,9 +110,8 @@ function inicializarDashboard() {
 
     configurarFiltrosWaterfall();
 
+    configurarBuscaMunicipios();
 
-    const municipioPadrao = '5100201';
-    const anoPadrao = 2021;
 
     buscarEstadoDoMunicipio(municipioPadrao).then(uf => {
         if (uf) {
@@ -41,11 +135,7 @@ function inicializarDashboard() {
 function carregarGraficoComparacao() {
     console.log('Buscando dados da API - IBGE x CONAB por Ano...');
 
-    fetch('/api/comparacao_nacional')
-        .then(response => {
-            console.log('Resposta recebida:', response);
-            return response.json();
-        })
+    obterDados('comparacao_nacional')
         .then(data => {
             console.log('Dados convertidos!');
 
@@ -75,7 +165,7 @@ function criarGraficoComDadosAPI(dados) {
                         'Área: %{y:.1f} mil ha<br>' +
                         'Gap: %{customdata}<br>' +
                         '<extra></extra>',
-        text: serie.data.y.map(val => val === 0 ? '' : val.toFixed(1)),
+        text: Array.from(serie.data.y, val => val === 0 ? '' : val.toFixed(1)),
         textposition: 'outside',
         textfont: {
             size: 11,
@@ -156,8 +246,7 @@ function criarGraficoComDadosAPI(dados) {
 function carregarGraficoComparacaoEstadual() {
     console.log('Carregando visualização estadual do gráfico de comparação...');
 
-    fetch('/api/comparacao_estadual')
-        .then(response => response.json())
+    obterDados('comparacao_estadual')
         .then(data => {
             if (data.success) {
                 renderizarGraficoComparacaoEstadual(data.data);
@@ -382,11 +471,13 @@ function carregarWaterfall(fonte = 'CONAB', periodo = '2019-2020') {
         periodo: periodo
     });
 
-    fetch(`/api/waterfall?${params}`)
-        .then(response => response.json())
+    obterDados('waterfall', params)
         .then(data => {
             if (data.success) {
                 criarGraficoWaterfall(data.data);
+            } else if (data.anos_disponiveis) {
+                console.log(`Dados não disponíveis para ${fonte} no período ${periodo}`);
+                mostrarMensagemWaterfall(fonte, periodo);
             } else {
                 console.error('Erro ao carregar waterfall:', data.error);
                 mostrarErroWaterfall(data.error);
@@ -574,11 +665,6 @@ function configurarFiltrosWaterfall() {
         return;
     }
 
-    const dadosDisponiveis = {
-        'IBGE': ['2019-2020', '2020-2021'],
-        'CONAB': ['2019-2020', '2020-2021', '2021-2022']
-    };
-
     function atualizarWaterfall() {
         const fonteGlobalSelecionada = filtroFonteGlobal.value.toLowerCase();
         const periodoSelecionado = filtroPeriodoLocal.value;
@@ -595,9 +681,6 @@ function configurarFiltrosWaterfall() {
 
         console.log(`Atualizando waterfall...`);
 
-        const periodosDisponiveis = dadosDisponiveis[fonteParaWaterfall];
-        const temDados = periodosDisponiveis && periodosDisponiveis.includes(periodoSelecionado);
-        
         const sub_waterfall = document.getElementById('subtitulo_waterfall');
         if (sub_waterfall){
             let esquerda_per = periodoSelecionado.split("-")[0];
@@ -618,12 +701,6 @@ function configurarFiltrosWaterfall() {
         const tit_waterfall = document.getElementById('titulo_waterfall');
         tit_waterfall.textContent = `Variação por Estado ${fonteParaWaterfall}`;
         
-        if (!temDados) {
-            console.log(`Dados não disponíveis para ${fonteParaWaterfall} no período ${periodoSelecionado}`);
-            mostrarMensagemWaterfall(fonteParaWaterfall, periodoSelecionado);
-            return;
-        }
-        
         carregarWaterfall(fonteParaWaterfall, periodoSelecionado);
     }
 
@@ -733,8 +810,7 @@ function carregarKPIs(ano = 2021, fonte = 'todas') {
         fonte: fonte
     });
 
-    fetch(`/api/kpis?${params}`)
-        .then(response => response.json())
+    obterDados('kpis', params)
         .then(data => {
             if (data.success) {
                 renderizarKPIs(data.data);
@@ -839,10 +915,28 @@ function configurarFiltrosKPIs() {
         return;
     }
 
+    function precarregarFiltros() {
+        // Painéis que dependem dos filtros globais chegam juntos; cada listener abaixo lê a sua parte
+        const filtroPeriodo = document.getElementById('filtro-periodo-waterfall');
+        const fonteSelecionada = filtroFonte.value.toLowerCase();
+        const paineis = ['kpis', 'waterfall', 'municipio_destaque'];
+
+        if (!(fonteSelecionada === 'ibge' && parseInt(filtroAno.value) === 2022)) {
+            paineis.push('mapa_estados');
+        }
+
+        precarregarPainel({
+            ano: filtroAno.value,
+            fonte: fonteSelecionada,
+            cod_municipio: Munic.value || Munic.textContent.trim(),
+            periodo: filtroPeriodo ? filtroPeriodo.value : '2020-2021'
+        }, paineis);
+    }
+
     function atualizarKPIs() {
         const anoSelecionado = parseInt(filtroAno.value);
         const fonteSelecionada = filtroFonte.value.toLowerCase();
-        const municSelecionado = Munic.value;
+        const municSelecionado = Munic.value || Munic.textContent.trim();
 
         console.log(`Filtros mudaram! Recarregando KPIs...`);
 
@@ -885,6 +979,8 @@ function configurarFiltrosKPIs() {
         }
     }
 
+    filtroAno.addEventListener('change', precarregarFiltros);
+    filtroFonte.addEventListener('change', precarregarFiltros);
     filtroAno.addEventListener('change', atualizarKPIs);
     filtroFonte.addEventListener('change', atualizarKPIs);
     
@@ -900,8 +996,7 @@ function carregarEvolucaoTemporal(cod_municipio = '5100201') {
         cod_municipio: cod_municipio
     });
 
-    fetch(`/api/evolucao_temporal?${params}`)
-        .then(response => response.json())
+    obterDados('evolucao_temporal', params)
         .then(data => {
             if (data.success) {
                 criarGraficoEvolucaoTemporal(data.data);
@@ -1062,8 +1157,7 @@ function carregarMunicipioDestaque(cod_municipio = '5100201', ano = 2021) {
         ano: ano
     });
 
-    fetch(`/api/municipio_destaque?${params}`)
-        .then(response => response.json())
+    obterDados('municipio_destaque', params)
         .then(data => {
             if (data.success) {
                 renderizarMunicipioDestaque(data.data);
@@ -1178,8 +1272,7 @@ function carregarMapaEstados(ano = 2021, fonte = 'todas') {
         fonte: fonte
     });
 
-    fetch(`/api/mapa_estados?${params}`)
-        .then(response => response.json())
+    obterDados('mapa_estados', params)
         .then(data => {
             if (data.success) {
                 if (mapaEstados === null) {
@@ -1219,9 +1312,11 @@ function criarMapaEstados(dados) {
         maxZoom: 19
     }).addTo(mapaEstados);
 
-    fetch('/api/geojson_brasil')
+    fetch(`/api/geojson_brasil?resolucao=media&formato=topojson&v=${GEOJSON_VERSAO}`)
         .then(response => response.json())
-        .then(geojsonData => {
+        .then(topologia => {
+            const geojsonData = topojson.feature(topologia, topologia.objects.estados);
+
             layerEstados = L.geoJSON(geojsonData, {
                 style: function(feature) {
                     const uf = feature.properties.sigla;
@@ -1438,6 +1533,71 @@ function popularDropdownMunicipios(municipios, uf) {
     }
 }
 
+function configurarBuscaMunicipios() {
+    const inputBusca = document.getElementById('busca-municipio');
+    const listaSugestoes = document.getElementById('sugestoes-municipio');
+
+    if (!inputBusca || !listaSugestoes) {
+        console.error('Elementos da busca de municípios não encontrados!');
+        return;
+    }
+
+    // Rótulo "Nome - UF" de cada sugestão -> município, para identificar a opção escolhida
+    let sugestoes = {};
+    let temporizador = null;
+
+    inputBusca.addEventListener('input', function() {
+        const escolhido = sugestoes[this.value];
+
+        if (escolhido) {
+            this.value = '';
+            listaSugestoes.innerHTML = '';
+            selecionarEstadoProgramaticamente(escolhido.uf, escolhido.codigo);
+            selecionarMunicipio(escolhido.codigo);
+            return;
+        }
+
+        clearTimeout(temporizador);
+        const consulta = this.value.trim();
+
+        if (consulta.length < 2) {
+            return;
+        }
+
+        temporizador = setTimeout(() => {
+            const params = new URLSearchParams({
+                q: consulta,
+                ano: document.getElementById('filtro-ano')?.value || '2021',
+                limite: 10
+            });
+
+            fetch(`/api/municipios/busca?${params}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        console.error('Erro na busca de municípios:', data.error);
+                        return;
+                    }
+
+                    sugestoes = {};
+                    listaSugestoes.innerHTML = '';
+
+                    data.data.municipios.forEach(municipio => {
+                        const rotulo = `${municipio.nome} - ${municipio.uf}`;
+                        sugestoes[rotulo] = municipio;
+
+                        const option = document.createElement('option');
+                        option.value = rotulo;
+                        listaSugestoes.appendChild(option);
+                    });
+                })
+                .catch(error => {
+                    console.error('Erro na requisição da busca de municípios:', error);
+                });
+        }, 150);
+    });
+}
+
 function selecionarMunicipio(codigoMunicipio) {
     console.log(`Município selecionado: ${codigoMunicipio}`);
 
@@ -1566,8 +1726,7 @@ function buscarEstadoDoMunicipio(codigoMunicipio) {
 
     const params = new URLSearchParams({ cod_municipio: codigoMunicipio });
 
-    return fetch(`/api/municipio_info?${params}`)
-        .then(response => response.json())
+    return obterDados('municipio_info', params)
         .then(data => {
             if (data.success) {
                 return data.data.uf;
@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from config import Config
+from api.data_loader import DataLoader
+
+
+@pytest.fixture(scope = 'module', params = ['privado', 'compartilhado'])
+def loader(request, tmp_path_factory):
+    # Os dois caminhos de carregamento: feather em memória privada e Arrow IPC mapeado (SHARED_DATA)
+    original = (Config.SHARED_DATA, Config.SHARED_DATA_DIR)
+    Config.SHARED_DATA = request.param == 'compartilhado'
+    Config.SHARED_DATA_DIR = tmp_path_factory.mktemp('compartilhado')
+
+    carregador = DataLoader()
+    carregador.load_all_data()
+    carregador.pin()
+
+    yield carregador
+
+    carregador.unpin()
+    Config.SHARED_DATA, Config.SHARED_DATA_DIR = original
+
+
+@pytest.fixture(scope = 'session')
+def app():
+    # App mínimo com o provider JSON do projeto, as rotas da API e o data_loader global (o que os processors
+    # leem) carregado; sem create_app, para não gravar cache nem snapshot em dados/
+    from flask import Flask
+    from api.data_loader import data_loader
+    from api.json_provider import json_provider
+    from api.routes import api_bp
+
+    original = Config.SHARED_DATA
+    Config.SHARED_DATA = False
+
+    aplicacao = Flask(__name__)
+    aplicacao.json = json_provider(aplicacao)
+    aplicacao.register_blueprint(api_bp)
+    data_loader.load_all_data()
+
+    with aplicacao.app_context():
+        data_loader.pin()
+        yield aplicacao
+        data_loader.unpin()
+
+    Config.SHARED_DATA = original
+
+
+@pytest.fixture
+def client(app):
+    from api.cache import response_cache
+
+    # Cada teste começa sem respostas guardadas
+    response_cache.clear()
+    return app.test_client()
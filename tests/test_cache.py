@@ -0,0 +1,155 @@
+import pytest
+from cachelib import BaseCache, FileSystemCache, NullCache, RedisCache
+from flask import Flask
+
+from api.cache import LRUCache, ResponseCache, response_cache
+from api.data_loader import data_loader
+from api.fingerprint import code_version
+
+
+class BackendQuebrado(BaseCache):
+    # Backend que falha em toda operação, como um Redis que caiu depois da inicialização
+
+    def get(self, key):
+        raise ConnectionError('backend fora do ar')
+
+    def set(self, key, value, timeout = None):
+        raise ConnectionError('backend fora do ar')
+
+    def clear(self):
+        raise ConnectionError('backend fora do ar')
+
+
+def _cache(**config):
+    # Sem pré-cálculo: só o backend escolhido pela configuração
+    aplicacao = Flask(__name__)
+    aplicacao.config.update(config)
+
+    cache = ResponseCache()
+    cache.init_app(aplicacao, {})
+    return cache
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+
+    servidor = fakeredis.FakeServer()
+    monkeypatch.setattr(redis, 'from_url', lambda url: fakeredis.FakeRedis(server = servidor))
+    return servidor
+
+
+@pytest.mark.parametrize('cache_type, backend_type, classe', [
+    ('NullCache', 'NullCache', NullCache),
+    ('SimpleCache', 'SimpleCache', LRUCache),
+    ('Desconhecido', 'SimpleCache', LRUCache)
+])
+def test_escolha_do_backend(cache_type, backend_type, classe):
+    cache = _cache(CACHE_TYPE = cache_type)
+
+    assert cache.backend_type == backend_type
+    assert type(cache.backend) is classe
+
+
+def test_backend_em_disco(tmp_path):
+    cache = _cache(CACHE_TYPE = 'FileSystemCache', CACHE_DIR = str(tmp_path), RESPONSE_CACHE_MAX_ITEMS = 10)
+
+    assert (cache.backend_type, type(cache.backend)) == ('FileSystemCache', FileSystemCache)
+    assert cache.backend._threshold == 10
+
+    cache.set('/api/kpis', {'ano': '2021'}, (b'{}', 200, 'application/json'))
+    assert cache.get('/api/kpis', {'ano': '2021'}) == (b'{}', 200, 'application/json')
+
+
+def test_backend_redis(app, fake_redis):
+    cache = _cache(CACHE_TYPE = 'RedisCache', CACHE_KEY_PREFIX = 'teste:')
+
+    assert (cache.backend_type, type(cache.backend)) == ('RedisCache', RedisCache)
+
+    resposta = (b'{"success":true}', 200, 'application/json')
+    cache.set('/api/kpis', {'ano': '2021'}, resposta)
+    assert cache.get('/api/kpis', {'ano': '2021'}) == resposta
+    assert cache.stats()['hits'] == 1
+
+
+def test_redis_fora_do_ar_na_inicializacao_usa_memoria(app, fake_redis):
+    fake_redis.connected = False
+    cache = _cache(CACHE_TYPE = 'RedisCache')
+
+    assert (cache.backend_type, type(cache.backend)) == ('SimpleCache', LRUCache)
+
+
+def test_redis_que_cai_depois_vira_miss(app, fake_redis):
+    cache = _cache(CACHE_TYPE = 'RedisCache')
+    cache.set('/api/kpis', {}, (b'{}', 200, 'application/json'))
+
+    fake_redis.connected = False
+
+    assert cache.get('/api/kpis', {}) is None
+    cache.set('/api/kpis', {}, (b'{}', 200, 'application/json'))
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['errors']) == (0, 1, 2)
+
+
+def test_erros_do_backend_contam_como_miss(app):
+    cache = ResponseCache()
+    cache.backend = BackendQuebrado()
+
+    assert cache.get('/api/kpis', {'ano': '2021'}) is None
+    cache.set('/api/kpis', {'ano': '2021'}, (b'{}', 200, 'application/json'))
+    cache.clear()
+
+    # Leitura e gravação contam como erro; a leitura também como miss
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['errors']) == (0, 1, 2)
+    assert stats['hit_rate'] == 0.0
+
+
+def test_formato_da_chave(app):
+    # Versão dos dados e do código, caminho e parâmetros em ordem: a mesma consulta sempre gera a mesma chave
+    chave = ResponseCache()._key('/api/kpis', {'fonte': 'ibge', 'ano': '2021'})
+
+    assert chave == f"{data_loader.version}:{code_version()}:/api/kpis?ano=2021&fonte=ibge"
+    assert chave == ResponseCache()._key('/api/kpis', {'ano': '2021', 'fonte': 'ibge'})
+
+
+def test_chave_muda_com_a_versao_dos_dados(app, monkeypatch):
+    cache = ResponseCache()
+    cache.set('/api/kpis', {'ano': '2021'}, (b'{}', 200, 'application/json'))
+
+    monkeypatch.setattr(type(data_loader), 'version', property(lambda self: 'outra-versao'))
+    assert cache.get('/api/kpis', {'ano': '2021'}) is None
+
+
+def test_cabecalho_x_cache(client):
+    primeira = client.get('/api/kpis?ano=2020&fonte=ibge')
+    segunda = client.get('/api/kpis?fonte=ibge&ano=2020')
+
+    assert (primeira.status_code, primeira.headers['X-Cache']) == (200, 'MISS')
+    assert (segunda.status_code, segunda.headers['X-Cache']) == (200, 'HIT')
+    assert segunda.get_data() == primeira.get_data()
+
+    # Parâmetros fora dos declarados pela rota não mudam a chave
+    assert client.get('/api/kpis?ano=2020&fonte=ibge&x=1').headers['X-Cache'] == 'HIT'
+
+    # Erros de validação não são guardados
+    for _ in range(2):
+        invalida = client.get('/api/kpis?ano=1900')
+        assert invalida.status_code == 400
+        assert 'X-Cache' not in invalida.headers
+
+
+def test_backend_quebrado_nao_derruba_a_requisicao(client, monkeypatch):
+    monkeypatch.setattr(response_cache, 'backend', BackendQuebrado())
+    antes = response_cache.stats()['errors']
+
+    for _ in range(2):
+        resposta = client.get('/api/kpis?ano=2019&fonte=conab')
+        assert resposta.status_code == 200
+        assert resposta.get_json()['success'] is True
+        assert resposta.headers['X-Cache'] == 'MISS'
+
+    # Uma leitura e uma gravação falhas por requisição
+    assert response_cache.stats()['errors'] - antes == 4
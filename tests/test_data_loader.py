@@ -0,0 +1,166 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.data_loader import DataLoader
+
+DATASETS = list(DataLoader.DATA_FILES)
+
+
+def _cache(loader, dataset_name):
+    # O DataFrame guardado na versão, sem a visão que get() entrega
+    return loader._get(loader.state(), dataset_name)
+
+
+def _colunas_numericas(df):
+    return [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c].dtype) and not isinstance(df[c].dtype, pd.CategoricalDtype)]
+
+
+@pytest.mark.parametrize('dataset_name', DATASETS)
+def test_escritas_no_resultado_de_get_nao_alteram_o_cache(loader, dataset_name):
+    referencia = _cache(loader, dataset_name).copy(deep = True)
+    df = loader.get(dataset_name)
+    numericas = _colunas_numericas(df)
+    assert numericas, dataset_name
+
+    coluna = numericas[0]
+    df.iloc[0, df.columns.get_loc(coluna)] = -1
+    df.loc[:, coluna] = df[coluna] * 2
+    df[coluna] += 1
+    df[numericas[-1]] = 0
+    serie = df[coluna]
+    serie.iloc[1:3] = -5
+    df['nova'] = 1
+    df.sort_values(coluna, inplace = True)
+    df.drop(columns = numericas[-1], inplace = True)
+
+    pd.testing.assert_frame_equal(_cache(loader, dataset_name), referencia)
+    pd.testing.assert_frame_equal(loader.get(dataset_name), referencia)
+
+
+@pytest.mark.parametrize('dataset_name', DATASETS)
+def test_arrays_numpy_do_resultado_sao_somente_leitura(loader, dataset_name):
+    df = loader.get(dataset_name)
+
+    for coluna in _colunas_numericas(df):
+        array = df[coluna].to_numpy()
+        if not np.shares_memory(array, _cache(loader, dataset_name)[coluna].to_numpy()):
+            continue
+
+        assert not array.flags.writeable, coluna
+        with pytest.raises(ValueError):
+            array[0] = 0
+
+
+def test_copy_true_devolve_frame_independente(loader):
+    df = loader.get('base_municipios', copy = True)
+    cache = _cache(loader, 'base_municipios')
+
+    for coluna in _colunas_numericas(df):
+        assert not np.shares_memory(df[coluna].to_numpy(), cache[coluna].to_numpy()), coluna
+
+
+def test_get_nao_copia_as_colunas(loader):
+    # A visão de get() custa só os objetos do DataFrame; copy=True aloca os dados de novo
+    cache = _cache(loader, 'base_municipios')
+    tamanho = int(cache.memory_usage(deep = False).sum())
+
+    def pico(funcao):
+        tracemalloc.start()
+        try:
+            funcao()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    visao = pico(lambda: loader.get('base_municipios'))
+    copia = pico(lambda: loader.get('base_municipios', copy = True))
+
+    assert visao < 64 * 1024
+    assert visao < tamanho / 20
+    assert copia > tamanho / 2
+
+
+def _mascara(df, **chaves):
+    # Referência: a varredura com máscara booleana que get_by_index substitui
+    mascara = np.ones(len(df), dtype = bool)
+    for coluna, valor in chaves.items():
+        mascara &= (df[coluna] == valor).to_numpy()
+    return df[mascara]
+
+
+def _identicos(resultado, referencia):
+    pd.testing.assert_frame_equal(resultado, referencia, check_exact = True)
+    assert resultado.index.equals(referencia.index)
+    assert (pd.util.hash_pandas_object(resultado).to_numpy() == pd.util.hash_pandas_object(referencia).to_numpy()).all()
+
+
+def test_get_by_index_uf_ano_identico_a_mascara(loader):
+    df = _cache(loader, 'base_municipios')
+    anos = sorted(df['ano'].unique())
+
+    # Todas as UFs com todos os anos, inclusive combinações sem linhas
+    for uf in [*df['uf'].cat.categories, 'XX']:
+        for ano in [*anos, anos[-1] + 1]:
+            _identicos(
+                loader.get_by_index('base_municipios', uf = uf, ano = ano),
+                _mascara(df, uf = uf, ano = ano)
+            )
+
+
+def test_get_by_index_municipio_identico_a_mascara(loader):
+    df = _cache(loader, 'base_municipios')
+    codigos = sorted(df['cod_municipio'].unique())[::100]
+
+    for codigo in codigos:
+        _identicos(
+            loader.get_by_index('base_municipios', cod_municipio = codigo),
+            _mascara(df, cod_municipio = codigo)
+        )
+        # Rotas repassam o código como texto da URL
+        _identicos(
+            loader.get_by_index('base_municipios', cod_municipio = str(codigo), ano = 2021),
+            _mascara(df, cod_municipio = codigo, ano = 2021)
+        )
+
+
+def _chaves_declaradas():
+    return {(dataset_name, colunas) for dataset_name, indices in DataLoader.INDICES.items() for colunas in indices}
+
+
+def test_build_indices_monta_todos_os_indices_declarados(loader):
+    # Versão nova, ainda não ativada: os índices vão para ela, não para a que está em uso
+    estado = loader._build()
+
+    with loader.pinned(estado):
+        loader.build_indices()
+
+    assert _chaves_declaradas() <= set(estado.indices)
+    assert all(estado.indices[chave] is not None for chave in _chaves_declaradas())
+    assert estado is not loader.state()
+
+
+def test_preparar_derivados_monta_os_indices_antes_da_troca(app, monkeypatch):
+    from api.data_loader import data_loader
+    from api.processors import DataProcessor
+
+    # Como na recarga: a versão nova fixada na thread, preparada antes de activate
+    estado = data_loader._build()
+    with data_loader.pinned(estado):
+        DataProcessor.preparar_derivados()
+
+    assert _chaves_declaradas() <= set(estado.indices)
+
+    # Depois da troca, as consultas por índice não agrupam mais nada
+    agrupamentos = []
+    groupby = pd.DataFrame.groupby
+    monkeypatch.setattr(pd.DataFrame, 'groupby', lambda self, *a, **k: agrupamentos.append(a) or groupby(self, *a, **k))
+
+    with data_loader.pinned(estado):
+        data_loader.get_by_index('base_municipios', uf = 'MT', ano = 2021)
+        data_loader.get_by_index('base_municipios', cod_municipio = 5107925)
+        data_loader.get_by_index('base_municipios', cod_municipio = 5107925, ano = 2021)
+
+    assert agrupamentos == []
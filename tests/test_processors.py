@@ -0,0 +1,110 @@
+import pytest
+
+from api import formatting
+from api.data_loader import data_loader
+from api.processors import DataProcessor
+
+UFS = ['RS', 'PR', 'MT', 'MG', 'SP', 'XX']
+FONTES = ['todas', 'ibge', 'conab']
+
+
+def _bytes(app, payload):
+    return app.json.response({'success': True, 'data': payload}).get_data()
+
+
+def _anos():
+    anos = sorted(int(ano) for ano in data_loader.get('area_estadual')['ano'].unique())
+    return [*anos, anos[-1] + 1]
+
+
+# Implementações com iterrows anteriores à vetorização, mantidas como referência da saída
+
+def mapa_estados_iterrows(ano, fonte):
+    df_estadual = data_loader.get('area_estadual')
+    df = df_estadual[df_estadual['ano'] == ano].copy()
+
+    fonte_real = 'conab' if fonte == 'todas' else fonte.lower()
+    coluna_variacao = f'variacao_{fonte_real}'
+    coluna_area = f'area_plantada_{fonte_real}'
+
+    # A coluna de texto que o notebook gravava, hoje montada na resposta
+    df[coluna_variacao] = formatting.variation(df[coluna_variacao], df['ano'])
+
+    cores_estados = {}
+    dados_estados = []
+
+    for _, row in df.iterrows():
+        uf = row['uf']
+        variacao_texto = str(row[coluna_variacao])
+
+        if variacao_texto.startswith('+'):
+            cor, tipo_variacao = '#17A589', 'positiva'
+        elif variacao_texto.startswith('-') and len(variacao_texto) > 1:
+            cor, tipo_variacao = '#CD8B8B', 'negativa'
+        else:
+            cor, tipo_variacao = '#DADAD9', 'neutra'
+
+        cores_estados[uf] = cor
+        dados_estados.append({
+            'uf': uf,
+            'area_plantada': row[coluna_area],
+            'variacao': variacao_texto,
+            'tipo_variacao': tipo_variacao,
+            'cor': cor
+        })
+
+    return {
+        'cores_estados': cores_estados,
+        'dados_estados': dados_estados,
+        'metadata': {
+            'ano': ano,
+            'fonte': fonte_real,
+            'legenda': {
+                'positiva': {'cor': '#17A589', 'label': 'Crescimento'},
+                'negativa': {'cor': '#CD8B8B', 'label': 'Retração'},
+                'neutra': {'cor': '#DADAD9', 'label': 'Estável'}
+            }
+        }
+    }
+
+
+def municipios_por_estado_iterrows(uf, ano):
+    df = data_loader.get('base_municipios')
+    df_estado = df[(df['uf'] == uf.upper()) & (df['ano'] == ano) & (df['area_plantada'] > 0)]
+
+    if df_estado.empty:
+        return None
+
+    return [
+        {'codigo': str(row['cod_municipio']), 'nome': row['municipio']}
+        for _, row in df_estado.iterrows()
+    ]
+
+
+@pytest.mark.parametrize('fonte', FONTES)
+def test_mapa_estados_identico_ao_iterrows(app, fonte):
+    for ano in _anos():
+        assert _bytes(app, DataProcessor.preparar_dados_mapa_estados(ano, fonte)) == _bytes(app, mapa_estados_iterrows(ano, fonte)), ano
+
+
+def test_mapa_estados_classifica_pelo_valor_exibido(app):
+    # Variações que arredondam para 0,0 ficam neutras, como o texto "0% vs ..."
+    dados = DataProcessor.preparar_dados_mapa_estados(2021, 'ibge')['dados_estados']
+    tipos = {d['tipo_variacao'] for d in dados}
+    assert tipos <= {'positiva', 'negativa', 'neutra'}
+    assert all((d['tipo_variacao'] == 'positiva') == d['variacao'].startswith('+') for d in dados)
+
+
+@pytest.mark.parametrize('uf', UFS)
+def test_municipios_por_estado_identico_ao_iterrows(app, uf):
+    for ano in _anos():
+        atual = DataProcessor.buscar_municipios_por_estado(uf, ano)
+        referencia = municipios_por_estado_iterrows(uf, ano)
+
+        assert (atual is None) == (referencia is None), (uf, ano)
+        if referencia is not None:
+            assert _bytes(app, atual) == _bytes(app, referencia), (uf, ano)
+
+
+def test_municipios_por_estado_aceita_uf_minuscula(app):
+    assert DataProcessor.buscar_municipios_por_estado('rs', 2021) == DataProcessor.buscar_municipios_por_estado('RS', 2021)
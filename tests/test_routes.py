@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from api.processors import DataProcessor
+from api.routes import PAINEIS
+
+FILTROS = {'ano': '2020', 'fonte': 'ibge', 'cod_municipio': '5100201', 'periodo': '2019-2021'}
+
+
+@pytest.mark.parametrize('formato', ['json', 'bdata'])
+@pytest.mark.parametrize('nome', list(PAINEIS))
+def test_painel_igual_a_rota_individual(client, nome, formato):
+    lote = client.get('/api/painel', query_string = {**FILTROS, 'formato': formato, 'paineis': nome})
+    assert lote.status_code == 200
+
+    painel = lote.get_json()['paineis'][nome]
+    individual = client.get(f'/api/{nome}', query_string = painel['parametros'])
+
+    assert painel['status'] == individual.status_code
+    assert painel['resposta'] == individual.get_json()
+
+
+def test_painel_usa_o_cache_da_rota_individual(client):
+    individual = client.get('/api/kpis', query_string = {'ano': '2020', 'fonte': 'ibge'})
+    assert individual.headers['X-Cache'] == 'MISS'
+
+    lote = client.get('/api/painel', query_string = {**FILTROS, 'paineis': 'kpis'})
+    assert lote.get_json()['paineis']['kpis']['resposta'] == individual.get_json()
+
+    # O painel gravou e leu a mesma chave da rota: a segunda chamada individual já é HIT
+    assert client.get('/api/kpis', query_string = {'ano': '2020', 'fonte': 'ibge'}).headers['X-Cache'] == 'HIT'
+
+
+def test_painel_com_todos_os_paineis_invalidos_falha(client):
+    resposta = client.get('/api/painel', query_string = {'ano': 'abc', 'paineis': 'kpis,mapa_estados,municipio_destaque'})
+    corpo = resposta.get_json()
+
+    assert resposta.status_code == 400
+    assert corpo['success'] is False
+    assert {painel['status'] for painel in corpo['paineis'].values()} == {400}
+    assert 'X-Cache' not in resposta.headers
+
+
+def test_painel_com_erro_interno_nao_entra_no_cache(client, monkeypatch):
+    def falhar(**kwargs):
+        raise RuntimeError('falha simulada')
+
+    monkeypatch.setattr(DataProcessor, 'preparar_dados_kpis', staticmethod(falhar))
+    args = {**FILTROS, 'paineis': 'kpis,comparacao_nacional'}
+
+    for _ in range(2):
+        resposta = client.get('/api/painel', query_string = args)
+        paineis = json.loads(resposta.get_data())['paineis']
+
+        # Um painel ainda responde: o lote é 200, mas não é guardado nem servido do cache
+        assert resposta.status_code == 200
+        assert paineis['kpis']['status'] == 500
+        assert paineis['comparacao_nacional']['status'] == 200
+        assert 'X-Cache' not in resposta.headers
+        assert resposta.cache_control.no_store
+
+
+@pytest.mark.parametrize('rota', ['/api/cache_stats', '/api/memoria', '/api/admin/reload'])
+def test_diagnosticos_exigem_token(client, monkeypatch, rota):
+    from api.reload import data_reloader
+
+    monkeypatch.setattr(data_reloader, 'token', 'segredo')
+
+    assert client.get(rota).status_code == 401
+    assert client.get(rota, headers = {'Authorization': 'Bearer errado'}).status_code == 401
+
+    resposta = client.get(rota, headers = {'Authorization': 'Bearer segredo'})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['success'] is True
+
+    # Sem token configurado, ninguém acessa
+    monkeypatch.setattr(data_reloader, 'token', None)
+    assert client.get(rota, headers = {'Authorization': 'Bearer '}).status_code == 401
+
+
+@pytest.mark.parametrize('modo', ['1', 'folded'])
+@pytest.mark.parametrize('metricas_antes_do_cors', [False, True])
+def test_perfil_mantem_cabecalhos_de_cors(modo, metricas_antes_do_cors, monkeypatch):
+    from flask import Flask, jsonify
+    from flask_cors import CORS
+    from api.metrics import request_metrics
+
+    # Os hooks after_request rodam na ordem inversa do registro: o perfil precisa dos cabeçalhos de CORS nas duas ordens
+    aplicacao = Flask(__name__)
+    aplicacao.config['PROFILE_REQUESTS'] = True
+    monkeypatch.setattr(request_metrics, 'profile_enabled', True)
+
+    if metricas_antes_do_cors:
+        request_metrics.init_app(aplicacao)
+        CORS(aplicacao)
+    else:
+        CORS(aplicacao)
+        request_metrics.init_app(aplicacao)
+
+    @aplicacao.route('/rota')
+    def rota():
+        return jsonify({'success': True})
+
+    resposta = aplicacao.test_client().get(f'/rota?_profile={modo}', headers = {'Origin': 'http://exemplo.com'})
+
+    assert resposta.headers['X-Profile'] in ('cprofile', 'folded')
+    assert resposta.headers['Access-Control-Allow-Origin'] == 'http://exemplo.com'
+    assert resposta.headers.getlist('Access-Control-Allow-Origin') == ['http://exemplo.com']
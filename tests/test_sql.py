@@ -0,0 +1,66 @@
+import pytest
+
+from api.data_loader import data_loader
+from api.sql import QueryTimeout, sql_engine
+
+pytestmark = pytest.mark.skipif(not sql_engine.available, reason = 'duckdb não instalado')
+
+
+def test_arquivos_sao_views_sem_copia(app):
+    tabela, _ = sql_engine.execute('SELECT table_name, table_type FROM information_schema.tables')
+    tipos = dict(zip(tabela.column('table_name').to_pylist(), tabela.column('table_type').to_pylist()))
+
+    assert tipos['area_estadual'] == 'VIEW'
+    assert set(tipos.values()) == {'VIEW'}
+
+    tabela, cortado = sql_engine.execute('SELECT count(*) AS n FROM area_estadual')
+    assert tabela.column('n').to_pylist() == [len(data_loader.get('area_estadual'))]
+    assert not cortado
+
+
+def test_limite_de_linhas(app, monkeypatch):
+    monkeypatch.setattr(sql_engine, 'row_limit', 10)
+    monkeypatch.setattr(sql_engine, 'max_rows', 20)
+
+    tabela, cortado = sql_engine.execute('SELECT * FROM range(50)')
+    assert (tabela.num_rows, cortado) == (10, True)
+
+    # O limite pedido nunca passa de max_rows
+    tabela, cortado = sql_engine.execute('SELECT * FROM range(50)', limite = 1000)
+    assert (tabela.num_rows, cortado) == (20, True)
+
+    tabela, cortado = sql_engine.execute('SELECT * FROM range(5)')
+    assert (tabela.num_rows, cortado) == (5, False)
+
+
+def test_consulta_longa_e_interrompida(app, monkeypatch):
+    monkeypatch.setattr(sql_engine, 'timeout', 0.2)
+
+    with pytest.raises(QueryTimeout):
+        sql_engine.execute('SELECT sum(a.range * b.range) FROM range(1000000000) a, range(1000000000) b')
+
+    # A conexão continua utilizável depois da interrupção
+    tabela, _ = sql_engine.execute('SELECT 1 AS um')
+    assert tabela.column('um').to_pylist() == [1]
+
+
+@pytest.mark.parametrize('sql', [
+    'SELECT 1; SELECT 2',
+    'DELETE FROM area_estadual',
+    'CREATE TABLE copia AS SELECT * FROM area_estadual',
+    "SET enable_external_access = true",
+    ''
+])
+def test_apenas_um_select(app, sql):
+    with pytest.raises(ValueError):
+        sql_engine.execute(sql)
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM read_csv('/etc/passwd')",
+    "SELECT * FROM read_parquet('/etc/passwd')",
+    "SELECT * FROM '/etc/passwd'"
+])
+def test_sem_acesso_a_arquivos(app, sql):
+    with pytest.raises(ValueError, match = 'Permission|does not exist'):
+        sql_engine.execute(sql)
@@ -0,0 +1,258 @@
+import gzip
+import math
+import sqlite3
+import struct
+import threading
+from pathlib import Path
+
+import pytest
+
+from api.data_loader import data_loader
+from api.tiles import CAMADA, EXTENT, build_mbtiles, tile_store
+
+MALHA = Path(__file__).resolve().parent.parent / 'dados' / 'fixtures' / 'municipios.geojson'
+ZOOMS = range(4, 8)
+
+# cod_municipio -> (lon, lat) de um ponto dentro do município na malha de teste
+PONTOS = {5107925: (-55.4, -12.3), 5100201: (-52.16, -14.05), 4314902: (-51.2, -30.1)}
+
+
+### DECODIFICADOR PROTOBUF MÍNIMO (Mapbox Vector Tile 2.1) ###
+
+def _varint(dados, posicao):
+    resultado, deslocamento = 0, 0
+    while True:
+        byte = dados[posicao]
+        posicao += 1
+        resultado |= (byte & 0x7F) << deslocamento
+        if not byte & 0x80:
+            return resultado, posicao
+        deslocamento += 7
+
+
+def _campos(dados):
+    # (número do campo, tipo, valor): varint como int, 64 bits e length-delimited como bytes
+    posicao = 0
+    while posicao < len(dados):
+        chave, posicao = _varint(dados, posicao)
+        numero, tipo = chave >> 3, chave & 0x7
+
+        if tipo == 0:
+            valor, posicao = _varint(dados, posicao)
+        elif tipo == 1:
+            valor, posicao = dados[posicao:posicao + 8], posicao + 8
+        elif tipo == 2:
+            tamanho, posicao = _varint(dados, posicao)
+            valor, posicao = dados[posicao:posicao + tamanho], posicao + tamanho
+        elif tipo == 5:
+            valor, posicao = dados[posicao:posicao + 4], posicao + 4
+        else:
+            raise ValueError(f'Tipo protobuf não suportado: {tipo}')
+
+        yield numero, tipo, valor
+
+
+def _empacotados(dados):
+    valores, posicao = [], 0
+    while posicao < len(dados):
+        valor, posicao = _varint(dados, posicao)
+        valores.append(valor)
+    return valores
+
+
+def _zigzag(valor):
+    return (valor >> 1) ^ -(valor & 1)
+
+
+def _valor(dados):
+    for numero, _, valor in _campos(dados):
+        if numero == 1:
+            return valor.decode('utf-8')
+        if numero == 2:
+            return struct.unpack('<f', valor)[0]
+        if numero == 3:
+            return struct.unpack('<d', valor)[0]
+        if numero in (4, 5):
+            return valor
+        if numero == 6:
+            return _zigzag(valor)
+        if numero == 7:
+            return bool(valor)
+
+
+def _aneis(comandos):
+    aneis, cx, cy, i = [], 0, 0, 0
+    while i < len(comandos):
+        identificador, quantidade = comandos[i] & 0x7, comandos[i] >> 3
+        i += 1
+
+        if identificador == 7:
+            continue
+
+        for _ in range(quantidade):
+            cx += _zigzag(comandos[i])
+            cy += _zigzag(comandos[i + 1])
+            i += 2
+            if identificador == 1:
+                aneis.append([])
+            aneis[-1].append((cx, cy))
+
+    return aneis
+
+
+def decode_tile(dados):
+    camadas = {}
+
+    for numero, _, camada in _campos(dados):
+        assert numero == 3
+        nome, extent, versao, chaves, valores, features = None, None, None, [], [], []
+
+        for campo, _, valor in _campos(camada):
+            if campo == 1:
+                nome = valor.decode('utf-8')
+            elif campo == 2:
+                features.append(valor)
+            elif campo == 3:
+                chaves.append(valor.decode('utf-8'))
+            elif campo == 4:
+                valores.append(_valor(valor))
+            elif campo == 5:
+                extent = valor
+            elif campo == 15:
+                versao = valor
+
+        decodificadas = []
+        for feature in features:
+            decodificada = {'id': None, 'properties': {}}
+            for campo, _, valor in _campos(feature):
+                if campo == 1:
+                    decodificada['id'] = valor
+                elif campo == 2:
+                    tags = _empacotados(valor)
+                    decodificada['properties'] = {chaves[c]: valores[v] for c, v in zip(tags[::2], tags[1::2])}
+                elif campo == 3:
+                    decodificada['tipo'] = valor
+                elif campo == 4:
+                    decodificada['aneis'] = _aneis(_empacotados(valor))
+            decodificadas.append(decodificada)
+
+        camadas[nome] = {'versao': versao, 'extent': extent, 'features': decodificadas}
+
+    return camadas
+
+
+def _area(anel):
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(anel, anel[1:] + anel[:1])) / 2
+
+
+def _tile(lon, lat, z):
+    n = 2 ** z
+    y = (1.0 - math.log(math.tan(math.radians(lat)) + 1.0 / math.cos(math.radians(lat))) / math.pi) / 2.0
+    return int((lon + 180.0) / 360.0 * n), int(y * n)
+
+
+### TESTES ###
+
+@pytest.fixture(scope = 'module')
+def mbtiles(tmp_path_factory):
+    saida = tmp_path_factory.mktemp('tiles') / 'municipios.mbtiles'
+    build_mbtiles(MALHA, saida, ZOOMS)
+    return saida
+
+
+@pytest.fixture
+def tiles(mbtiles, monkeypatch):
+    # O tile_store global lendo o MBTiles de teste, com conexões novas
+    monkeypatch.setattr(tile_store, 'path', mbtiles)
+    monkeypatch.setattr(tile_store, '_max_zoom', None)
+    monkeypatch.setattr(tile_store, '_local', threading.local())
+    return tile_store
+
+
+def _ler(mbtiles, z, x, y):
+    with sqlite3.connect(mbtiles) as conexao:
+        linha = conexao.execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            (z, x, 2 ** z - 1 - y)
+        ).fetchone()
+    return decode_tile(gzip.decompress(linha[0]))
+
+
+def test_metadados(mbtiles):
+    with sqlite3.connect(mbtiles) as conexao:
+        metadados = dict(conexao.execute('SELECT name, value FROM metadata').fetchall())
+
+    assert (metadados['minzoom'], metadados['maxzoom']) == (str(min(ZOOMS)), str(max(ZOOMS)))
+    assert metadados['format'] == 'pbf'
+
+
+@pytest.mark.parametrize('z', list(ZOOMS))
+@pytest.mark.parametrize('codigo', list(PONTOS))
+def test_ids_e_atributos(app, mbtiles, codigo, z):
+    camada = _ler(mbtiles, z, *_tile(*PONTOS[codigo], z))[CAMADA]
+    assert (camada['versao'], camada['extent']) == (2, EXTENT)
+
+    features = {feature['id']: feature for feature in camada['features']}
+    assert codigo in features
+
+    feature = features[codigo]
+    assert feature['tipo'] == 3
+    assert feature['properties']['cod_municipio'] == str(codigo)
+
+    # variacao_<ano> e area_plantada_<ano> chegam como números (double), com a variação em uma casa
+    base = data_loader.get('base_municipios')
+    linhas = base[base['cod_municipio'].astype(str) == str(codigo)]
+    assert len(linhas)
+
+    for row in linhas.itertuples():
+        variacao = feature['properties'][f'variacao_{row.ano}']
+        assert isinstance(variacao, float)
+        assert variacao == round(float(row.variacao), 1)
+        assert feature['properties'][f'area_plantada_{row.ano}'] == pytest.approx(float(row.area_plantada))
+
+    assert feature['properties']['nome'] == linhas['municipio'].iloc[0]
+
+
+def test_aneis_exterior_e_furo(mbtiles):
+    # Sorriso tem um furo: anel exterior com área positiva e interior negativa
+    z = max(ZOOMS)
+    lon, lat = PONTOS[5107925]
+    camada = _ler(mbtiles, z, *_tile(lon, lat, z))[CAMADA]
+    aneis = next(f for f in camada['features'] if f['id'] == 5107925)['aneis']
+
+    assert _area(aneis[0]) > 0
+    assert any(_area(anel) < 0 for anel in aneis[1:])
+
+
+def test_rota_tile(client, tiles):
+    z = 6
+    x, y = _tile(*PONTOS[5100201], z)
+
+    resposta = client.get(f'/api/tiles/{z}/{x}/{y}', headers = {'Accept-Encoding': 'gzip'})
+    assert resposta.status_code == 200
+    assert resposta.headers['Content-Encoding'] == 'gzip'
+    assert resposta.mimetype == 'application/vnd.mapbox-vector-tile'
+
+    ids = {feature['id'] for feature in decode_tile(gzip.decompress(resposta.get_data()))[CAMADA]['features']}
+    assert 5100201 in ids
+
+    # Sem gzip no Accept-Encoding o tile vai descomprimido
+    resposta = client.get(f'/api/tiles/{z}/{x}/{y}')
+    assert 'Content-Encoding' not in resposta.headers
+    assert 5100201 in {feature['id'] for feature in decode_tile(resposta.get_data())[CAMADA]['features']}
+
+
+def test_rota_tile_vazio(client, tiles):
+    # Dentro da pirâmide, sem nenhum município da malha de teste
+    assert client.get('/api/tiles/4/0/0').status_code == 204
+
+
+@pytest.mark.parametrize('z, x, y', [
+    (max(ZOOMS) + 1, 0, 0),
+    (4, 16, 0),
+    (4, 0, 16)
+])
+def test_rota_tile_fora_da_piramide(client, tiles, z, x, y):
+    resposta = client.get(f'/api/tiles/{z}/{x}/{y}')
+    assert resposta.status_code == 404
+    assert resposta.get_json()['success'] is False
@@ -1,9 +1,13 @@
 import os
-from app import create_app
+import threading
+from app import create_app, warm_up
+from api.reload import data_reloader
 
 config_name = os.environ.get('FLASK_ENV', 'production')
 
 app = create_app(config_name)
 
 if __name__ == "__main__":
+    data_reloader.start()
+    threading.Thread(target = warm_up, daemon = True).start()
     app.run()
\ No newline at end of file